@@ -1,533 +1,1844 @@
-import os
-import subprocess
-import sys
-import urllib.request
-import zipfile
-from PIL import Image, ImageTk
-import shutil
-import platform
-import logging
-from tqdm import tqdm
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-import threading
-import time
-import json
-import webbrowser
-
-
-# Enhanced GUI style constants
-BG_COLOR = "#0d1117"          # Dark background
-SURFACE_COLOR = "#161b22"     # Card background
-ACCENT_COLOR = "#0BB7E2"      # Accent color
-SECONDARY_COLOR = "#21262d"   # Secondary surface
-TEXT_COLOR = "#f0f6fc"        # Primary text
-MUTED_TEXT = "#8b949e"        # Muted text
-DANGER_COLOR = "#da3633"      # Red for stop button
-SUCCESS_COLOR = "#2ea043"     # Green for success
-
-# Global variable for process control
-current_process = None
-stop_requested = False
-
-def download_with_progress(url, output_path):
-    response = urllib.request.urlopen(url)
-    total = int(response.info().get('Content-Length').strip())
-    with open(output_path, 'wb') as f, tqdm(total=total, unit='B', unit_scale=True, desc="Downloading", leave=True, dynamic_ncols=True) as pbar:
-        while True:
-            if stop_requested:
-                f.close()
-                os.remove(output_path)
-                return False
-            chunk = response.read(1024)
-            if not chunk:
-                break
-            f.write(chunk)
-            pbar.update(len(chunk))
-    return True
-
-def download_realesrgan():
-    global stop_requested
-    url = "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesrgan-ncnn-vulkan-20220424-windows.zip"
-    zip_path = "realesrgan-download.zip"
-    extract_path = "realesrgan"
-
-    if not os.path.exists(extract_path):
-        print("Downloading Real-ESRGAN version...")
-        try:
-            if not download_with_progress(url, zip_path):
-                return False
-            if stop_requested:
-                return False
-            print("Download completed!")
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_path)
-            print("Extraction completed!")
-            os.remove(zip_path)
-        except Exception as e:
-            print(f"Download failed: {e}")
-            logging.error(f"Download failed: {e}")
-            return False
-    return True
-
-def enhance_image(input_path, output_path, scale=4):
-    global current_process, stop_requested
-    
-    if platform.system() != "Windows":
-        print("❌ Real-ESRGAN only works on Windows. Falling back to OpenCV...")
-        return False
-
-    if not download_realesrgan():
-        return False
-
-    if stop_requested:
-        return False
-
-    exe_path = None
-    for root, dirs, files in os.walk("realesrgan"):
-        for file in files:
-            if file.endswith("realesrgan-ncnn-vulkan.exe"):
-                exe_path = os.path.join(root, file)
-                break
-        if exe_path:
-            break
-
-    if not exe_path:
-        print("Real-ESRGAN executable not found!")
-        return False
-
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    ext = os.path.splitext(input_path)[1]  # Ambil ekstensi asli (.jpg, .png, dll)
-    if not output_path.lower().endswith(ext):
-        output_path += ext
-
-
-    cmd = [exe_path, "-i", input_path, "-o", output_path, "-s", str(scale), "-f", "jpg"]
-
-    try:
-        print("Processing image...")
-        from subprocess import Popen, PIPE
-        start_time = time.time()
-        estimated_time = os.path.getsize(input_path) / (1024 * 1024) * 1.5
-
-        with tqdm(total=estimated_time, unit='s', desc=f"Enhancing {os.path.basename(input_path)}", dynamic_ncols=True) as pbar:
-            current_process = Popen(cmd, stdout=PIPE, stderr=PIPE, text=True)
-            while True:
-                if stop_requested:
-                    current_process.terminate()
-                    return False
-                    
-                line = current_process.stdout.readline()
-                elapsed = time.time() - start_time
-                if line:
-                    pbar.set_postfix_str(f"{line.strip()} | Elapsed: {elapsed:.1f}s")
-                else:
-                    pbar.set_postfix_str(f"Elapsed: {elapsed:.1f}s")
-                pbar.n = elapsed
-                pbar.refresh()
-                if current_process.poll() is not None:
-                    break
-            pbar.n = estimated_time
-            pbar.refresh()
-
-        if current_process.returncode == 0 and not stop_requested:
-            print("✅ Image enhanced successfully!")
-            return True
-        else:
-            stderr_output = current_process.stderr.read()
-            if not stop_requested:
-                print(f"❌ Error: {stderr_output}")
-                logging.error(stderr_output)
-            return False
-    except Exception as e:
-        print(f"Error running enhancement: {e}")
-        logging.error(f"Enhancement error: {e}")
-        return False
-    finally:
-        current_process = None
-
-def enhance_with_opencv(input_path, output_path):
-    global stop_requested
-    try:
-        if stop_requested:
-            return False
-        import cv2
-        print("Using OpenCV for basic upscaling...")
-        img = cv2.imread(input_path)
-        if img is None:
-            print("Could not read input image!")
-            return False
-        height, width = img.shape[:2]
-        new_height, new_width = height * 4, width * 4
-        upscaled = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-
-        if stop_requested:
-            return False
-
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        cv2.imwrite(output_path, upscaled, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        with tqdm(total=1, desc=f"OpenCV {os.path.basename(input_path)}", leave=True, dynamic_ncols=True) as pbar:
-            pbar.update(1)
-        print("✅ Basic upscaling completed!")
-        return True
-    except ImportError:
-        print("OpenCV not installed. Installing...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "opencv-python"])
-        return enhance_with_opencv(input_path, output_path)
-    except Exception as e:
-        print(f"OpenCV enhancement failed: {e}")
-        logging.error(f"OpenCV error: {e}")
-        return False
-
-def show_results(input_path, output_path):
-    try:
-        with Image.open(input_path) as img:
-            orig_size = img.size
-            orig_file_size = os.path.getsize(input_path) / (1024 * 1024)
-        with Image.open(output_path) as img:
-            new_size = img.size
-            new_file_size = os.path.getsize(output_path) / (1024 * 1024)
-        print(f"\n[+] Results:")
-        print(f"   Original: {orig_size[0]}x{orig_size[1]} ({orig_file_size:.1f} MB)")
-        print(f"   Enhanced: {new_size[0]}x{new_size[1]} ({new_file_size:.1f} MB)")
-        print(f"   Scale factor: {new_size[0]/orig_size[0]:.1f}x")
-        print(f"   Output saved as: {output_path}")
-    except Exception as e:
-        print(f"Could not display results: {e}")
-        logging.error(f"Result display error: {e}")
-
-def enhance_folder(input_folder, output_folder, scale=4):
-    global stop_requested
-    supported_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-    files = [f for f in os.listdir(input_folder) 
-             if os.path.splitext(f)[1].lower() in supported_extensions]
-    
-    if not files:
-        print("No supported image files found in the input folder!")
-        return
-    
-    os.makedirs(output_folder, exist_ok=True)
-    
-    for file in files:
-        if stop_requested:
-            break
-        input_path = os.path.join(input_folder, file)
-        output_path = os.path.join(output_folder, f"enhanced_{file}")
-        
-        print(f"\nProcessing {file}...")
-        if not enhance_image(input_path, output_path, scale):
-            if not stop_requested:
-                enhance_with_opencv(input_path, output_path)
-        if not stop_requested:
-            show_results(input_path, output_path)
-
-def create_rounded_button(parent, text, command, bg_color, fg_color="white", width=120, height=35):
-    """Create a modern rounded button using Canvas"""
-    canvas = tk.Canvas(parent, width=width, height=height, highlightthickness=0, bg=parent.cget('bg'))
-    
-    # Draw rounded rectangle
-    def draw_rounded_rect(x1, y1, x2, y2, radius=10):
-        points = []
-        for x, y in [(x1, y1 + radius), (x1, y1), (x1 + radius, y1),
-                     (x2 - radius, y1), (x2, y1), (x2, y1 + radius),
-                     (x2, y2 - radius), (x2, y2), (x2 - radius, y2),
-                     (x1 + radius, y2), (x1, y2), (x1, y2 - radius)]:
-            points.extend([x, y])
-        return canvas.create_polygon(points, smooth=True, fill=bg_color, outline="")
-    
-    rect = draw_rounded_rect(2, 2, width-2, height-2)
-    text_item = canvas.create_text(width//2, height//2, text=text, fill=fg_color, 
-                                  font=("Segoe UI", 10, "bold"))
-    
-    def on_click(event):
-        command()
-    
-    def on_enter(event):
-        canvas.itemconfig(rect, fill="#2d333b" if bg_color == SURFACE_COLOR else bg_color)
-    
-    def on_leave(event):
-        canvas.itemconfig(rect, fill=bg_color)
-    
-    canvas.bind("<Button-1>", on_click)
-    canvas.bind("<Enter>", on_enter)
-    canvas.bind("<Leave>", on_leave)
-    canvas.configure(cursor="hand2")
-    
-    return canvas
-
-def run_gui():
-    global stop_requested
-    
-    def browse_input():
-        path = filedialog.askopenfilename() if not batch_var.get() else filedialog.askdirectory()
-        input_entry.delete(0, tk.END)
-        input_entry.insert(0, path)
-
-    def browse_output():
-        path = filedialog.askdirectory()
-        output_entry.delete(0, tk.END)
-        output_entry.insert(0, path)
-
-    def stop_process():
-        global stop_requested
-        stop_requested = True
-        if current_process:
-            try:
-                current_process.terminate()
-            except:
-                pass
-        status_label.config(text="🛑 Process stopped", fg=DANGER_COLOR)
-        
-    def reset_ui():
-        """Reset UI after process completion"""
-        start_btn_canvas.pack(pady=5)
-        stop_btn_canvas.pack_forget()
-        progress_bar.pack_forget()
-        progress_bar.stop()
-
-    def show_loading(show=True):
-        if show:
-            progress_bar.pack(fill=tk.X, padx=20, pady=10)
-            progress_bar.start()
-            start_btn_canvas.pack_forget()
-            stop_btn_canvas.pack(pady=5)
-            status_label.config(text="🚀 Processing...\n\nPlease wait while your images are being enhanced.", fg=TEXT_COLOR)
-            root.update()
-        else:
-            reset_ui()
-
-    def see_result():
-        output_path = output_entry.get()
-        if not output_path:
-            messagebox.showwarning("Warning", "Please specify an output folder first")
-            return
-        
-        if batch_var.get():
-            if os.path.exists(output_path):
-                webbrowser.open(output_path)
-            else:
-                messagebox.showerror("Error", "Output folder doesn't exist yet")
-        else:
-            input_path = input_entry.get()
-            if not input_path:
-                messagebox.showwarning("Warning", "Please specify an input file first")
-                return
-            
-            base_name = os.path.basename(input_path)[0]
-            ext = os.path.splitext(input_path)[1]
-            enhanced_file = os.path.join(output_path, f"enhanced_{base_name}{ext}")
-            
-            if not os.path.exists(enhanced_file):
-                messagebox.showerror("Error", f"Enhanced file not found:\n{enhanced_file}")
-                return
-            if os.path.exists(enhanced_file):
-                webbrowser.open(enhanced_file)
-            else:
-                messagebox.showerror("Error", "Enhanced file not found. Please run enhancement first")
-
-    def threaded_start():
-        global stop_requested
-        stop_requested = False
-        
-        if not input_entry.get() or not output_entry.get():
-            messagebox.showerror("Error", "Please specify input and output paths")
-            return
-        
-        show_loading(True)
-        
-        def process():
-            global stop_requested
-            try:
-                inp = input_entry.get()
-                out = output_entry.get()
-                scale = int(scale_var.get())
-
-                if not os.path.exists(inp):
-                    messagebox.showerror("Error", "Input path not found")
-                    return
-                
-                os.makedirs(out, exist_ok=True)
-                
-                if batch_var.get():
-                    enhance_folder(inp, out, scale)
-                else:
-                    output_file = os.path.join(out, f"enhanced_{os.path.basename(inp)}")
-                    if not enhance_image(inp, output_file, scale):
-                        if not stop_requested:
-                            enhance_with_opencv(inp, output_file)
-                    if not stop_requested:
-                        show_results(inp, output_file)
-                
-                if not stop_requested:
-                    status_label.config(text="✅ Enhancement completed successfully!\n\nYour enhanced images are ready in the output folder.", fg=SUCCESS_COLOR)
-                    messagebox.showinfo("Success", "Enhancement completed successfully!")
-                else:
-                    status_label.config(text="🛑 Process stopped by user\n\nEnhancement was cancelled.", fg=DANGER_COLOR)
-                    
-            except Exception as e:
-                if not stop_requested:
-                    messagebox.showerror("Error", f"An error occurred: {str(e)}")
-                    status_label.config(text="❌ Enhancement failed\n\nAn error occurred during processing.", fg=DANGER_COLOR)
-                logging.error(f"Processing error: {e}")
-            finally:
-                show_loading(False)
-        
-        threading.Thread(target=process, daemon=True).start()
-
-    # Create main window with horizontal layout
-    root = tk.Tk()
-    root.title("AI Image Enhancer")
-    root.geometry("1000x600")
-    root.configure(bg=BG_COLOR)
-    root.resizable(True, True)
-    
-    # Configure styles
-    style = ttk.Style()
-    style.theme_use('clam')
-    style.configure("TProgressbar", 
-                   troughcolor=SECONDARY_COLOR,
-                   background=ACCENT_COLOR,
-                   borderwidth=1,
-                   lightcolor=ACCENT_COLOR,
-                   darkcolor=ACCENT_COLOR)
-    
-    # Main horizontal container
-    main_container = tk.Frame(root, bg=BG_COLOR, padx=20, pady=20)
-    main_container.pack(expand=True, fill=tk.BOTH)
-    
-    # Left panel for controls
-    left_panel = tk.Frame(main_container, bg=SURFACE_COLOR, width=350)
-    left_panel.pack(side=tk.LEFT, fill=tk.BOTH, expand=False, padx=(0, 10))
-    left_panel.pack_propagate(False)
-    
-    # Right panel for preview/status
-    right_panel = tk.Frame(main_container, bg=SURFACE_COLOR)
-    right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
-    
-    # Title in left panel
-    title_label = tk.Label(left_panel, 
-                          text="AI Image Enhancer", 
-                          font=("Segoe UI", 16, "bold"),
-                          bg=SURFACE_COLOR, fg=TEXT_COLOR)
-    title_label.pack(pady=(20, 10))
-    
-    # Subtitle
-    subtitle_label = tk.Label(left_panel,
-                             text="By Johnstri ",
-                             font=("Segoe UI", 9),
-                             bg=SURFACE_COLOR, fg=MUTED_TEXT)
-    subtitle_label.pack(pady=(0, 20))
-    
-    # Input section
-    input_section = tk.Frame(left_panel, bg=SURFACE_COLOR)
-    input_section.pack(fill=tk.X, padx=15, pady=(0, 10))
-    
-    tk.Label(input_section, text="📁 Input Path", 
-             font=("Segoe UI", 10, "bold"), bg=SURFACE_COLOR, fg=TEXT_COLOR).pack(anchor="w", pady=(0, 5))
-    
-    input_frame = tk.Frame(input_section, bg=SURFACE_COLOR)
-    input_frame.pack(fill=tk.X)
-    
-    input_entry = tk.Entry(input_frame, font=("Segoe UI", 9),
-                          bg=SECONDARY_COLOR, fg=TEXT_COLOR, 
-                          insertbackground=TEXT_COLOR, bd=0, highlightthickness=1,
-                          highlightcolor=ACCENT_COLOR, highlightbackground=SECONDARY_COLOR)
-    input_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
-    
-    browse_input_btn = create_rounded_button(input_frame, "Browse", browse_input, ACCENT_COLOR, width=80, height=25)
-    browse_input_btn.pack(side=tk.RIGHT)
-    
-    # Output section
-    output_section = tk.Frame(left_panel, bg=SURFACE_COLOR)
-    output_section.pack(fill=tk.X, padx=15, pady=(0, 10))
-    
-    tk.Label(output_section, text="💾 Output Folder", 
-             font=("Segoe UI", 10, "bold"), bg=SURFACE_COLOR, fg=TEXT_COLOR).pack(anchor="w", pady=(0, 5))
-    
-    output_frame = tk.Frame(output_section, bg=SURFACE_COLOR)
-    output_frame.pack(fill=tk.X)
-    
-    output_entry = tk.Entry(output_frame, font=("Segoe UI", 9),
-                           bg=SECONDARY_COLOR, fg=TEXT_COLOR,
-                           insertbackground=TEXT_COLOR, bd=0, highlightthickness=1,
-                           highlightcolor=ACCENT_COLOR, highlightbackground=SECONDARY_COLOR)
-    output_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
-    
-    browse_output_btn = create_rounded_button(output_frame, "Browse", browse_output, ACCENT_COLOR, width=80, height=25)
-    browse_output_btn.pack(side=tk.RIGHT)
-    
-    # Settings section
-    settings_section = tk.Frame(left_panel, bg=SURFACE_COLOR)
-    settings_section.pack(fill=tk.X, padx=15, pady=(0, 15))
-    
-    tk.Label(settings_section, text="⚙️ Settings", 
-             font=("Segoe UI", 10, "bold"), bg=SURFACE_COLOR, fg=TEXT_COLOR).pack(anchor="w", pady=(0, 10))
-    
-    scale_frame = tk.Frame(settings_section, bg=SURFACE_COLOR)
-    scale_frame.pack(fill=tk.X, pady=5)
-    
-    tk.Label(scale_frame, text="Scale:", font=("Segoe UI", 9),
-             bg=SURFACE_COLOR, fg=TEXT_COLOR).pack(side=tk.LEFT)
-    
-    scale_var = tk.StringVar(value="4")
-    scale_2_btn = tk.Radiobutton(scale_frame, text="2x", variable=scale_var, value="2",
-                                bg=SURFACE_COLOR, fg=TEXT_COLOR, selectcolor=SECONDARY_COLOR,
-                                font=("Segoe UI", 9))
-    scale_2_btn.pack(side=tk.LEFT, padx=(10, 5))
-    
-    scale_4_btn = tk.Radiobutton(scale_frame, text="4x", variable=scale_var, value="4",
-                                bg=SURFACE_COLOR, fg=TEXT_COLOR, selectcolor=SECONDARY_COLOR,
-                                font=("Segoe UI", 9))
-    scale_4_btn.pack(side=tk.LEFT)
-    
-    batch_var = tk.BooleanVar()
-    batch_check = tk.Checkbutton(settings_section, text="Batch Mode [Process Folder]", 
-                                variable=batch_var, font=("Segoe UI", 9),
-                                bg=SURFACE_COLOR, fg=TEXT_COLOR, selectcolor=SECONDARY_COLOR)
-    batch_check.pack(anchor="w", pady=(10, 0))
-    
-    # Control buttons section
-    control_section = tk.Frame(left_panel, bg=SURFACE_COLOR)
-    control_section.pack(fill=tk.X, padx=15, pady=15)
-    
-    start_btn_canvas = create_rounded_button(control_section, "Start Enhancement", 
-                                           threaded_start, ACCENT_COLOR, width=200, height=35)
-    start_btn_canvas.pack(pady=5)
-    
-    stop_btn_canvas = create_rounded_button(control_section, "Stop Process", 
-                                          stop_process, DANGER_COLOR, width=200, height=35)
-    # Initially hidden
-    
-    see_result_btn = create_rounded_button(control_section, "Show Result", 
-                                         see_result, SECONDARY_COLOR, width=200, height=30)
-    see_result_btn.pack(pady=(10, 0))
-    
-    # Progress bar in left panel
-    progress_bar = ttk.Progressbar(control_section, mode="indeterminate")
-    
-    # Right panel content
-    right_title = tk.Label(right_panel, text="Status & Preview", 
-                          font=("Segoe UI", 14, "bold"),
-                          bg=SURFACE_COLOR, fg=TEXT_COLOR)
-    right_title.pack(pady=(20, 15))
-    
-    # Status area
-    status_frame = tk.Frame(right_panel, bg=SECONDARY_COLOR, relief=tk.FLAT, bd=0)
-    status_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 20))
-    
-    status_label = tk.Label(status_frame, text="🔄 Ready to enhance images\n\nSelect input file/folder and output directory to begin.", 
-                           font=("Segoe UI", 11), bg=SECONDARY_COLOR, fg=TEXT_COLOR, 
-                           justify=tk.CENTER, wraplength=300)
-    status_label.pack(expand=True)
-    
-    # Footer
-    footer_label = tk.Label(left_panel, 
-                           text="Powered by Real-ESRGAN",
-                           font=("Segoe UI", 7), bg=SURFACE_COLOR, fg=MUTED_TEXT)
-    footer_label.pack(side=tk.BOTTOM, pady=(0, 10))
-    
-    root.mainloop()
-
-if __name__ == "__main__":
+import os
+import sys
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import metrics
+
+# GUI toolkits, PIL, tqdm, NumPy and OpenCV are imported where they are used,
+# so headless callers (cli.py) start without loading them.
+
+
+# Enhanced GUI style constants
+BG_COLOR = "#0d1117"          # Dark background
+SURFACE_COLOR = "#161b22"     # Card background
+ACCENT_COLOR = "#0BB7E2"      # Accent color
+SECONDARY_COLOR = "#21262d"   # Secondary surface
+TEXT_COLOR = "#f0f6fc"        # Primary text
+MUTED_TEXT = "#8b949e"        # Muted text
+DANGER_COLOR = "#da3633"      # Red for stop button
+SUCCESS_COLOR = "#2ea043"     # Green for success
+
+# How often the GUI applies updates posted by the worker thread, in milliseconds
+GUI_POLL_MS = 50
+
+# Working-set limit for the CPU paths; larger images are upscaled in tiles
+DEFAULT_MEMORY_BUDGET = int(os.environ.get("ENHANCE_MEMORY_BUDGET_MB", "1024")) * 1024 * 1024
+
+# Worker processes for the CPU fallback (cpu_pool.py); 0 uses every core, 1 runs in-process
+CPU_WORKERS = int(os.environ.get("ENHANCE_CPU_WORKERS", "0"))
+cpu_pool_instance = None
+
+# Result cache; set ENHANCE_CACHE_DIR=off to disable
+RESULT_CACHE_DIR = os.environ.get("ENHANCE_CACHE_DIR", "cache")
+RESULT_CACHE_MB = int(os.environ.get("ENHANCE_CACHE_MB", "2048"))
+BACKEND_MODELS = {"realesrgan": "realesr-animevideov3", "cpu": "realesr-animevideov3", "opencv": "bicubic"}
+result_cache = None
+
+# Binary and models; resolved once per process by the toolchain registry
+REALESRGAN_DIR = "realesrgan"
+realesrgan_download_failed = False
+
+# Real-ESRGAN runtime options (-t tile size, -j load:proc:save threads, -g GPU id).
+# Unset options come from the profile written by tune_realesrgan(), then the binary's defaults
+REALESRGAN_TILE = os.environ.get("REALESRGAN_TILE", "")
+REALESRGAN_THREADS = os.environ.get("REALESRGAN_THREADS", "")
+REALESRGAN_GPU = os.environ.get("REALESRGAN_GPU", "")
+TUNING_PROFILE = os.path.join(REALESRGAN_DIR, ".tuning.json")
+
+# Formats the binary writes itself (-f); other outputs are written as PNG and converted
+NATIVE_FORMATS = {".jpg": "jpg", ".jpeg": "jpg", ".png": "png", ".webp": "webp"}
+
+# Output encoding (encoder.py): JPEG / WebP quality (WebP above 100 is lossless), PNG zlib
+# level (0-9, unset keeps OpenCV's), an optional per-file size target and the encode threads.
+# With non-default options the binary writes PNG and the encoder re-encodes it
+JPEG_QUALITY = int(os.environ.get("ENHANCE_JPEG_QUALITY", "95"))
+WEBP_QUALITY = int(os.environ.get("ENHANCE_WEBP_QUALITY", "95"))
+PNG_LEVEL = os.environ.get("ENHANCE_PNG_LEVEL", "")
+TARGET_KB = int(os.environ.get("ENHANCE_TARGET_KB", "0"))
+ENCODE_WORKERS = int(os.environ.get("ENHANCE_ENCODE_WORKERS", "2"))
+ENCODE_HISTORY = 1024
+encoder_instance = None
+# Output path -> (Future of encoder.Encoded, source (width, height) or None), newest last
+_encodes = OrderedDict()
+# Input path -> (width, height) seen by the tuning lookup or the preflight pass, newest last
+_input_sizes = OrderedDict()
+
+# Per-image limits for the Real-ESRGAN process, in seconds (0 disables)
+PROCESS_TIMEOUT = float(os.environ.get("REALESRGAN_TIMEOUT", "0")) or None
+PROCESS_IDLE_TIMEOUT = float(os.environ.get("REALESRGAN_IDLE_TIMEOUT", "0")) or None
+
+# Local staging for folder runs on network mounts: "auto" stages when the input or
+# output folder is on NFS/SMB, "on" always, "off" never. The default folder is tmpfs
+STAGING = os.environ.get("ENHANCE_STAGING", "auto")
+STAGING_DIR = os.environ.get("ENHANCE_STAGING_DIR") or None
+STAGING_MB = int(os.environ.get("ENHANCE_STAGING_MB", "2048"))
+
+# Folder runs check headers and find byte-identical inputs before dispatch (preflight.py);
+# "off" sends every file to the backends as found
+PREFLIGHT = os.environ.get("ENHANCE_PREFLIGHT", "on")
+
+# Headless callers can turn the tqdm bars off
+PROGRESS_ENABLED = True
+
+SUPPORTED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".avi", ".webm", ".m4v")
+
+# Global variable for process control
+current_process = None
+stop_requested = False
+
+# Per-thread job context, so concurrent jobs (server.py) can be cancelled one by one
+_job = threading.local()
+_lock = threading.Lock()
+
+def is_stopped():
+    """True once Stop was pressed or the job running on this thread was cancelled."""
+    token = getattr(_job, "token", None)
+    return stop_requested or (token is not None and token.cancelled)
+
+@contextmanager
+def job_context(token):
+    """Run the enclosed enhancement calls under a supervisor.CancelToken."""
+    _job.token = token
+    try:
+        yield token
+    finally:
+        _job.token = None
+
+def _track(proc):
+    # Remember the running child so Stop (or the job's cancel) can terminate it
+    global current_process
+    token = getattr(_job, "token", None)
+    if token is not None:
+        token.process = proc
+    else:
+        current_process = proc.process if proc else None
+
+def progress_bar(**kwargs):
+    token = getattr(_job, "token", None)
+    if token is not None and token.on_progress is not None:
+        import supervisor
+        return supervisor.JobProgress(token.on_progress, kwargs.get("total"), kwargs.get("desc"))
+    from tqdm import tqdm
+    return tqdm(disable=not PROGRESS_ENABLED, **kwargs)
+
+def realesrgan_sha256():
+    """The SHA-256 the release zip must match: REALESRGAN_SHA256, else the pinned one."""
+    import toolchain
+    return (os.environ.get("REALESRGAN_SHA256") or toolchain.release_sha256() or "").lower() or None
+
+def download_with_progress(url, output_path, sha256=None):
+    import downloader
+    with progress_bar(total=None, unit='B', unit_scale=True, desc="Downloading", leave=True, dynamic_ncols=True) as pbar:
+        def progress(done, total):
+            pbar.total = total
+            pbar.n = done
+            pbar.refresh()
+        try:
+            downloader.download(url, output_path, sha256=sha256, progress=progress,
+                                should_stop=is_stopped)
+        except downloader.Stopped:
+            # The .part file is kept so the next attempt resumes
+            return False
+    return True
+
+def download_realesrgan():
+    global realesrgan_download_failed
+    import toolchain
+    installed = toolchain.resolve(REALESRGAN_DIR)
+    if installed and installed.exe:
+        return True
+
+    url = toolchain.release_url()
+    if url is None:
+        import platform
+        print(f"❌ No Real-ESRGAN build for {platform.system()}. Falling back to CPU...")
+        realesrgan_download_failed = True
+        return False
+    sha256 = realesrgan_sha256()
+    if sha256 is None:
+        print(f"❌ No SHA-256 pinned for {os.path.basename(url)}; set REALESRGAN_SHA256 to install it. "
+              "Falling back to CPU...")
+        realesrgan_download_failed = True
+        return False
+    zip_path = "realesrgan-download.zip"
+
+    print("Downloading Real-ESRGAN version...")
+    try:
+        if not download_with_progress(url, zip_path, sha256):
+            return False
+        if is_stopped():
+            return False
+        print("Download completed!")
+        import zipfile
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            bad = zip_ref.testzip()
+            if bad is not None:
+                raise zipfile.BadZipFile(f"Corrupt member {bad}")
+            zip_ref.extractall(REALESRGAN_DIR)
+        print("Extraction completed!")
+        os.remove(zip_path)
+        toolchain.record_install(REALESRGAN_DIR)
+    except Exception as e:
+        print(f"Download failed: {e}")
+        logging.error(f"Download failed: {e}")
+        realesrgan_download_failed = True
+        return False
+
+    installed = toolchain.resolve(REALESRGAN_DIR)
+    if not installed or not installed.exe:
+        print("Real-ESRGAN executable not found in the download!")
+        realesrgan_download_failed = True
+        return False
+    return True
+
+def get_toolchain():
+    import toolchain
+    return toolchain.resolve(REALESRGAN_DIR)
+
+def find_realesrgan_exe():
+    # REALESRGAN_EXE points at a specific binary (or a stand-in script for benchmarking)
+    override = os.environ.get("REALESRGAN_EXE")
+    if override:
+        return override if os.path.isfile(override) else None
+
+    installed = get_toolchain()
+    return installed.exe if installed else None
+
+def realesrgan_available():
+    if os.environ.get("REALESRGAN_EXE"):
+        return True
+    # Don't retry a failed download for every image
+    if realesrgan_download_failed:
+        return False
+    with _lock:
+        return download_realesrgan()
+
+def realesrgan_model(scale):
+    """(name, models dir) of the model trained for this scale, or None if it is not installed."""
+    name = BACKEND_MODELS["realesrgan"]
+    if os.environ.get("REALESRGAN_EXE"):
+        # A specific binary finds its own models
+        return name, None
+    installed = get_toolchain()
+    rel = installed.models.get(f"{name}-x{scale}") if installed else None
+    if rel is None:
+        return None
+    return name, os.path.join(installed.install_dir, rel)
+
+def runtime_options(exe_path, scale, input_paths=()):
+    """Tile size, threads and GPU for a run over input_paths: settings first, then the tuned profile."""
+    options = {"tile": REALESRGAN_TILE, "threads": REALESRGAN_THREADS, "gpu": REALESRGAN_GPU}
+    if input_paths and not (options["tile"] and options["threads"]) and os.path.exists(TUNING_PROFILE):
+        import tuning
+        from PIL import Image
+        # The largest image decides: its tiles have to fit in GPU memory
+        largest = (0, 0)
+        for path in input_paths:
+            try:
+                with Image.open(path) as img:
+                    _remember_size(path, img.size)
+                    if img.width * img.height > largest[0] * largest[1]:
+                        largest = img.size
+            except Exception:
+                continue
+        if largest[0]:
+            key = tuning.profile_key(exe_path, options["gpu"], scale, BACKEND_MODELS["realesrgan"])
+            for name, value in tuning.lookup(TUNING_PROFILE, key, *largest).items():
+                options[name] = options[name] or value
+    return {name: str(value) for name, value in options.items() if value != ""}
+
+def build_command(exe_path, input_path, output_path, scale, fmt="jpg", model=None, options=None):
+    cmd = [exe_path]
+    if exe_path.endswith(".py"):
+        cmd = [sys.executable, exe_path]
+    cmd += ["-i", input_path, "-o", output_path, "-s", str(scale), "-f", fmt]
+    if model:
+        name, models_dir = model
+        cmd += ["-n", name]
+        if models_dir:
+            cmd += ["-m", models_dir]
+    for flag, name in (("-t", "tile"), ("-j", "threads"), ("-g", "gpu")):
+        if options and options.get(name):
+            cmd += [flag, options[name]]
+    return cmd
+
+def _native_format(output_path):
+    """The -f format for output_path if the binary can write it as configured, else None."""
+    ext = os.path.splitext(output_path)[1].lower()
+    if ext not in NATIVE_FORMATS or not encode_settings().is_default(ext):
+        return None
+    return NATIVE_FORMATS[ext]
+
+def _convert(src, dst, input_path):
+    """Queue the re-encode of a PNG written by the binary into dst's format and options; returns the Future."""
+    return _submit_encode(src, dst, input_path, "realesrgan")
+
+def tune_realesrgan(scale=4, classes=None, images=3):
+    """Measure the fastest -t / -j per size class on this machine and save them to TUNING_PROFILE."""
+    import tuning
+    if not realesrgan_available():
+        raise tuning.TuningError("Real-ESRGAN is not available on this machine")
+    exe_path = find_realesrgan_exe()
+    model = realesrgan_model(scale)
+    if not exe_path or model is None:
+        raise tuning.TuningError(f"No Real-ESRGAN binary or x{scale} model installed")
+
+    def command(input_dir, output_dir, options):
+        options = dict(options, gpu=REALESRGAN_GPU)
+        return build_command(exe_path, input_dir, output_dir, scale, "png", model,
+                             {name: str(value) for name, value in options.items() if value != ""})
+
+    print(f"Tuning Real-ESRGAN x{scale} on this machine...")
+    results = tuning.tune(command, classes, images, should_stop=is_stopped)
+    if results:
+        key = tuning.profile_key(exe_path, REALESRGAN_GPU, scale, BACKEND_MODELS["realesrgan"])
+        tuning.save(TUNING_PROFILE, key, results)
+    return results
+
+def enhance_image(input_path, output_path, scale=4):
+    with metrics.span("toolchain_check") as span:
+        available = realesrgan_available()
+        span.set(ok=available)
+    if not available:
+        return False
+
+    if is_stopped():
+        return False
+
+    with metrics.span("exe_lookup") as span:
+        exe_path = find_realesrgan_exe()
+        span.set(ok=exe_path is not None)
+    if not exe_path:
+        print("Real-ESRGAN executable not found!")
+        return False
+
+    model = realesrgan_model(scale)
+    if model is None:
+        print(f"No x{scale} Real-ESRGAN model installed!")
+        return False
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    output_path = _result_path(input_path, output_path)
+
+    # The binary writes JPEG, PNG and WebP; other formats and options go through a PNG
+    fmt = _native_format(output_path)
+    written_path = output_path if fmt else output_path + ".png"
+    cmd = build_command(exe_path, input_path, written_path, scale, fmt or "png", model,
+                        runtime_options(exe_path, scale, [input_path]))
+
+    try:
+        print("Processing image...")
+        import supervisor
+
+        with progress_bar(total=100, unit='%', desc=f"Enhancing {os.path.basename(input_path)}", dynamic_ncols=True) as pbar:
+            def on_event(event):
+                if event["type"] == "progress":
+                    pbar.n = event["percent"]
+                    pbar.refresh()
+
+            proc = supervisor.SupervisedProcess(cmd, os.path.basename(input_path), on_event,
+                                                PROCESS_TIMEOUT, PROCESS_IDLE_TIMEOUT)
+            with metrics.span("spawn", backend="realesrgan"):
+                proc.start()
+            _track(proc)
+            with metrics.span("inference", backend="realesrgan") as span:
+                result = proc.wait(should_stop=is_stopped)
+                span.set(ok=result.ok, timed_out=result.timed_out)
+                if span.enabled:
+                    span.add_file("in", input_path)
+                    span.add_file("out", written_path)
+            if result.ok:
+                pbar.n = 100
+                pbar.refresh()
+
+        if result.ok and not fmt and os.path.exists(written_path):
+            _convert(written_path, output_path, input_path).result()
+        if result.ok and not is_stopped():
+            print("✅ Image enhanced successfully!")
+            return True
+        if result.timed_out:
+            print(f"❌ Real-ESRGAN timed out after {result.elapsed:.0f}s")
+            logging.error(f"Real-ESRGAN timed out on {input_path}")
+        elif not is_stopped():
+            print(f"❌ Error: {result.stderr[-2000:]}")
+            logging.error(result.stderr[-2000:])
+        return False
+    except Exception as e:
+        print(f"Error running enhancement: {e}")
+        logging.error(f"Enhancement error: {e}")
+        return False
+    finally:
+        _track(None)
+        if not fmt and os.path.exists(written_path):
+            os.remove(written_path)
+
+def _stage_file(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        import shutil
+        shutil.copy2(src, dst)
+
+def _decodes(path):
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            img.load()
+        return True
+    except Exception:
+        return False
+
+def enhance_batch(jobs, scale=4):
+    """Run a single Real-ESRGAN process over many (input_path, output_path) pairs.
+
+    The inputs are staged into a temporary directory and the binary is run once
+    in directory mode, so the model is loaded and the Vulkan device created only
+    once per batch. The binary writes one format per run, so a batch with mixed
+    output formats makes one run per format. Returns the list of jobs that did
+    not produce an output, or None if the Real-ESRGAN backend is not available
+    at all.
+    """
+
+    if not jobs:
+        return []
+
+    with metrics.span("toolchain_check") as span:
+        available = realesrgan_available()
+        span.set(ok=available)
+    if not available:
+        return None
+
+    if is_stopped():
+        return list(jobs)
+
+    with metrics.span("exe_lookup") as span:
+        exe_path = find_realesrgan_exe()
+        span.set(ok=exe_path is not None)
+    if not exe_path:
+        print("Real-ESRGAN executable not found!")
+        return None
+
+    model = realesrgan_model(scale)
+    if model is None:
+        print(f"No x{scale} Real-ESRGAN model installed!")
+        return None
+
+    groups = {}
+    for index, (input_path, output_path) in enumerate(jobs):
+        final_path = _result_path(input_path, output_path)
+        fmt = _native_format(final_path) or ""
+        groups.setdefault(fmt, []).append((index, input_path, output_path, final_path))
+
+    failed = []
+    for fmt, group in groups.items():
+        if is_stopped():
+            failed.extend((input_path, output_path) for _, input_path, output_path, _ in group)
+        else:
+            failed.extend(_run_batch(exe_path, model, group, scale, fmt))
+
+    done = len(jobs) - len(failed)
+    print(f"✅ Batch finished: {done}/{len(jobs)} images enhanced")
+    return failed
+
+def _run_batch(exe_path, model, group, scale, fmt):
+    """One directory-mode run writing fmt ("" for PNG converted afterwards); returns the failed jobs."""
+    import shutil
+    import tempfile
+    stage_dir = tempfile.mkdtemp(prefix="realesrgan-batch-")
+    stage_in = os.path.join(stage_dir, "in")
+    stage_out = os.path.join(stage_dir, "out")
+    os.makedirs(stage_in)
+    os.makedirs(stage_out)
+
+    # Staged names are the job index, so outputs map back without ambiguity
+    staged = []
+    failed = []
+    with metrics.span("stage", images=len(group)):
+        for index, input_path, output_path, final_path in group:
+            ext = os.path.splitext(input_path)[1]
+            stem = f"{index:08d}"
+            try:
+                _stage_file(input_path, os.path.join(stage_in, stem + ext))
+            except OSError as e:
+                logging.error(f"Could not stage {input_path}: {e}")
+                failed.append((input_path, output_path))
+                continue
+            staged.append((stem, input_path, output_path, final_path))
+
+    options = runtime_options(exe_path, scale, [input_path for _, input_path, _, _ in staged])
+    cmd = build_command(exe_path, stage_in, stage_out, scale, fmt or "png", model, options)
+
+    try:
+        print(f"Processing {len(staged)} images in one batch...")
+        import supervisor
+
+        with progress_bar(total=len(staged), unit="img", desc="Enhancing batch", dynamic_ncols=True) as pbar:
+            def on_event(event):
+                if event["type"] == "progress":
+                    pbar.n = min(event["passes"] + event["percent"] / 100, len(staged))
+                    pbar.refresh()
+
+            # Timeouts are per image, so scale the overall limit with the batch
+            timeout = PROCESS_TIMEOUT * len(staged) if PROCESS_TIMEOUT else None
+            proc = supervisor.SupervisedProcess(cmd, "batch", on_event, timeout, PROCESS_IDLE_TIMEOUT)
+            with metrics.span("spawn", backend="realesrgan", images=len(staged)):
+                proc.start()
+            _track(proc)
+            with metrics.span("inference", backend="realesrgan", images=len(staged)) as span:
+                result = proc.wait(should_stop=is_stopped)
+                span.set(ok=result.ok, timed_out=result.timed_out)
+                if span.enabled:
+                    span.set(in_bytes=sum(os.path.getsize(input_path) for _, input_path, _, _ in staged))
+            pbar.n = len(os.listdir(stage_out))
+            pbar.refresh()
+
+        if result.timed_out:
+            print(f"❌ Batch timed out after {result.elapsed:.0f}s")
+            logging.error("Real-ESRGAN batch timed out")
+        elif result.returncode != 0 and not is_stopped():
+            print(f"❌ Batch error (exit code {result.returncode}): {result.stderr[-2000:]}")
+            logging.error(result.stderr[-2000:])
+
+        conversions = []
+        for stem, input_path, output_path, final_path in staged:
+            result = os.path.join(stage_out, f"{stem}.{fmt or 'png'}")
+            # After a stop the binary may have been killed mid-write
+            if os.path.exists(result) and os.path.getsize(result) > 0 and \
+                    (not is_stopped() or _decodes(result)):
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                if fmt:
+                    shutil.move(result, final_path)
+                else:
+                    conversions.append((_convert(result, final_path, input_path), input_path, output_path))
+            else:
+                failed.append((input_path, output_path))
+        # Re-encodes run on the encode threads in parallel; the staged PNGs must outlive them
+        for future, input_path, output_path in conversions:
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Could not encode {output_path}: {e}")
+                failed.append((input_path, output_path))
+        return failed
+    except Exception as e:
+        print(f"Error running batch enhancement: {e}")
+        logging.error(f"Batch enhancement error: {e}")
+        return [(input_path, output_path) for _, input_path, output_path, _ in group]
+    finally:
+        _track(None)
+        shutil.rmtree(stage_dir, ignore_errors=True)
+
+def _needs_tiling(input_path, scale, memory_budget):
+    import tiling
+    from PIL import Image
+    with Image.open(input_path) as img:
+        width, height = img.size
+    return tiling.needs_tiling(width, height, scale, memory_budget)
+
+def _enhance_tiled(input_path, output_path, scale, upscale_fn, desc, memory_budget):
+    import tiling
+    print(f"Large image, upscaling in tiles within {memory_budget / 2 ** 20:.0f} MB...")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with progress_bar(total=1, desc=f"{desc} {os.path.basename(input_path)}", leave=True, dynamic_ncols=True) as pbar:
+        def progress(done, total):
+            pbar.total = total
+            pbar.n = done
+            pbar.refresh()
+            return not is_stopped()
+        return tiling.upscale_file_tiled(input_path, output_path, scale, upscale_fn,
+                                         memory_budget, progress=progress, settings=encode_settings())
+
+def _decode(cv2, input_path):
+    with metrics.span("decode") as span:
+        img = cv2.imread(input_path)
+        span.set(ok=img is not None)
+        if span.enabled and img is not None:
+            span.set(in_bytes=os.path.getsize(input_path), in_pixels=img.shape[0] * img.shape[1])
+    return img
+
+def encode_settings():
+    import encoder
+    return encoder.Settings(JPEG_QUALITY, WEBP_QUALITY, int(PNG_LEVEL) if PNG_LEVEL else None, TARGET_KB * 1024)
+
+def get_encoder():
+    global encoder_instance
+    import encoder
+    with _lock:
+        if encoder_instance is None:
+            encoder_instance = encoder.Encoder(ENCODE_WORKERS)
+    return encoder_instance
+
+@contextmanager
+def _encode_span(input_path, backend, pixels):
+    # Entered on the encode thread, which has no image context of its own
+    with metrics.image(input_path), metrics.span("encode", backend=backend, in_pixels=pixels) as span:
+        yield span
+
+def _submit_encode(image, output_path, input_path, backend, source_size=None):
+    """Queue the encode of image (an array, or a file to re-encode) to output_path; returns the Future."""
+    pixels = image.shape[0] * image.shape[1] if hasattr(image, "shape") else None
+    future = get_encoder().submit(image, output_path, encode_settings(),
+                                  span=lambda: _encode_span(input_path, backend, pixels))
+    key = os.path.abspath(output_path)
+    with _lock:
+        _encodes.pop(key, None)
+        _encodes[key] = (future, source_size)
+        while len(_encodes) > ENCODE_HISTORY:
+            _encodes.popitem(last=False)
+    return future
+
+def _encode(output_path, image, backend, input_path, source_size=None):
+    """Hand the upscaled image to the encode threads; waits for it unless encodes are deferred."""
+    future = _submit_encode(image, output_path, input_path, backend, source_size)
+    if not getattr(_job, "defer_encodes", False):
+        future.result()
+
+@contextmanager
+def _deferred_encodes():
+    """Let the CPU paths return before their output is encoded (see _wait_encode)."""
+    outer = getattr(_job, "defer_encodes", False)
+    _job.defer_encodes = True
+    try:
+        yield
+    finally:
+        _job.defer_encodes = outer
+
+def _wait_encode(output_path):
+    """Wait for output_path's queued encode; False if it failed, True if it succeeded or there was none."""
+    with _lock:
+        entry = _encodes.get(os.path.abspath(output_path))
+    if entry is None:
+        return True
+    try:
+        entry[0].result()
+        return True
+    except Exception as e:
+        print(f"Could not encode {os.path.basename(output_path)}: {e}")
+        logging.error(f"Encode error: {e}")
+        return False
+
+def _encode_info(output_path):
+    """(Encoded, source size) of output_path's finished encode, or None."""
+    with _lock:
+        entry = _encodes.get(os.path.abspath(output_path))
+    if entry is None or not entry[0].done() or entry[0].exception() is not None:
+        return None
+    return entry[0].result(), entry[1]
+
+def _remember_size(input_path, size):
+    key = os.path.abspath(input_path)
+    with _lock:
+        _input_sizes.pop(key, None)
+        _input_sizes[key] = size
+        while len(_input_sizes) > ENCODE_HISTORY:
+            _input_sizes.popitem(last=False)
+
+def _input_size(input_path):
+    """(width, height) of input_path, from an earlier pass if there was one, else its header."""
+    with _lock:
+        size = _input_sizes.get(os.path.abspath(input_path))
+    if size is None:
+        from PIL import Image
+        with Image.open(input_path) as img:
+            size = img.size
+    return size
+
+def enhance_with_cpu_engine(input_path, output_path, scale=4, memory_budget=DEFAULT_MEMORY_BUDGET):
+    output_path = _result_path(input_path, output_path)
+    try:
+        if is_stopped():
+            return False
+        import cv2
+        import cpu_engine
+        with metrics.span("model_load", backend="cpu"):
+            installed = get_toolchain()
+            if installed and installed.models_dir:
+                engine = cpu_engine.load_model(scale, installed.models_dir)
+            else:
+                engine = cpu_engine.load_model(scale)
+        print("Using the NumPy CPU engine (no Vulkan device)...")
+        if _needs_tiling(input_path, scale, memory_budget):
+            # Tiles are encoded as they are produced, so this span includes the encode
+            with metrics.span("inference", backend="cpu", tiled=True) as span:
+                ok = _enhance_tiled(input_path, output_path, scale, engine.process, "CPU", memory_budget)
+                span.set(ok=ok)
+                if span.enabled:
+                    span.add_file("in", input_path)
+            if not ok:
+                return False
+            print("✅ CPU enhancement completed!")
+            return True
+
+        img = _decode(cv2, input_path)
+        if img is None:
+            print("Could not read input image!")
+            return False
+
+        with progress_bar(total=1, desc=f"CPU {os.path.basename(input_path)}", leave=True, dynamic_ncols=True) as pbar:
+            def progress(done, total):
+                pbar.total = total
+                pbar.n = done
+                pbar.refresh()
+            with metrics.span("inference", backend="cpu", in_pixels=img.shape[0] * img.shape[1]):
+                upscaled = engine.process(img[:, :, ::-1], progress)[:, :, ::-1]
+
+        if is_stopped():
+            return False
+
+        _encode(output_path, upscaled, "cpu", input_path, (img.shape[1], img.shape[0]))
+        print("✅ CPU enhancement completed!")
+        return True
+    except ImportError as e:
+        print(f"CPU engine unavailable: {e}")
+        return False
+    except Exception as e:
+        print(f"CPU engine failed: {e}")
+        logging.error(f"CPU engine error: {e}")
+        return False
+
+def enhance_with_opencv(input_path, output_path, scale=4, memory_budget=DEFAULT_MEMORY_BUDGET):
+    output_path = _result_path(input_path, output_path)
+    try:
+        if is_stopped():
+            return False
+        import cv2
+        print("Using OpenCV for basic upscaling...")
+
+        def bicubic(img):
+            return cv2.resize(img, (img.shape[1] * scale, img.shape[0] * scale), interpolation=cv2.INTER_CUBIC)
+
+        if _needs_tiling(input_path, scale, memory_budget):
+            with metrics.span("inference", backend="opencv", tiled=True) as span:
+                ok = _enhance_tiled(input_path, output_path, scale, bicubic, "OpenCV", memory_budget)
+                span.set(ok=ok)
+                if span.enabled:
+                    span.add_file("in", input_path)
+            if not ok:
+                return False
+            print("✅ Basic upscaling completed!")
+            return True
+
+        img = _decode(cv2, input_path)
+        if img is None:
+            print("Could not read input image!")
+            return False
+        with metrics.span("inference", backend="opencv", in_pixels=img.shape[0] * img.shape[1]):
+            upscaled = bicubic(img)
+
+        if is_stopped():
+            return False
+
+        _encode(output_path, upscaled, "opencv", input_path, (img.shape[1], img.shape[0]))
+        with progress_bar(total=1, desc=f"OpenCV {os.path.basename(input_path)}", leave=True, dynamic_ncols=True) as pbar:
+            pbar.update(1)
+        print("✅ Basic upscaling completed!")
+        return True
+    except ImportError:
+        print("OpenCV not installed. Install it with: pip install opencv-python")
+        logging.error("OpenCV not installed")
+        return False
+    except Exception as e:
+        print(f"OpenCV enhancement failed: {e}")
+        logging.error(f"OpenCV error: {e}")
+        return False
+
+def get_result_cache():
+    global result_cache
+    with _lock:
+        if result_cache is None and RESULT_CACHE_DIR.lower() not in ("", "off"):
+            import cache
+            result_cache = cache.ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MB * 1024 * 1024)
+    return result_cache
+
+def get_cpu_pool():
+    """The shared CpuPool, or None when the fallback should run in this process."""
+    global cpu_pool_instance
+    import cpu_pool
+    with _lock:
+        if cpu_pool_instance is None and cpu_pool.plan(CPU_WORKERS or None)[0] > 1:
+            cpu_pool_instance = cpu_pool.CpuPool(CPU_WORKERS or None, DEFAULT_MEMORY_BUDGET)
+    return cpu_pool_instance
+
+def available_backends():
+    import toolchain
+    backends = ["cpu", "opencv"]
+    installed = get_toolchain()
+    # The release is only downloaded when its checksum is known
+    if os.environ.get("REALESRGAN_EXE") or (installed and installed.exe) or \
+            (toolchain.release_url() is not None and realesrgan_sha256()):
+        backends.insert(0, "realesrgan")
+    return backends
+
+def _result_path(input_path, output_path):
+    # Where the result is written: the output keeps the input's extension, whatever its case.
+    # Every backend and the cache resolve the path here so they all agree on it.
+    ext = os.path.splitext(input_path)[1]
+    return output_path if output_path.lower().endswith(ext.lower()) else output_path + ext
+
+def _cache_keys(cache, input_path, output_path, scale, backends):
+    fmt = os.path.splitext(output_path)[1]
+    options = encode_settings().describe(fmt.lower())
+    # Named after the model file that ran; this also retires entries from
+    # before outputs were written in their own format (PNGs held JPEG bytes)
+    return [cache.key(input_path, scale, f"{BACKEND_MODELS[b]}-x{scale}", b, fmt, options) for b in backends]
+
+def cache_fetch(input_path, output_path, scale):
+    cache = get_result_cache()
+    if cache is None:
+        return False
+    try:
+        with metrics.span("cache_fetch") as span:
+            # Only the backend that would run now, or a better one: never serve a bicubic
+            # result while Real-ESRGAN is available (BACKEND_MODELS is ordered best first)
+            ranked = list(BACKEND_MODELS)
+            backends = ranked[:ranked.index(available_backends()[0]) + 1]
+            hit = cache.fetch(_cache_keys(cache, input_path, output_path, scale, backends),
+                              _result_path(input_path, output_path))
+            span.set(hit=hit)
+        return hit
+    except OSError as e:
+        logging.error(f"Cache lookup failed: {e}")
+        return False
+
+def cache_store(input_path, output_path, scale, backend, seconds):
+    cache = get_result_cache()
+    result = _result_path(input_path, output_path)
+    if cache is None or not os.path.exists(result):
+        return
+    try:
+        with metrics.span("cache_store", backend=backend):
+            key = _cache_keys(cache, input_path, output_path, scale, [backend])[0]
+            cache.store(key, result, seconds, backend)
+    except OSError as e:
+        logging.error(f"Cache store failed: {e}")
+
+def _clear_output(input_path, output_path):
+    # Outputs may be hardlinked cache entries; never let a backend write through one
+    path = _result_path(input_path, output_path)
+    if os.path.exists(path):
+        os.remove(path)
+    with _lock:
+        _encodes.pop(os.path.abspath(path), None)
+
+def _enhance_chain(input_path, output_path, scale, try_realesrgan=True):
+    """Run the backends in order and return the name of the one that succeeded."""
+    _clear_output(input_path, output_path)
+    if try_realesrgan and enhance_image(input_path, output_path, scale):
+        return "realesrgan"
+    for backend, enhance in (("cpu", enhance_with_cpu_engine), ("opencv", enhance_with_opencv)):
+        if is_stopped():
+            return None
+        with metrics.span("fallback", backend=backend) as span:
+            ok = enhance(input_path, output_path, scale)
+            span.set(ok=ok)
+        if ok:
+            return backend
+    return None
+
+def process_file(input_path, output_path, scale=4):
+    """Enhance one image; returns a result dict with status, backend and output."""
+    result = {"input": input_path, "output": output_path, "backend": None}
+    with metrics.image(input_path), metrics.span("image") as span:
+        if cache_fetch(input_path, output_path, scale):
+            print(f"✅ Served {os.path.basename(input_path)} from cache")
+            result["status"] = "cached"
+            span.set(status="cached")
+            return result
+        start = time.perf_counter()
+        backend = _enhance_chain(input_path, output_path, scale)
+        seconds = time.perf_counter() - start
+        if backend and not is_stopped():
+            cache_store(input_path, output_path, scale, backend, seconds)
+        result.update(output=_result_path(input_path, output_path), backend=backend, seconds=round(seconds, 3),
+                      status="stopped" if is_stopped() else "done" if backend else "failed")
+        span.set(ok=backend is not None, status=result["status"], backend=backend)
+    return result
+
+def enhance_file(input_path, output_path, scale=4):
+    return process_file(input_path, output_path, scale)["status"] in ("done", "cached")
+
+def report_cache():
+    metrics.flush()
+    cache = get_result_cache()
+    if cache is not None:
+        print(cache.summary())
+        try:
+            cache.save_stats()
+        except OSError as e:
+            logging.error(f"Could not save cache stats: {e}")
+
+def _upscale_frames_realesrgan(frames, scale):
+    """Upscale in-memory frames with one directory-mode run; None if that failed."""
+    import shutil
+    import tempfile
+    import cv2
+    import supervisor
+
+    exe_path = find_realesrgan_exe()
+    model = realesrgan_model(scale)
+    if not exe_path or model is None:
+        return None
+    stage_dir = tempfile.mkdtemp(prefix="realesrgan-frames-")
+    stage_in = os.path.join(stage_dir, "in")
+    stage_out = os.path.join(stage_dir, "out")
+    os.makedirs(stage_in)
+    os.makedirs(stage_out)
+    try:
+        for index, frame in enumerate(frames):
+            # Lossless and light on CPU: these files live for one chunk only
+            cv2.imwrite(os.path.join(stage_in, f"{index:08d}.png"), frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        # Frames of one video share a size, so the first one picks the tuned options
+        options = runtime_options(exe_path, scale, [os.path.join(stage_in, "00000000.png")])
+        cmd = build_command(exe_path, stage_in, stage_out, scale, "png", model, options)
+        proc = supervisor.SupervisedProcess(cmd, "frames", None, PROCESS_TIMEOUT and PROCESS_TIMEOUT * len(frames),
+                                            PROCESS_IDLE_TIMEOUT)
+        proc.start()
+        _track(proc)
+        result = proc.wait(should_stop=is_stopped)
+        if not result.ok:
+            if not is_stopped():
+                logging.error(f"Real-ESRGAN failed on a video chunk: {result.stderr[-2000:]}")
+            return None
+        upscaled = [cv2.imread(os.path.join(stage_out, f"{index:08d}.png"), cv2.IMREAD_COLOR)
+                    for index in range(len(frames))]
+        return None if any(frame is None for frame in upscaled) else upscaled
+    finally:
+        _track(None)
+        shutil.rmtree(stage_dir, ignore_errors=True)
+
+def _video_upscaler(scale):
+    """upscale_frames() for video.py: Real-ESRGAN, else the CPU engine, else bicubic."""
+    import cv2
+    state = {"backend": "realesrgan" if realesrgan_available() else None, "engine": None}
+
+    def upscale_frames(frames):
+        pixels = sum(frame.shape[0] * frame.shape[1] for frame in frames)
+        if state["backend"] == "realesrgan":
+            with metrics.span("inference", backend="realesrgan", images=len(frames), in_pixels=pixels) as span:
+                upscaled = _upscale_frames_realesrgan(frames, scale)
+                span.set(ok=upscaled is not None)
+            if upscaled is not None:
+                return upscaled
+            if is_stopped():
+                return frames
+            print("Real-ESRGAN failed on this chunk; using the CPU engine for the remaining frames")
+            state["backend"] = None
+
+        if state["backend"] is None:
+            try:
+                import cpu_engine
+                installed = get_toolchain()
+                models_dir = installed.models_dir if installed and installed.models_dir else cpu_engine.MODELS_DIR
+                state["models_dir"] = models_dir
+                state["engine"] = cpu_engine.load_model(scale, models_dir)
+                state["backend"] = "cpu"
+            except (ImportError, OSError, ValueError) as e:
+                print(f"CPU engine unavailable ({e}); using bicubic upscaling")
+                state["backend"] = "opencv"
+
+        pool = get_cpu_pool() if len(frames) > 1 else None
+        with metrics.span("inference", backend=state["backend"], images=len(frames), in_pixels=pixels):
+            if pool is not None:
+                # Frames reach the workers through shared memory, a chunk at a time
+                upscaled = pool.upscale_frames(frames, scale, state.get("models_dir"), state["backend"], is_stopped)
+                return frames if upscaled is None else upscaled[0]
+            if state["backend"] == "cpu":
+                return [state["engine"].process(frame[:, :, ::-1])[:, :, ::-1] for frame in frames]
+            return [cv2.resize(frame, (frame.shape[1] * scale, frame.shape[0] * scale),
+                               interpolation=cv2.INTER_CUBIC) for frame in frames]
+
+    upscale_frames.state = state
+    return upscale_frames
+
+def enhance_video(input_path, output_path, scale=4, threshold=2, chunk=16):
+    """Upscale a video file or a folder of frames; returns frame statistics or None.
+
+    Frames within `threshold` grey levels of the last inferred frame are not
+    inferred again (see video.py); -1 turns duplicate skipping off.
+    """
+    try:
+        import video
+    except ImportError as e:
+        print(f"Video support needs OpenCV and NumPy: {e}")
+        return None
+
+    upscale_frames = _video_upscaler(scale)
+    print(f"Upscaling {os.path.basename(os.path.normpath(input_path))}...")
+    try:
+        with progress_bar(total=None, unit="frame", desc="Video", dynamic_ncols=True) as pbar:
+            def progress(done, total):
+                pbar.total = total
+                pbar.n = done
+                pbar.refresh()
+            stats = video.upscale_video(input_path, output_path, upscale_frames, chunk, threshold,
+                                        should_stop=is_stopped, progress=progress)
+    except video.Stopped:
+        print("Video upscaling stopped")
+        return None
+    except Exception as e:
+        print(f"Video upscaling failed: {e}")
+        logging.error(f"Video error: {e}")
+        return None
+
+    stats["backend"] = upscale_frames.state["backend"]
+    skipped = stats["duplicates"] / max(stats["frames"], 1) * 100
+    print(f"✅ {stats['frames']} frames written, {stats['inferred']} inferred, "
+          f"{stats['duplicates']} duplicates skipped ({skipped:.0f}%)")
+    return stats
+
+def show_results(input_path, output_path, scale):
+    with metrics.span("show_results"):
+        _show_results(input_path, _result_path(input_path, output_path), scale)
+
+def _show_results(input_path, output_path, scale):
+    try:
+        # Sizes the encoder or an earlier pass already knows; outputs are never reopened
+        known = _encode_info(output_path)
+        orig_size = (known[1] if known else None) or _input_size(input_path)
+        orig_file_size = os.path.getsize(input_path) / (1024 * 1024)
+        if known:
+            new_size = (known[0].width, known[0].height)
+            new_file_size = known[0].bytes / (1024 * 1024)
+        else:
+            # Written by Real-ESRGAN itself: its size follows from the input's
+            new_size = (orig_size[0] * scale, orig_size[1] * scale)
+            new_file_size = os.path.getsize(output_path) / (1024 * 1024)
+        print(f"\n[+] Results:")
+        print(f"   Original: {orig_size[0]}x{orig_size[1]} ({orig_file_size:.1f} MB)")
+        print(f"   Enhanced: {new_size[0]}x{new_size[1]} ({new_file_size:.1f} MB)")
+        print(f"   Scale factor: {new_size[0]/orig_size[0]:.1f}x")
+        print(f"   Output saved as: {output_path}")
+    except Exception as e:
+        print(f"Could not display results: {e}")
+        logging.error(f"Result display error: {e}")
+
+def _remove_stale_outputs(output_folder, journal):
+    # Temporary files left behind by an interrupted encode, cache copy or write-back, anywhere in
+    # the mirrored tree. Only those of this journal's outputs: other shards may be writing theirs.
+    outputs = {os.path.abspath(path) for path in journal.outputs()}
+    for folder, _, names in os.walk(output_folder):
+        for name in names:
+            if ".tmp-" in name and os.path.abspath(os.path.join(folder, name.split(".tmp-")[0])) in outputs:
+                os.remove(os.path.join(folder, name))
+
+def _open_journal(output_folder, max_retries, shard=None):
+    import journal as journal_module
+    journal = journal_module.Journal(os.path.join(output_folder, journal_module.journal_name(shard)), max_retries)
+    removed = journal.recover()
+    _remove_stale_outputs(output_folder, journal)
+    if removed:
+        print(f"Removed {removed} half-written outputs from the previous run")
+    return journal
+
+def _result(input_path, output_path, status, backend=None):
+    return {"input": input_path, "output": _result_path(input_path, output_path), "status": status,
+            "backend": backend}
+
+def _journal_name(input_path, root):
+    # Journal entries are keyed by the path relative to the input folder
+    if root is None:
+        return os.path.basename(input_path)
+    return os.path.relpath(input_path, root).replace(os.sep, "/")
+
+def _process_jobs(jobs, scale, journal=None, root=None, origin=None):
+    """Cache, one Real-ESRGAN batch, then per-file fallback; returns {input: result}.
+
+    origin maps staged (local) jobs to the real ones, which are what the
+    journal and the results refer to.
+    """
+    results = {}
+
+    def real(input_path, output_path):
+        result_path = _result_path(input_path, output_path)
+        if not origin:
+            return input_path, result_path
+        real_input, real_output = origin[(input_path, output_path)]
+        return real_input, real_output + result_path[len(output_path):]
+
+    def record(input_path, output_path, status, backend=None):
+        real_input, real_output = real(input_path, output_path)
+        results[real_input] = {"input": real_input, "output": real_output, "status": status, "backend": backend}
+
+    def begin(input_path, output_path):
+        # Records the input's size and mtime, which is_done() needs to skip it next time
+        if journal:
+            real_input, real_output = origin[(input_path, output_path)] if origin else (input_path, output_path)
+            journal.start(_journal_name(real_input, root), input_path, real_output, scale)
+
+    def finish(input_path, output_path, ok):
+        if journal:
+            real_input, real_output = real(input_path, output_path)
+            journal.finish(_journal_name(real_input, root), ok, output=real_output)
+
+    pending = []
+    for job in jobs:
+        with metrics.image(job[0]):
+            hit = cache_fetch(*job, scale)
+        if hit:
+            begin(*job)
+            finish(*job, True)
+            record(*job, "cached")
+        else:
+            pending.append(job)
+    if len(pending) < len(jobs):
+        print(f"✅ {len(jobs) - len(pending)} images served from cache")
+
+    for job in pending:
+        begin(*job)
+
+    start = time.perf_counter()
+    failed = enhance_batch(pending, scale)
+    retry_realesrgan = failed is not None
+    failed = set(pending if failed is None else failed)
+    if retry_realesrgan:
+        seconds = (time.perf_counter() - start) / max(len(pending), 1)
+        for job in pending:
+            if job not in failed:
+                finish(*job, True)
+                record(*job, "done", "realesrgan")
+                if not is_stopped():
+                    cache_store(*job, scale, "realesrgan", seconds)
+
+    pooled = set()
+    pool = get_cpu_pool() if not retry_realesrgan and len(failed) > 1 else None
+    if pool is not None:
+        # No binary: the CPU fallback runs on every worker at once
+        todo = [job for job in jobs if job in failed]
+        for job in todo:
+            _clear_output(*job)
+        print(f"\nProcessing {len(todo)} images on {pool.workers} CPU workers...")
+        for job, backend, seconds in pool.enhance_files(todo, scale, should_stop=is_stopped):
+            if is_stopped():
+                break
+            with metrics.image(job[0]):
+                finish(*job, backend is not None)
+                record(*job, "done" if backend else "failed", backend)
+                if backend:
+                    cache_store(*job, scale, backend, seconds)
+                show_results(*job, scale)
+            pooled.add(job)
+
+    def complete(job, backend, seconds):
+        with metrics.image(job[0]):
+            if backend and not _wait_encode(_result_path(*job)):
+                backend = None
+            finish(*job, backend is not None)
+            record(*job, "done" if backend else "failed", backend)
+            if backend:
+                cache_store(*job, scale, backend, seconds)
+            show_results(*job, scale)
+
+    # The CPU paths leave their output with the encode threads; a job is
+    # completed after the next one has been inferred, so the two overlap
+    waiting = None
+    with _deferred_encodes():
+        for input_path, output_path in jobs:
+            if is_stopped():
+                break
+            if (input_path, output_path) in pooled:
+                continue
+            if (input_path, output_path) not in failed:
+                with metrics.image(input_path):
+                    show_results(input_path, output_path, scale)
+                continue
+            with metrics.image(input_path):
+                print(f"\nProcessing {os.path.basename(input_path)}...")
+                start = time.perf_counter()
+                backend = _enhance_chain(input_path, output_path, scale, retry_realesrgan)
+                seconds = time.perf_counter() - start
+            if is_stopped():
+                break
+            if waiting:
+                complete(*waiting)
+            waiting = ((input_path, output_path), backend, seconds)
+    if waiting:
+        complete(*waiting)
+
+    for job in jobs:
+        if real(*job)[0] not in results:
+            record(*job, "stopped")
+    return results
+
+def _open_staging(input_folder, output_folder):
+    """A staging.Staging when inputs or outputs are on a network mount (per STAGING), else None."""
+    import staging
+    mode = STAGING.lower()
+    if mode == "off" or (mode != "on" and not (staging.is_remote(input_folder) or staging.is_remote(output_folder))):
+        return None
+    try:
+        stage = staging.Staging(STAGING_MB * 1024 * 1024, STAGING_DIR)
+    except OSError as e:
+        logging.error(f"Could not create a staging folder: {e}")
+        return None
+    print(f"Staging through {stage.dir} ({STAGING_MB} MB)")
+    return stage
+
+def _prefetched(job_batches, stage):
+    """Yield (batch, staged futures), starting the next batch's prefetch before yielding this one."""
+    previous = None
+    for batch in job_batches:
+        current = (batch, stage.prefetch(batch[1]) if stage else None)
+        if previous is not None:
+            yield previous
+        previous = current
+    if previous is not None:
+        yield previous
+
+def _process_staged(futures, scale, journal, root, stage):
+    """_process_jobs on local copies; finished outputs are queued for write-back."""
+    staged = [future.result() for future in futures]
+    origin = {(job.local_input, job.local_output): (job.input, job.output) for job in staged}
+    results = _process_jobs(list(origin), scale, journal, root, origin)
+    commits = []
+    for job in staged:
+        stage.release(job)
+        result = results.get(job.input)
+        if result and result["status"] in ("done", "cached"):
+            local_path = job.local_output + result["output"][len(job.output):]
+            if os.path.exists(local_path):
+                stage.commit(local_path, result["output"])
+                commits.append(result)
+    return results, commits
+
+def _report_commits(stage, commits, journal, root):
+    """Wait for queued write-backs and mark the results whose write-back failed."""
+    failed = {path for path, _ in stage.drain()}
+    for result in commits:
+        if result["output"] in failed:
+            result["status"] = "failed"
+            if journal:
+                journal.finish(_journal_name(result["input"], root), False, output=result["output"])
+
+def _preflight(check, jobs, journal, root, scale, results):
+    """Reject inputs that cannot be decoded and hold back duplicates; returns (jobs to run, {duplicate: original})."""
+    infos, duplicates = check.check([input_path for input_path, _ in jobs])
+    run, links = [], {}
+    for job in jobs:
+        info = infos[job[0]]
+        if not info.error:
+            _remember_size(job[0], (info.width, info.height))
+        if info.error:
+            print(f"❌ Skipping {os.path.basename(job[0])}: {info.error}")
+            logging.error(f"Rejected {job[0]}: {info.error}")
+            if journal:
+                name = _journal_name(job[0], root)
+                journal.start(name, *job, scale)
+                journal.finish(name, False, output=job[1], error=info.error)
+            results[job[0]] = dict(_result(*job, "invalid"), error=info.error)
+        elif job[0] in duplicates:
+            links[job] = duplicates[job[0]]
+        else:
+            run.append(job)
+    return run, links
+
+def _link_duplicates(links, batch_results, results, journal, root, scale):
+    """Give each duplicate its original's output, hardlinked (or copied), and outcome."""
+    import cache
+    for (input_path, output_path), original in links.items():
+        source = batch_results.get(original) or results.get(original)
+        status = source["status"] if source else "stopped" if is_stopped() else "failed"
+        if status in ("done", "cached"):
+            try:
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                cache.link_or_copy(source["output"], output_path)
+                status = "linked"
+            except OSError as e:
+                logging.error(f"Could not link {output_path}: {e}")
+                status = "failed"
+        elif status != "stopped":
+            status = "failed"
+        if journal and status != "stopped":
+            name = _journal_name(input_path, root)
+            journal.start(name, input_path, output_path, scale)
+            journal.finish(name, status == "linked", output=output_path)
+        batch_results[input_path] = dict(_result(input_path, output_path, status, source and source["backend"]),
+                                         original=original)
+
+def _output_path(output_folder, name):
+    # Mirror the input tree: sub/dir/photo.png -> output/sub/dir/enhanced_photo.png
+    *folders, base = name.split("/")
+    return os.path.join(output_folder, *folders, f"enhanced_{base}")
+
+def _folder_jobs(input_folder, output_folder, names, scale, journal, results):
+    """Turn input names (relative paths) into jobs, recording the ones the journal says to skip."""
+    jobs = []
+    skipped = exhausted = 0
+    for name in names:
+        job = (os.path.join(input_folder, *name.split("/")), _output_path(output_folder, name))
+        if journal and journal.is_done(name, *job, scale):
+            skipped += 1
+            results[job[0]] = _result(*job, "skipped")
+        elif journal and journal.exhausted(name, job[0]):
+            exhausted += 1
+            results[job[0]] = _result(*job, "exhausted")
+        else:
+            jobs.append(job)
+    return jobs, skipped, exhausted
+
+def enhance_folder(input_folder, output_folder, scale=4, resume=True, max_retries=3, recursive=True,
+                   include=(), exclude=(), order="largest", shard=None, batch_size=256, on_result=None):
+    """Enhance every supported image under input_folder into a mirrored tree in output_folder.
+
+    The tree is scanned as a stream (scanner.scan) and processed in batches
+    of batch_size, largest files first by default. include / exclude are
+    globs on the relative path. shard=(index, count) processes only that
+    partition of the tree, so several processes or hosts can share one run.
+    When a folder is on a network mount, the next batch's inputs are
+    prefetched into local staging and outputs are written back in the
+    background (see STAGING). Unless PREFLIGHT is off, files that cannot be
+    decoded are rejected ("invalid") and byte-identical copies get a link to
+    their original's output ("linked") instead of a run of their own.
+    on_result(result) is called as each batch finishes. Returns {input: result}.
+    """
+    import scanner
+
+    os.makedirs(output_folder, exist_ok=True)
+    entries = scanner.scan(input_folder, SUPPORTED_EXTENSIONS, include, exclude, recursive, skip=[output_folder],
+                           on_error=lambda path, e: logging.error(f"Could not read {path}: {e}"))
+    if shard is not None:
+        entries = scanner.shard(entries, *shard)
+    entries = scanner.schedule(entries, order)
+
+    journal = _open_journal(output_folder, max_retries, shard) if resume else None
+    stage = _open_staging(input_folder, output_folder)
+    check = None
+    if PREFLIGHT.lower() != "off":
+        import preflight
+        check = preflight.Preflight()
+    # Per-input outcome, returned to headless callers
+    results = {}
+    counts = {"found": 0, "skipped": 0, "exhausted": 0}
+
+    def job_batches():
+        for batch in scanner.batches(entries, batch_size):
+            counts["found"] += len(batch)
+            batch_results = {}
+            jobs, skipped, exhausted = _folder_jobs(
+                input_folder, output_folder, [entry.rel for entry in batch], scale, journal, batch_results)
+            counts["skipped"] += skipped
+            counts["exhausted"] += exhausted
+            links = {}
+            if check is not None and jobs:
+                jobs, links = _preflight(check, jobs, journal, input_folder, scale, batch_results)
+            yield batch_results, jobs, links
+
+    def report(batch_results, links):
+        # Originals from this batch are written (and written back) by now
+        _link_duplicates(links, batch_results, results, journal, input_folder, scale)
+        results.update(batch_results)
+        if on_result:
+            for result in batch_results.values():
+                on_result(result)
+
+    # With staging, a batch is reported once its outputs are written back,
+    # which happens while the next batch is processing
+    unreported = None
+    try:
+        for (batch_results, jobs, links), futures in _prefetched(job_batches(), stage):
+            if is_stopped():
+                break
+            if stage is None:
+                batch_results.update(_process_jobs(jobs, scale, journal, root=input_folder))
+                report(batch_results, links)
+                continue
+            processed, commits = _process_staged(futures, scale, journal, input_folder, stage)
+            batch_results.update(processed)
+            if unreported is not None:
+                _report_commits(stage, unreported[1], journal, input_folder)
+                report(unreported[0], unreported[2])
+            unreported = (batch_results, commits, links)
+    finally:
+        if stage is not None:
+            if unreported is not None:
+                _report_commits(stage, unreported[1], journal, input_folder)
+                report(unreported[0], unreported[2])
+            stage.close()
+        if check is not None:
+            check.close()
+        if journal:
+            journal.close()
+
+    if not counts["found"]:
+        print("No supported image files found in the input folder!")
+    elif counts["skipped"] or counts["exhausted"]:
+        print(f"Resumed: {counts['skipped']} already done, {counts['exhausted']} failed {max_retries} times "
+              "and skipped")
+    if check is not None and check.stats["checked"]:
+        print(check.summary())
+    report_cache()
+    return results
+
+def watch_folder(input_folder, output_folder, scale=4, settle=2.0, batch_size=32, queue_size=256,
+                 poll=False, max_retries=3, on_result=None):
+    """Enhance files as they arrive in input_folder until Stop is pressed or the job is cancelled.
+
+    Files are picked up once they have stopped changing for `settle` seconds
+    and are processed in batches of up to batch_size through the same cache,
+    batch and fallback path as enhance_folder. The journal in output_folder
+    makes a restarted watch skip files that were already enhanced.
+    on_result(result) is called for every finished file.
+    """
+    import watch
+
+    os.makedirs(output_folder, exist_ok=True)
+    journal = _open_journal(output_folder, max_retries)
+    watcher = watch.FolderWatch(input_folder, SUPPORTED_EXTENSIONS, settle, queue_size, poll=poll).start()
+    print(f"👀 Watching {input_folder} ({watcher.backend}); press Ctrl+C to stop")
+
+    counts = {}
+    try:
+        while not is_stopped():
+            names = watcher.take(batch_size)
+            if not names:
+                continue
+            results = {}
+            jobs, _, _ = _folder_jobs(input_folder, output_folder, names, scale, journal, results)
+            results.update(_process_jobs(jobs, scale, journal, root=input_folder))
+            journal.sync()
+            for result in results.values():
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+                if on_result:
+                    on_result(result)
+    finally:
+        watcher.stop()
+        journal.close()
+        report_cache()
+    return counts
+
+def create_rounded_button(parent, text, command, bg_color, fg_color="white", width=120, height=35):
+    """Create a modern rounded button using Canvas"""
+    import tkinter as tk
+    canvas = tk.Canvas(parent, width=width, height=height, highlightthickness=0, bg=parent.cget('bg'))
+    
+    # Draw rounded rectangle
+    def draw_rounded_rect(x1, y1, x2, y2, radius=10):
+        points = []
+        for x, y in [(x1, y1 + radius), (x1, y1), (x1 + radius, y1),
+                     (x2 - radius, y1), (x2, y1), (x2, y1 + radius),
+                     (x2, y2 - radius), (x2, y2), (x2 - radius, y2),
+                     (x1 + radius, y2), (x1, y2), (x1, y2 - radius)]:
+            points.extend([x, y])
+        return canvas.create_polygon(points, smooth=True, fill=bg_color, outline="")
+    
+    rect = draw_rounded_rect(2, 2, width-2, height-2)
+    text_item = canvas.create_text(width//2, height//2, text=text, fill=fg_color, 
+                                  font=("Segoe UI", 10, "bold"))
+    
+    def on_click(event):
+        command()
+    
+    def on_enter(event):
+        canvas.itemconfig(rect, fill="#2d333b" if bg_color == SURFACE_COLOR else bg_color)
+    
+    def on_leave(event):
+        canvas.itemconfig(rect, fill=bg_color)
+    
+    canvas.bind("<Button-1>", on_click)
+    canvas.bind("<Enter>", on_enter)
+    canvas.bind("<Leave>", on_leave)
+    canvas.configure(cursor="hand2")
+    
+    return canvas
+
+def run_gui():
+    global stop_requested
+    import threading
+    import webbrowser
+    import tkinter as tk
+    from concurrent.futures import ThreadPoolExecutor
+    from tkinter import filedialog, messagebox, ttk
+    from PIL import ImageTk
+    import gui_events
+    import previews
+
+    # Only the Tk thread touches widgets; the worker posts its updates here
+    events = gui_events.EventQueue()
+    thumbs = previews.PreviewCache()
+    preview_pool = ThreadPoolExecutor(1, thread_name_prefix="preview")
+    results_shown = []
+    preview = {"key": None}
+    
+    def browse_input():
+        path = filedialog.askopenfilename() if not batch_var.get() else filedialog.askdirectory()
+        input_entry.delete(0, tk.END)
+        input_entry.insert(0, path)
+
+    def browse_output():
+        path = filedialog.askdirectory()
+        output_entry.delete(0, tk.END)
+        output_entry.insert(0, path)
+
+    def stop_process():
+        global stop_requested
+        stop_requested = True
+        if current_process:
+            try:
+                current_process.terminate()
+            except:
+                pass
+        status_label.config(text="🛑 Process stopped", fg=DANGER_COLOR)
+        
+    def reset_ui():
+        """Reset UI after process completion"""
+        start_btn_canvas.pack(pady=5)
+        stop_btn_canvas.pack_forget()
+        progress_bar.pack_forget()
+        progress_bar.stop()
+
+    def show_loading(show=True):
+        if show:
+            progress_bar.pack(fill=tk.X, padx=20, pady=10)
+            progress_bar.start()
+            start_btn_canvas.pack_forget()
+            stop_btn_canvas.pack(pady=5)
+            status_label.config(text="🚀 Processing...\n\nPlease wait while your images are being enhanced.", fg=TEXT_COLOR)
+        else:
+            reset_ui()
+
+    def see_result():
+        output_path = output_entry.get()
+        if not output_path:
+            messagebox.showwarning("Warning", "Please specify an output folder first")
+            return
+        
+        if batch_var.get():
+            if os.path.exists(output_path):
+                webbrowser.open(output_path)
+            else:
+                messagebox.showerror("Error", "Output folder doesn't exist yet")
+        else:
+            input_path = input_entry.get()
+            if not input_path:
+                messagebox.showwarning("Warning", "Please specify an input file first")
+                return
+            
+            base_name = os.path.basename(input_path)[0]
+            ext = os.path.splitext(input_path)[1]
+            enhanced_file = os.path.join(output_path, f"enhanced_{base_name}{ext}")
+            
+            if not os.path.exists(enhanced_file):
+                messagebox.showerror("Error", f"Enhanced file not found:\n{enhanced_file}")
+                return
+            if os.path.exists(enhanced_file):
+                webbrowser.open(enhanced_file)
+            else:
+                messagebox.showerror("Error", "Enhanced file not found. Please run enhancement first")
+
+    def request_preview(result):
+        key = (result["input"], result["output"])
+        preview["key"] = key
+        before, after = thumbs.peek(key[0]), thumbs.peek(key[1])
+        if before is not None and after is not None:
+            show_preview(key, before, after)
+        else:
+            preview_pool.submit(load_preview, key)
+
+    def load_preview(key):
+        # Requests queue up while the user scrolls; only the current one is decoded
+        if preview["key"] == key:
+            events.post("preview", (key, thumbs.get(key[0]), thumbs.get(key[1])))
+
+    def show_preview(key, before, after):
+        if key != preview["key"]:
+            return
+        for label, image, caption in ((before_label, before, "Before"), (after_label, after, "After")):
+            photo = ImageTk.PhotoImage(image) if image is not None else None
+            label.config(image=photo or blank_preview, text="" if photo else f"{caption}\n(no preview)")
+            # Tk does not hold a reference to the image
+            label.image = photo
+
+    def add_results(results):
+        follow = not results_list.curselection() or \
+            results_list.curselection()[-1] == results_list.size() - 1
+        icons = {"done": "✅", "cached": "✅", "linked": "🔗", "failed": "❌", "invalid": "❌", "stopped": "🛑"}
+        results_shown.extend(results)
+        results_list.insert(tk.END, *(f"{icons.get(r['status'], '•')} {os.path.basename(r['input'])}  "
+                                      f"[{r['status']}]" for r in results))
+        # Keep showing the newest result unless the user picked an older one
+        first = len(results_shown) - len(results)
+        latest = [first + i for i, r in enumerate(results) if r["status"] in ("done", "cached", "linked")]
+        if follow and latest:
+            results_list.selection_clear(0, tk.END)
+            results_list.selection_set(latest[-1])
+            results_list.see(latest[-1])
+            request_preview(results_shown[latest[-1]])
+
+    def on_select(event):
+        selection = results_list.curselection()
+        if selection:
+            request_preview(results_shown[selection[0]])
+
+    def pump():
+        """Apply the worker's queued updates on the Tk thread."""
+        results = []
+        for kind, data in events.drain():
+            if kind == "result":
+                results.append(data)
+                continue
+            if results:
+                add_results(results)
+                results = []
+            if kind == "status":
+                status_label.config(text=data[0], fg=data[1])
+            elif kind == "preview":
+                show_preview(*data)
+            elif kind == "dialog":
+                getattr(messagebox, data[0])(data[1], data[2])
+            elif kind == "done":
+                reset_ui()
+        if results:
+            add_results(results)
+        root.after(GUI_POLL_MS, pump)
+
+    def threaded_start():
+        global stop_requested
+        stop_requested = False
+        
+        if not input_entry.get() or not output_entry.get():
+            messagebox.showerror("Error", "Please specify input and output paths")
+            return
+        
+        # Widgets are read here, on the Tk thread, not in the worker
+        inp = input_entry.get()
+        out = output_entry.get()
+        scale = int(scale_var.get())
+        batch = batch_var.get()
+        show_loading(True)
+        results_list.delete(0, tk.END)
+        results_shown.clear()
+        
+        def process():
+            global stop_requested
+            counts = {}
+
+            def on_result(result):
+                events.post("result", result)
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+                summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+                events.post("status", (f"🚀 Processing...\n\n{summary}", TEXT_COLOR))
+
+            try:
+                if not os.path.exists(inp):
+                    events.post("dialog", ("showerror", "Error", "Input path not found"))
+                    return
+                
+                os.makedirs(out, exist_ok=True)
+                
+                if batch:
+                    enhance_folder(inp, out, scale, on_result=on_result)
+                else:
+                    output_file = os.path.join(out, f"enhanced_{os.path.basename(inp)}")
+                    on_result(process_file(inp, output_file, scale))
+                    if not stop_requested:
+                        show_results(inp, output_file, scale)
+                        report_cache()
+                
+                if not stop_requested:
+                    events.post("status", ("✅ Enhancement completed successfully!\n\nYour enhanced images are ready in the output folder.", SUCCESS_COLOR))
+                    events.post("dialog", ("showinfo", "Success", "Enhancement completed successfully!"))
+                else:
+                    events.post("status", ("🛑 Process stopped by user\n\nEnhancement was cancelled.", DANGER_COLOR))
+                    
+            except Exception as e:
+                if not stop_requested:
+                    events.post("dialog", ("showerror", "Error", f"An error occurred: {str(e)}"))
+                    events.post("status", ("❌ Enhancement failed\n\nAn error occurred during processing.", DANGER_COLOR))
+                logging.error(f"Processing error: {e}")
+            finally:
+                events.post("done")
+        
+        threading.Thread(target=process, daemon=True).start()
+
+    # Create main window with horizontal layout
+    root = tk.Tk()
+    root.title("AI Image Enhancer")
+    root.geometry("1000x600")
+    root.configure(bg=BG_COLOR)
+    root.resizable(True, True)
+    
+    # Configure styles
+    style = ttk.Style()
+    style.theme_use('clam')
+    style.configure("TProgressbar", 
+                   troughcolor=SECONDARY_COLOR,
+                   background=ACCENT_COLOR,
+                   borderwidth=1,
+                   lightcolor=ACCENT_COLOR,
+                   darkcolor=ACCENT_COLOR)
+    
+    # Main horizontal container
+    main_container = tk.Frame(root, bg=BG_COLOR, padx=20, pady=20)
+    main_container.pack(expand=True, fill=tk.BOTH)
+    
+    # Left panel for controls
+    left_panel = tk.Frame(main_container, bg=SURFACE_COLOR, width=350)
+    left_panel.pack(side=tk.LEFT, fill=tk.BOTH, expand=False, padx=(0, 10))
+    left_panel.pack_propagate(False)
+    
+    # Right panel for preview/status
+    right_panel = tk.Frame(main_container, bg=SURFACE_COLOR)
+    right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
+    
+    # Title in left panel
+    title_label = tk.Label(left_panel, 
+                          text="AI Image Enhancer", 
+                          font=("Segoe UI", 16, "bold"),
+                          bg=SURFACE_COLOR, fg=TEXT_COLOR)
+    title_label.pack(pady=(20, 10))
+    
+    # Subtitle
+    subtitle_label = tk.Label(left_panel,
+                             text="By Johnstri ",
+                             font=("Segoe UI", 9),
+                             bg=SURFACE_COLOR, fg=MUTED_TEXT)
+    subtitle_label.pack(pady=(0, 20))
+    
+    # Input section
+    input_section = tk.Frame(left_panel, bg=SURFACE_COLOR)
+    input_section.pack(fill=tk.X, padx=15, pady=(0, 10))
+    
+    tk.Label(input_section, text="📁 Input Path", 
+             font=("Segoe UI", 10, "bold"), bg=SURFACE_COLOR, fg=TEXT_COLOR).pack(anchor="w", pady=(0, 5))
+    
+    input_frame = tk.Frame(input_section, bg=SURFACE_COLOR)
+    input_frame.pack(fill=tk.X)
+    
+    input_entry = tk.Entry(input_frame, font=("Segoe UI", 9),
+                          bg=SECONDARY_COLOR, fg=TEXT_COLOR, 
+                          insertbackground=TEXT_COLOR, bd=0, highlightthickness=1,
+                          highlightcolor=ACCENT_COLOR, highlightbackground=SECONDARY_COLOR)
+    input_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+    
+    browse_input_btn = create_rounded_button(input_frame, "Browse", browse_input, ACCENT_COLOR, width=80, height=25)
+    browse_input_btn.pack(side=tk.RIGHT)
+    
+    # Output section
+    output_section = tk.Frame(left_panel, bg=SURFACE_COLOR)
+    output_section.pack(fill=tk.X, padx=15, pady=(0, 10))
+    
+    tk.Label(output_section, text="💾 Output Folder", 
+             font=("Segoe UI", 10, "bold"), bg=SURFACE_COLOR, fg=TEXT_COLOR).pack(anchor="w", pady=(0, 5))
+    
+    output_frame = tk.Frame(output_section, bg=SURFACE_COLOR)
+    output_frame.pack(fill=tk.X)
+    
+    output_entry = tk.Entry(output_frame, font=("Segoe UI", 9),
+                           bg=SECONDARY_COLOR, fg=TEXT_COLOR,
+                           insertbackground=TEXT_COLOR, bd=0, highlightthickness=1,
+                           highlightcolor=ACCENT_COLOR, highlightbackground=SECONDARY_COLOR)
+    output_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+    
+    browse_output_btn = create_rounded_button(output_frame, "Browse", browse_output, ACCENT_COLOR, width=80, height=25)
+    browse_output_btn.pack(side=tk.RIGHT)
+    
+    # Settings section
+    settings_section = tk.Frame(left_panel, bg=SURFACE_COLOR)
+    settings_section.pack(fill=tk.X, padx=15, pady=(0, 15))
+    
+    tk.Label(settings_section, text="⚙️ Settings", 
+             font=("Segoe UI", 10, "bold"), bg=SURFACE_COLOR, fg=TEXT_COLOR).pack(anchor="w", pady=(0, 10))
+    
+    scale_frame = tk.Frame(settings_section, bg=SURFACE_COLOR)
+    scale_frame.pack(fill=tk.X, pady=5)
+    
+    tk.Label(scale_frame, text="Scale:", font=("Segoe UI", 9),
+             bg=SURFACE_COLOR, fg=TEXT_COLOR).pack(side=tk.LEFT)
+    
+    scale_var = tk.StringVar(value="4")
+    scale_2_btn = tk.Radiobutton(scale_frame, text="2x", variable=scale_var, value="2",
+                                bg=SURFACE_COLOR, fg=TEXT_COLOR, selectcolor=SECONDARY_COLOR,
+                                font=("Segoe UI", 9))
+    scale_2_btn.pack(side=tk.LEFT, padx=(10, 5))
+    
+    scale_3_btn = tk.Radiobutton(scale_frame, text="3x", variable=scale_var, value="3",
+                                bg=SURFACE_COLOR, fg=TEXT_COLOR, selectcolor=SECONDARY_COLOR,
+                                font=("Segoe UI", 9))
+    scale_3_btn.pack(side=tk.LEFT, padx=(0, 5))
+    
+    scale_4_btn = tk.Radiobutton(scale_frame, text="4x", variable=scale_var, value="4",
+                                bg=SURFACE_COLOR, fg=TEXT_COLOR, selectcolor=SECONDARY_COLOR,
+                                font=("Segoe UI", 9))
+    scale_4_btn.pack(side=tk.LEFT)
+    
+    batch_var = tk.BooleanVar()
+    batch_check = tk.Checkbutton(settings_section, text="Batch Mode [Process Folder]", 
+                                variable=batch_var, font=("Segoe UI", 9),
+                                bg=SURFACE_COLOR, fg=TEXT_COLOR, selectcolor=SECONDARY_COLOR)
+    batch_check.pack(anchor="w", pady=(10, 0))
+    
+    # Control buttons section
+    control_section = tk.Frame(left_panel, bg=SURFACE_COLOR)
+    control_section.pack(fill=tk.X, padx=15, pady=15)
+    
+    start_btn_canvas = create_rounded_button(control_section, "Start Enhancement", 
+                                           threaded_start, ACCENT_COLOR, width=200, height=35)
+    start_btn_canvas.pack(pady=5)
+    
+    stop_btn_canvas = create_rounded_button(control_section, "Stop Process", 
+                                          stop_process, DANGER_COLOR, width=200, height=35)
+    # Initially hidden
+    
+    see_result_btn = create_rounded_button(control_section, "Show Result", 
+                                         see_result, SECONDARY_COLOR, width=200, height=30)
+    see_result_btn.pack(pady=(10, 0))
+    
+    # Progress bar in left panel
+    progress_bar = ttk.Progressbar(control_section, mode="indeterminate")
+    
+    # Right panel content
+    right_title = tk.Label(right_panel, text="Status & Preview", 
+                          font=("Segoe UI", 14, "bold"),
+                          bg=SURFACE_COLOR, fg=TEXT_COLOR)
+    right_title.pack(pady=(20, 15))
+    
+    # Status area
+    status_frame = tk.Frame(right_panel, bg=SECONDARY_COLOR, relief=tk.FLAT, bd=0)
+    status_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 20))
+    
+    status_label = tk.Label(status_frame, text="🔄 Ready to enhance images\n\nSelect input file/folder and output directory to begin.", 
+                           font=("Segoe UI", 11), bg=SECONDARY_COLOR, fg=TEXT_COLOR, 
+                           justify=tk.CENTER, wraplength=300)
+    status_label.pack(pady=(15, 10))
+    
+    # Before/after thumbnails of the selected result
+    preview_frame = tk.Frame(status_frame, bg=SECONDARY_COLOR)
+    preview_frame.pack(fill=tk.X, padx=10)
+    # A blank image keeps the labels' size in pixels while there is no preview
+    blank_preview = tk.PhotoImage(width=previews.SIZE[0], height=previews.SIZE[1])
+    before_label = tk.Label(preview_frame, text="Before", image=blank_preview, compound=tk.CENTER,
+                            font=("Segoe UI", 9), bg=SECONDARY_COLOR, fg=MUTED_TEXT)
+    before_label.pack(side=tk.LEFT, expand=True)
+    after_label = tk.Label(preview_frame, text="After", image=blank_preview, compound=tk.CENTER,
+                           font=("Segoe UI", 9), bg=SECONDARY_COLOR, fg=MUTED_TEXT)
+    after_label.pack(side=tk.RIGHT, expand=True)
+    
+    # Results of the current run; selecting one shows its preview
+    list_frame = tk.Frame(status_frame, bg=SECONDARY_COLOR)
+    list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    results_scroll = tk.Scrollbar(list_frame)
+    results_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+    results_list = tk.Listbox(list_frame, font=("Segoe UI", 9), bg=SURFACE_COLOR, fg=TEXT_COLOR, bd=0,
+                              highlightthickness=0, selectbackground=ACCENT_COLOR, activestyle="none",
+                              yscrollcommand=results_scroll.set)
+    results_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    results_scroll.config(command=results_list.yview)
+    results_list.bind("<<ListboxSelect>>", on_select)
+    
+    # Footer
+    footer_label = tk.Label(left_panel, 
+                           text="Powered by Real-ESRGAN",
+                           font=("Segoe UI", 7), bg=SURFACE_COLOR, fg=MUTED_TEXT)
+    footer_label.pack(side=tk.BOTTOM, pady=(0, 10))
+    
+    root.after(GUI_POLL_MS, pump)
+    root.mainloop()
+    preview_pool.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
     run_gui()
\ No newline at end of file
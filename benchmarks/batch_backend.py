@@ -0,0 +1,56 @@
+"""Compare one-process-per-image against the folder-level batch backend.
+
+    python benchmarks/batch_backend.py [--count 50] [--size 64]
+
+Uses the stand-in binary unless REALESRGAN_EXE is already set.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+os.environ.setdefault("REALESRGAN_EXE", os.path.join(HERE, "fake_realesrgan_ncnn_vulkan.py"))
+
+from PIL import Image  # noqa: E402
+
+import app  # noqa: E402
+
+
+def make_corpus(folder, count, size):
+    for i in range(count):
+        Image.new("RGB", (size, size), (i % 256, 64, 128)).save(os.path.join(folder, f"frame_{i:05d}.png"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--scale", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "in")
+        os.makedirs(src)
+        make_corpus(src, args.count, args.size)
+        jobs = [(os.path.join(src, f), os.path.join(tmp, "per_image", f"enhanced_{f}")) for f in sorted(os.listdir(src))]
+
+        start = time.perf_counter()
+        for input_path, output_path in jobs:
+            app.enhance_image(input_path, output_path, args.scale)
+        per_image = time.perf_counter() - start
+
+        jobs = [(i, o.replace("per_image", "batch")) for i, o in jobs]
+        start = time.perf_counter()
+        failed = app.enhance_batch(jobs, args.scale)
+        batch = time.perf_counter() - start
+
+    print(f"\nper-image: {per_image:.2f}s ({args.count / per_image:.1f} img/s)")
+    print(f"batch:     {batch:.2f}s ({args.count / batch:.1f} img/s), {len(failed or [])} failed")
+    print(f"speedup:   {per_image / batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
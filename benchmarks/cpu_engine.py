@@ -0,0 +1,53 @@
+"""Throughput of the NumPy CPU engine against the bicubic OpenCV fallback.
+
+    python benchmarks/cpu_engine.py [--size 128] [--scale 4] [--threads N]
+
+Run from the repository root so the bundled models are found.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+import cpu_engine  # noqa: E402
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--scale", type=int, default=4, choices=[2, 3, 4])
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--tile", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    img = cv2.GaussianBlur(rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8), (5, 5), 0)
+    engine = cpu_engine.load_model(args.scale, tile=args.tile, batch=args.batch, threads=args.threads)
+    megapixels = args.size * args.size / 1e6
+
+    target = (args.size * args.scale, args.size * args.scale)
+    bicubic = timed(lambda: cv2.resize(img, target, interpolation=cv2.INTER_CUBIC), args.repeat)
+    numpy_engine = timed(lambda: engine.process(img), args.repeat)
+
+    print(f"{args.size}x{args.size} -> {args.scale}x, tile {args.tile}, batch {args.batch}, {engine.threads} threads")
+    print(f"bicubic:    {bicubic * 1000:8.1f} ms  ({megapixels / bicubic:8.2f} input MP/s)")
+    print(f"cpu engine: {numpy_engine * 1000:8.1f} ms  ({megapixels / numpy_engine:8.2f} input MP/s)")
+
+
+if __name__ == "__main__":
+    main()
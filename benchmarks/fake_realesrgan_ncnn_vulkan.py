@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Deterministic stand-in for realesrgan-ncnn-vulkan.
+
+Accepts the same command line as the real binary (file or directory mode) and
+writes nearest-neighbour upscaled images, so the enhancement paths can be run
+and benchmarked on machines without a GPU:
+
+    REALESRGAN_EXE=benchmarks/fake_realesrgan_ncnn_vulkan.py python app.py
+
+FAKE_REALESRGAN_STARTUP and FAKE_REALESRGAN_PER_IMAGE (seconds) simulate the
+model load / Vulkan device creation and the per-image inference time.
+FAKE_REALESRGAN_STDERR_BYTES adds that much log noise to stderr per image, to
+exercise pipe handling with very chatty builds.
+"""
+import os
+import sys
+import time
+
+from PIL import Image
+
+FORMATS = {"jpg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+
+def parse_args(argv):
+    opts = {"-s": "4", "-f": "png", "-t": "0", "-n": "realesr-animevideov3", "-j": "1:2:2", "-g": "auto"}
+    flags = set()
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in ("-x", "-v", "-h"):
+            flags.add(arg)
+            i += 1
+        else:
+            opts[arg] = argv[i + 1] if i + 1 < len(argv) else ""
+            i += 2
+    return opts, flags
+
+
+def upscale(input_path, output_path, scale, fmt, per_image):
+    with Image.open(input_path) as img:
+        img = img.convert("RGB")
+        noise = int(os.environ.get("FAKE_REALESRGAN_STDERR_BYTES", "0"))
+        # Report tile progress on stderr the way ncnn does
+        for step in range(4):
+            if noise:
+                sys.stderr.write(("vkQueueSubmit tile log line " * 4 + "\n") * (noise // 4 // 113 + 1))
+            sys.stderr.write(f"{step * 25:.2f}%\n")
+            sys.stderr.flush()
+            time.sleep(per_image / 4)
+        result = img.resize((img.width * scale, img.height * scale), Image.NEAREST)
+        result.save(output_path, FORMATS[fmt])
+    sys.stderr.write("100.00%\n")
+
+
+def main(argv):
+    opts, flags = parse_args(argv)
+    if "-h" in flags or "-i" not in opts or "-o" not in opts:
+        print("Usage: realesrgan-ncnn-vulkan -i infile -o outfile [options]...", file=sys.stderr)
+        return 0 if "-h" in flags else 255
+
+    scale = int(opts["-s"])
+    fmt = opts["-f"]
+    time.sleep(float(os.environ.get("FAKE_REALESRGAN_STARTUP", "0.3")))
+    per_image = float(os.environ.get("FAKE_REALESRGAN_PER_IMAGE", "0"))
+
+    if os.path.isdir(opts["-i"]):
+        os.makedirs(opts["-o"], exist_ok=True)
+        for name in sorted(os.listdir(opts["-i"])):
+            stem = os.path.splitext(name)[0]
+            try:
+                upscale(os.path.join(opts["-i"], name), os.path.join(opts["-o"], f"{stem}.{fmt}"), scale, fmt, per_image)
+            except Exception as e:
+                print(f"decode image {name} failed: {e}", file=sys.stderr)
+        return 0
+
+    try:
+        upscale(opts["-i"], opts["-o"], scale, fmt, per_image)
+    except Exception as e:
+        print(f"decode image {opts['-i']} failed: {e}", file=sys.stderr)
+        return 255
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
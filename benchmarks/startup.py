@@ -0,0 +1,50 @@
+"""Cold-start time of the headless entry point.
+
+    python benchmarks/startup.py [--runs 20]
+
+Spawns fresh interpreters that import cli and app (what every cron or service
+invocation pays before any image work) and compares them with a bare
+interpreter. Also checks that none of the heavy GUI / imaging modules load.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("tkinter", "PIL", "numpy", "cv2", "tqdm", "urllib.request")
+PROBE = f"import sys, cli, app; print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+
+
+def measure(code, runs, env):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    # Let the warm-up run write bytecode, as an installed copy would have it
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    loaded = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout.strip()
+
+    bare = measure("pass", args.runs, env)
+    cli = measure("import cli, app", args.runs, env)
+    for name, times in (("python -c pass", bare), ("import cli, app", cli)):
+        print(f"{name:16} min {min(times) * 1000:6.1f} ms  median {statistics.median(times) * 1000:6.1f} ms")
+    print(f"{'overhead':16} median {(statistics.median(cli) - statistics.median(bare)) * 1000:6.1f} ms")
+    print(f"heavy modules loaded: {loaded or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Reproducible throughput / latency suite for the enhancement paths.
+
+    python benchmarks/suite.py [--corpus 64x64:40,256x256:10,1024x768:3]
+                               [--paths image,opencv,folder] [-o results.json]
+                               [--compare baseline.json --threshold 0.15]
+
+Generates seeded synthetic corpora, then runs every (path, corpus) pair in its
+own subprocess so peak RSS is measured per case. Paths: "image"
+(enhance_image, one process per image), "opencv" (enhance_with_opencv),
+"cpu" (enhance_with_cpu_engine) and "folder" (enhance_folder, one batch).
+Reports images/sec, p50/p95 latency per image and peak RSS of the Python
+process and of its children, plus fixed per-image overheads (exe lookup,
+process spawn, JPEG encode). The result cache is disabled and the stand-in
+binary is used, with a fixed startup / per-image delay, unless a real
+Real-ESRGAN install is present or REALESRGAN_EXE is set. --compare exits
+with status 1 if any case is slower than the baseline by more than
+--threshold.
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+STAND_IN = os.path.join(HERE, "fake_realesrgan_ncnn_vulkan.py")
+PATHS = ("image", "opencv", "cpu", "folder")
+
+
+def parse_corpus(spec):
+    corpora = []
+    for part in spec.split(","):
+        size, count = part.split(":")
+        width, height = (int(v) for v in size.lower().split("x"))
+        corpora.append((width, height, int(count)))
+    return corpora
+
+
+def make_corpus(folder, width, height, count, seed=0):
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        # Blurred noise: compresses and upscales like a photo, not like a flat fill
+        img = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (7, 7), 0)
+        cv2.imwrite(os.path.join(folder, f"img_{i:05d}.png"), img)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    # Nearest rank
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb(who):
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(path, corpus_dir, out_dir, scale):
+    """Runs inside the case subprocess; returns the measurements."""
+    import resource
+    import app
+
+    app.PROGRESS_ENABLED = False
+    app.RESULT_CACHE_DIR = "off"
+    inputs = sorted(os.path.join(corpus_dir, name) for name in os.listdir(corpus_dir))
+    functions = {"image": app.enhance_image, "opencv": app.enhance_with_opencv, "cpu": app.enhance_with_cpu_engine}
+    latencies = []
+    ok = 0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if path == "folder":
+            start = time.perf_counter()
+            results = app.enhance_folder(corpus_dir, out_dir, scale, resume=False)
+            seconds = time.perf_counter() - start
+            ok = sum(result["status"] == "done" for result in results.values())
+        else:
+            fn = functions[path]
+            # Untimed warm-up so imports and model loading are not billed to the first image
+            fn(inputs[0], os.path.join(out_dir, "warmup", os.path.basename(inputs[0])), scale)
+            start = time.perf_counter()
+            for input_path in inputs:
+                t = time.perf_counter()
+                ok += bool(fn(input_path, os.path.join(out_dir, os.path.basename(input_path)), scale))
+                latencies.append(time.perf_counter() - t)
+            seconds = time.perf_counter() - start
+
+    result = {
+        "images": len(inputs), "ok": ok, "seconds": round(seconds, 4),
+        "images_per_sec": round(len(inputs) / seconds, 3) if seconds else None,
+        "mean_ms": round(seconds / len(inputs) * 1000, 3),
+        "p50_ms": None, "p95_ms": None,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+        "child_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    if latencies:
+        result["p50_ms"] = round(percentile(latencies, 50) * 1000, 3)
+        result["p95_ms"] = round(percentile(latencies, 95) * 1000, 3)
+    return result
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(percentile(samples, 50) * 1000, 3)
+
+
+def measure_overhead(corpora, scale, repeat=10):
+    """Fixed costs paid per image regardless of the image: lookup, spawn, encode."""
+    import cv2
+    import numpy as np
+    import app
+
+    exe = app.find_realesrgan_exe()
+    overhead = {"exe_lookup_ms": timed(lambda: (app.realesrgan_available(), app.find_realesrgan_exe()), repeat)}
+    # -h makes the binary exit right after argument parsing
+    cmd = app.build_command(exe, "in.png", "out.png", scale) + ["-h"]
+    overhead["process_spawn_ms"] = timed(
+        lambda: subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL), repeat)
+    rng = np.random.default_rng(0)
+    for width, height, _ in corpora:
+        img = rng.integers(0, 256, (height * scale, width * scale, 3), dtype=np.uint8)
+        overhead[f"jpeg_encode_ms_{width}x{height}"] = timed(
+            lambda: cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 95]), max(1, repeat // 2))
+    return overhead
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline_path, threshold):
+    with open(baseline_path) as f:
+        old_report = json.load(f)
+    for field in ("binary", "scale", "startup", "per_image", "cpus"):
+        if old_report["meta"].get(field) != report["meta"].get(field):
+            print(f"warning: baseline has {field}={old_report['meta'].get(field)!r}, "
+                  f"this run {report['meta'].get(field)!r}", file=sys.stderr)
+    baseline = {(r["path"], r["corpus"]): r for r in old_report["results"]}
+    regressions = []
+    print(f"\n{'case':<22} {'baseline':>10} {'now':>10} {'change':>8}", file=sys.stderr)
+    for result in report["results"]:
+        old = baseline.get((result["path"], result["corpus"]))
+        if not old or not old.get("images_per_sec") or not result.get("images_per_sec"):
+            continue
+        change = result["images_per_sec"] / old["images_per_sec"] - 1
+        flag = ""
+        if change < -threshold:
+            regressions.append(result)
+            flag = "  REGRESSION"
+        print(f"{result['path'] + ' ' + result['corpus']:<22} {old['images_per_sec']:>10.2f} "
+              f"{result['images_per_sec']:>10.2f} {change:>+7.1%}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default="64x64:40,256x256:10,1024x768:3",
+                        help="comma separated WIDTHxHEIGHT:COUNT corpora")
+    parser.add_argument("--paths", default="image,opencv,folder", help=f"any of {','.join(PATHS)}")
+    parser.add_argument("--scale", type=int, default=4, choices=[2, 3, 4])
+    parser.add_argument("--startup", type=float, default=0.3, help="stand-in model load time, seconds")
+    parser.add_argument("--per-image", type=float, default=0.02, help="stand-in inference time, seconds")
+    parser.add_argument("-o", "--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before failing")
+    parser.add_argument("--case", nargs=3, metavar=("PATH", "CORPUS_DIR", "OUT_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        json.dump(run_case(*args.case, args.scale), sys.stdout)
+        return 0
+
+    paths = [p for p in args.paths.split(",") if p]
+    unknown = set(paths) - set(PATHS)
+    if unknown:
+        parser.error(f"unknown paths: {', '.join(sorted(unknown))}")
+    corpora = parse_corpus(args.corpus)
+
+    env = dict(os.environ, ENHANCE_CACHE_DIR="off", PYTHONHASHSEED="0",
+               FAKE_REALESRGAN_STARTUP=str(args.startup), FAKE_REALESRGAN_PER_IMAGE=str(args.per_image))
+    if "REALESRGAN_EXE" not in env:
+        import toolchain
+        installed = toolchain.resolve(os.path.join(ROOT, "realesrgan"))
+        if not (installed and installed.exe):
+            env["REALESRGAN_EXE"] = STAND_IN
+    os.environ.update(env)
+    binary = "stand-in" if env.get("REALESRGAN_EXE") == STAND_IN else env.get("REALESRGAN_EXE", "installed")
+
+    report = {
+        "meta": {
+            "commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "binary": binary, "scale": args.scale, "startup": args.startup, "per_image": args.per_image,
+        },
+        "overhead": measure_overhead(corpora, args.scale),
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="enhance-bench-") as tmp:
+        for width, height, count in corpora:
+            corpus = f"{width}x{height}x{count}"
+            corpus_dir = os.path.join(tmp, corpus)
+            make_corpus(corpus_dir, width, height, count)
+            for path in paths:
+                out_dir = os.path.join(tmp, "out", corpus, path)
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--scale", str(args.scale),
+                                       "--case", path, corpus_dir, out_dir],
+                                      cwd=ROOT, env=env, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    print(f"{path} {corpus}: failed\n{proc.stderr[-2000:]}", file=sys.stderr)
+                    continue
+                result = dict(path=path, corpus=corpus, **json.loads(proc.stdout))
+                report["results"].append(result)
+                ms = lambda value: f"{value:8.1f}" if value is not None else f"{'-':>8}"  # noqa: E731
+                print(f"{path:<7} {corpus:<14} {result['images_per_sec'] or 0:>8.2f} img/s  "
+                      f"p50 {ms(result['p50_ms'])} ms  p95 {ms(result['p95_ms'])} ms  "
+                      f"rss {result['peak_rss_mb']} MB (+{result['child_peak_rss_mb']} MB children)",
+                      file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}",
+                  file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Content-addressed cache of enhancement results.
+
+Results are keyed by the SHA-256 of the input bytes plus everything that
+changes the output (scale, model, backend, output format). Stored results are
+private copies; hits are served as hardlinks when the cache and output share a
+filesystem, copies otherwise, so writers must replace outputs rather than
+rewrite them in place.
+Least recently used entries are evicted once the cache grows past its limit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import toolchain
+
+STATS_FILE = "stats.json"
+STAT_KEYS = ("hits", "misses", "stores", "evictions", "bytes_served", "seconds_saved")
+
+
+def link_or_copy(src, dst):
+    tmp = f"{dst}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class ResultCache:
+    def __init__(self, root, max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects = os.path.join(root, "objects")
+        os.makedirs(self.objects, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = None
+        self._digests = {}
+        self.stats = dict.fromkeys(STAT_KEYS, 0)
+        try:
+            with open(os.path.join(root, STATS_FILE)) as f:
+                self.stats.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def key(self, input_path, scale, model, backend, fmt, options=""):
+        st = os.stat(input_path)
+        # Re-hash only when the file changed since we last saw it
+        cached = self._digests.get(input_path)
+        if cached and cached[0] == (st.st_size, st.st_mtime_ns):
+            digest = cached[1]
+        else:
+            digest = toolchain.file_sha256(input_path)
+            self._digests[input_path] = ((st.st_size, st.st_mtime_ns), digest)
+        material = f"{digest}|{scale}|{model}|{backend}|{fmt.lower().lstrip('.')}"
+        if options:
+            # Encoder options; left out when they are the defaults, so older entries stay valid
+            material += f"|{options}"
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.objects, key[:2], key)
+
+    def fetch(self, keys, output_path):
+        """Serve the first cached result among keys to output_path.
+
+        Counts one hit or one miss per call. Returns True on a hit.
+        """
+        for key in ([keys] if isinstance(keys, str) else keys):
+            path = self._path(key)
+            try:
+                with open(path + ".json") as f:
+                    meta = json.load(f)
+                if os.path.getsize(path) != meta.get("size"):
+                    continue
+                os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+                link_or_copy(path, output_path)
+                os.utime(path)
+            except (OSError, ValueError):
+                continue
+            with self._lock:
+                self.stats["hits"] += 1
+                self.stats["bytes_served"] += meta.get("size", 0)
+                self.stats["seconds_saved"] += meta.get("seconds", 0.0)
+            return True
+        with self._lock:
+            self.stats["misses"] += 1
+        return False
+
+    def store(self, key, result_path, seconds=0.0, backend=None):
+        """Add a freshly produced result and evict old entries if needed."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(result_path)
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.copyfile(result_path, tmp)
+        os.replace(tmp, path)
+        with open(path + ".json", "w") as f:
+            json.dump({"size": size, "seconds": seconds, "backend": backend, "created": time.time()}, f)
+        with self._lock:
+            self.stats["stores"] += 1
+            if self._size is not None:
+                self._size += size
+        self._evict()
+
+    def _entries(self):
+        for shard in os.scandir(self.objects):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if not entry.name.endswith(".json"):
+                        yield entry
+
+    def _evict(self):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._entries())
+            if self._size <= self.max_bytes:
+                return
+            # Oldest mtime first; hits refresh mtime, so this is LRU order
+            entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+            target = self.max_bytes * 0.9
+            for entry in entries:
+                if self._size <= target:
+                    break
+                size = entry.stat().st_size
+                for path in (entry.path, entry.path + ".json"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                self._size -= size
+                self.stats["evictions"] += 1
+
+    def size(self):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._entries())
+            return self._size
+
+    def save_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        tmp = os.path.join(self.root, f"{STATS_FILE}.tmp-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp, "w") as f:
+            json.dump(stats, f, indent=2)
+        os.replace(tmp, os.path.join(self.root, STATS_FILE))
+
+    def summary(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / lookups * 100 if lookups else 0.0
+        return (f"Cache: {self.stats['hits']} hits / {self.stats['misses']} misses ({rate:.0f}%), "
+                f"{self.stats['seconds_saved']:.1f}s of processing saved, "
+                f"{self.size() / 2 ** 20:.1f} MB used")
@@ -0,0 +1,236 @@
+"""Headless command line entry point.
+
+    python cli.py photo.jpg -o out/
+    python cli.py frames/ -o out/ -s 2
+    python cli.py archive/ -o out/ --include '*/2023/*' --exclude '*.bmp' --shard 0/4
+    python cli.py --list files.txt -o out/
+    find /data -name '*.png' | python cli.py - -o out/
+
+    python cli.py --watch incoming/ -o out/
+    python cli.py episode.mkv -o out/ -s 2
+    python cli.py --tune -s 4
+
+Inputs may be image files, folders (processed like Batch Mode), list files
+or "-" to read paths from stdin. Folders are scanned recursively and their
+tree is mirrored into the output folder. With --watch one folder is watched and files
+are enhanced as they arrive, until Ctrl+C. Video files, and folders given
+with --frames, go through the streaming video pipeline. Every result is
+written to stdout as one JSON object per line, followed by a summary line;
+progress and log output go to stderr. --tune measures the fastest Real-ESRGAN
+tile size and thread counts on this machine and saves them for later runs.
+Never imports tkinter, and image libraries are only loaded once there is
+work to do.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from contextlib import redirect_stdout
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="cli.py", description="Upscale images with Real-ESRGAN without the GUI.")
+    parser.add_argument("inputs", nargs="*", help="image files, folders, or - to read paths from stdin")
+    parser.add_argument("-o", "--output", default="output", help="output folder (default: output)")
+    parser.add_argument("-s", "--scale", type=int, default=4, choices=[2, 3, 4])
+    parser.add_argument("--list", action="append", default=[], metavar="FILE",
+                        help="read input paths from FILE, one per line (repeatable)")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the result cache")
+    parser.add_argument("--no-resume", action="store_true", help="ignore the batch journal in output folders")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="in folders, only process files whose relative path or name matches (repeatable)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="in folders, skip matching files and directories (repeatable)")
+    parser.add_argument("--no-recursive", action="store_true", help="do not descend into subfolders")
+    parser.add_argument("--order", choices=["largest", "smallest", "scan"], default="largest",
+                        help="order files in folders by size, or keep scan order (default: largest first)")
+    parser.add_argument("--shard", metavar="INDEX/COUNT",
+                        help="only process partition INDEX (0-based) of COUNT; the split depends only on paths, "
+                             "so each process or host can take one")
+    parser.add_argument("--no-preflight", action="store_true",
+                        help="do not check headers or link duplicate inputs before processing a folder")
+    parser.add_argument("--staging", choices=["auto", "on", "off"],
+                        help="stage folder inputs and outputs through local storage (default: auto, i.e. when "
+                             "a folder is on a network mount)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and enhance files as they appear in the input folder")
+    parser.add_argument("--settle", type=float, default=2.0, metavar="SECONDS",
+                        help="with --watch, how long a file must stay unchanged before it is processed")
+    parser.add_argument("--poll", action="store_true",
+                        help="with --watch, poll instead of using inotify (needed for network shares)")
+    parser.add_argument("--frames", action="store_true",
+                        help="treat input folders as frame sequences of one video instead of separate images")
+    parser.add_argument("--dedupe-threshold", type=int, default=2, metavar="LEVELS",
+                        help="video frames within this many grey levels of the last inferred frame are "
+                             "reused instead of inferred (-1 disables, default: 2)")
+    parser.add_argument("--tile", metavar="SIZE", help="Real-ESRGAN tile size (0 = auto; default: tuned or auto)")
+    parser.add_argument("--threads", metavar="L:P:S",
+                        help="Real-ESRGAN load:proc:save thread counts (default: tuned or 1:2:2)")
+    parser.add_argument("--gpu", metavar="ID", help="Real-ESRGAN GPU device id (default: auto)")
+    parser.add_argument("--tune", action="store_true",
+                        help="benchmark tile sizes and thread counts for --scale on this machine, save the "
+                             "fastest and exit")
+    parser.add_argument("--quality", type=int, metavar="Q",
+                        help="JPEG and WebP output quality, 1-100; above 100 is lossless WebP (default: 95)")
+    parser.add_argument("--png-level", type=int, choices=range(10), metavar="0-9",
+                        help="PNG compression level (default: OpenCV's)")
+    parser.add_argument("--target-kb", type=int, metavar="KB",
+                        help="lower JPEG/WebP quality (down to 40) until each output fits in KB")
+    parser.add_argument("--cpu-workers", type=int, metavar="N",
+                        help="processes for the CPU fallback when Real-ESRGAN is unavailable "
+                             "(default: one per core; 1 runs in-process)")
+    parser.add_argument("--trace", metavar="FILE", help="write per-stage timing spans to FILE as JSON lines")
+    parser.add_argument("--metrics-file", metavar="FILE", help="keep Prometheus stage metrics in FILE")
+    parser.add_argument("-q", "--quiet", action="store_true", help="suppress progress bars and log output")
+    return parser.parse_args(argv)
+
+
+def iter_inputs(args):
+    for path in args.inputs:
+        if path == "-":
+            for line in sys.stdin:
+                if line.strip():
+                    yield line.strip()
+        else:
+            yield path
+    for list_file in args.list:
+        with open(list_file, encoding="utf-8") as f:
+            for line in f:
+                if line.strip() and not line.startswith("#"):
+                    yield line.strip()
+
+
+def emit(record, stream=None):
+    stream = stream or sys.stdout
+    stream.write(json.dumps(record) + "\n")
+    stream.flush()
+
+
+def run(args):
+    import app
+    import metrics
+
+    if args.trace or args.metrics_file:
+        metrics.enable(args.trace, args.metrics_file)
+    # SIGUSR1 switches the instrumentation on and off in a running (watch) process
+    metrics.install_signal_toggle()
+    if args.no_cache:
+        app.RESULT_CACHE_DIR = "off"
+    if args.staging:
+        app.STAGING = args.staging
+    if args.no_preflight:
+        app.PREFLIGHT = "off"
+    for name in ("tile", "threads", "gpu"):
+        if getattr(args, name) is not None:
+            setattr(app, f"REALESRGAN_{name.upper()}", getattr(args, name))
+    if args.quality is not None:
+        app.JPEG_QUALITY = min(args.quality, 100)
+        app.WEBP_QUALITY = args.quality
+    if args.png_level is not None:
+        app.PNG_LEVEL = str(args.png_level)
+    if args.target_kb is not None:
+        app.TARGET_KB = args.target_kb
+    if args.cpu_workers is not None:
+        app.CPU_WORKERS = args.cpu_workers
+    if args.quiet:
+        app.PROGRESS_ENABLED = False
+        logging.disable(logging.ERROR)
+
+    # Ctrl+C / SIGTERM stop the current job the same way the GUI's Stop button does
+    def request_stop(signum, frame):
+        app.stop_requested = True
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    if args.tune:
+        import tuning
+        try:
+            with redirect_stdout(sys.stderr):
+                results = app.tune_realesrgan(args.scale)
+        except tuning.TuningError as e:
+            print(f"cli.py: {e}", file=sys.stderr)
+            return 1
+        emit({"tuned": results, "scale": args.scale, "profile": app.TUNING_PROFILE})
+        return 0 if results else 1
+
+    counts = {}
+    start = time.perf_counter()
+    log = open(os.devnull, "w") if args.quiet else sys.stderr
+    stdout = sys.stdout
+    try:
+        if args.watch:
+            import watch
+            try:
+                with redirect_stdout(log):
+                    counts = app.watch_folder(args.inputs[0], args.output, args.scale, settle=args.settle,
+                                              poll=args.poll, on_result=lambda result: emit(result, stdout))
+            except watch.WatchError as e:
+                hint = "" if args.poll else " (try --poll)"
+                print(f"cli.py: cannot watch {args.inputs[0]}: {e}{hint}", file=sys.stderr)
+                return 1
+            inputs = []
+        else:
+            inputs = iter_inputs(args)
+        for path in inputs:
+            if app.stop_requested:
+                break
+            if (os.path.isdir(path) and args.frames) or \
+                    (os.path.isfile(path) and path.lower().endswith(app.VIDEO_EXTENSIONS)):
+                name = os.path.basename(os.path.normpath(path))
+                output_path = os.path.join(args.output, f"enhanced_{name}")
+                with redirect_stdout(log):
+                    stats = app.enhance_video(path, output_path, args.scale, args.dedupe_threshold)
+                status = "stopped" if app.stop_requested else "done" if stats else "failed"
+                counts[status] = counts.get(status, 0) + 1
+                emit(dict(stats or {}, input=path, output=output_path, status=status))
+            elif os.path.isdir(path):
+                def on_result(result):
+                    counts[result["status"]] = counts.get(result["status"], 0) + 1
+                    emit(result, stdout)
+                with redirect_stdout(log):
+                    app.enhance_folder(path, args.output, args.scale, resume=not args.no_resume,
+                                       recursive=not args.no_recursive, include=args.include, exclude=args.exclude,
+                                       order=args.order, shard=args.shard, on_result=on_result)
+            elif os.path.isfile(path):
+                output_path = os.path.join(args.output, f"enhanced_{os.path.basename(path)}")
+                with redirect_stdout(log):
+                    result = app.process_file(path, output_path, args.scale)
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+                emit(result)
+            else:
+                counts["missing"] = counts.get("missing", 0) + 1
+                emit({"input": path, "output": None, "status": "missing", "backend": None})
+    finally:
+        if log is not sys.stderr:
+            log.close()
+
+    emit({"summary": counts, "seconds": round(time.perf_counter() - start, 3), "stopped": app.stop_requested})
+    # Ctrl+C is how a watch ends, not an interruption
+    if app.stop_requested and not args.watch:
+        return 130
+    return 1 if any(counts.get(status) for status in ("failed", "missing", "exhausted", "invalid")) else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.inputs and not args.list and not args.tune:
+        print("cli.py: no inputs given (pass files, folders, --list FILE or -)", file=sys.stderr)
+        return 2
+    if args.shard:
+        import scanner
+        try:
+            args.shard = scanner.parse_shard(args.shard)
+        except ValueError as e:
+            print(f"cli.py: {e}", file=sys.stderr)
+            return 2
+    if args.watch and (len(args.inputs) != 1 or args.list or not os.path.isdir(args.inputs[0])):
+        print("cli.py: --watch takes exactly one input folder", file=sys.stderr)
+        return 2
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
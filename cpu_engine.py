@@ -0,0 +1,264 @@
+"""Pure NumPy CPU inference for the bundled realesr-animevideov3 models.
+
+Reads the ncnn .param/.bin pair directly and runs the compact
+conv / PReLU / pixel-shuffle network on tiles, so machines without Vulkan
+still get Real-ESRGAN output instead of a bicubic resize.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MODELS_DIR = os.path.join("realesrgan", "models")
+
+# ncnn tags the start of a weight blob with its storage type
+FP16_TAG = 0x01306B47
+FP32_TAG = 0x00000000
+
+_model_cache = {}
+_model_lock = threading.Lock()
+
+
+class Layer:
+    def __init__(self, kind, name, inputs, outputs, params):
+        self.kind = kind
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params
+        self.weights = {}
+
+
+def _parse_value(value):
+    if "," in value:
+        return [_parse_value(v) for v in value.split(",")]
+    if any(c in value for c in ".eE"):
+        return float(value)
+    return int(value)
+
+
+def parse_param(path):
+    with open(path) as f:
+        lines = [line.split() for line in f if line.strip()]
+    if lines[0][0] != "7767517":
+        raise ValueError(f"{path} is not an ncnn param file")
+
+    layers = []
+    for fields in lines[2:]:
+        kind, name, n_in, n_out = fields[0], fields[1], int(fields[2]), int(fields[3])
+        inputs = fields[4:4 + n_in]
+        outputs = fields[4 + n_in:4 + n_in + n_out]
+        params = {}
+        for item in fields[4 + n_in + n_out:]:
+            key, value = item.split("=", 1)
+            params[int(key)] = _parse_value(value)
+        layers.append(Layer(kind, name, inputs, outputs, params))
+    return layers
+
+
+def _read_tagged(data, offset, count):
+    tag = int(np.frombuffer(data, np.uint32, 1, offset)[0])
+    offset += 4
+    if tag == FP16_TAG:
+        values = np.frombuffer(data, np.float16, count, offset).astype(np.float32)
+        offset += (count * 2 + 3) // 4 * 4
+    elif tag == FP32_TAG:
+        values = np.frombuffer(data, np.float32, count, offset).copy()
+        offset += count * 4
+    else:
+        raise ValueError(f"Unsupported ncnn weight storage tag 0x{tag:08x}")
+    return values, offset
+
+
+def _read_raw(data, offset, count):
+    return np.frombuffer(data, np.float32, count, offset).copy(), offset + count * 4
+
+
+def load_weights(layers, path):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    offset = 0
+    for layer in layers:
+        if layer.kind == "Convolution":
+            out_ch = layer.params[0]
+            kernel = layer.params.get(1, 1)
+            size = layer.params[6]
+            weight, offset = _read_tagged(data, offset, size)
+            weight = weight.reshape(out_ch, size // (out_ch * kernel * kernel), kernel, kernel)
+            # One (in, out) matrix per kernel tap, for NHWC matmuls
+            layer.weights["taps"] = [np.ascontiguousarray(weight[:, :, ky, kx].T)
+                                     for ky in range(kernel) for kx in range(kernel)]
+            if layer.params.get(5, 0):
+                layer.weights["bias"], offset = _read_raw(data, offset, out_ch)
+        elif layer.kind == "PReLU":
+            layer.weights["slope"], offset = _read_raw(data, offset, layer.params.get(0, 1))
+
+    if offset != len(data):
+        raise ValueError(f"{path}: read {offset} bytes of weights, file has {len(data)}")
+
+
+def _convolution(layer, x):
+    n, h, w, c = x.shape
+    kernel = layer.params.get(1, 1)
+    pad = layer.params.get(4, 0)
+    if layer.params.get(3, 1) != 1 or layer.params.get(2, 1) != 1:
+        raise ValueError(f"{layer.name}: only stride 1, dilation 1 convolutions are supported")
+
+    padded = np.pad(x, ((0, 0), (pad, pad), (pad, pad), (0, 0))) if pad else x
+    oh, ow = h + 2 * pad - kernel + 1, w + 2 * pad - kernel + 1
+    out = None
+    taps = iter(layer.weights["taps"])
+    for ky in range(kernel):
+        for kx in range(kernel):
+            window = padded[:, ky:ky + oh, kx:kx + ow, :].reshape(-1, c)
+            step = window @ next(taps)
+            if out is None:
+                out = step
+            else:
+                out += step
+    if "bias" in layer.weights:
+        out += layer.weights["bias"]
+    return out.reshape(n, oh, ow, -1)
+
+
+def _prelu(layer, x):
+    return np.where(x > 0, x, x * layer.weights["slope"])
+
+
+def _pixel_shuffle(layer, x):
+    r = layer.params[0]
+    if layer.params.get(1, 0) != 0:
+        raise ValueError(f"{layer.name}: only CRD pixel shuffle is supported")
+    n, h, w, c = x.shape
+    x = x.reshape(n, h, w, c // (r * r), r, r)
+    return x.transpose(0, 1, 4, 2, 5, 3).reshape(n, h * r, w * r, c // (r * r))
+
+
+def _resize(x, fy, fx, method):
+    n, h, w, c = x.shape
+    oh, ow = int(round(h * fy)), int(round(w * fx))
+    if method == 1 and fy == int(fy) and fx == int(fx):
+        return x.repeat(int(fy), axis=1).repeat(int(fx), axis=2)
+
+    import cv2
+    interpolation = {1: cv2.INTER_NEAREST, 2: cv2.INTER_LINEAR, 3: cv2.INTER_CUBIC}[method]
+    return np.stack([cv2.resize(img, (ow, oh), interpolation=interpolation).reshape(oh, ow, c)
+                     for img in x])
+
+
+def _interp(layer, x):
+    return _resize(x, layer.params.get(1, 1.0), layer.params.get(2, 1.0), layer.params.get(0, 0))
+
+
+def _binary_op(layer, a, b):
+    op = layer.params.get(0, 0)
+    if op == 0:
+        return a + b
+    if op == 1:
+        return a - b
+    if op == 2:
+        return a * b
+    raise ValueError(f"{layer.name}: unsupported BinaryOp {op}")
+
+
+class CpuEngine:
+    """Tiled NumPy executor for an ncnn realesr-animevideov3 model."""
+
+    def __init__(self, param_path, bin_path, tile=64, tile_pad=10, batch=4, threads=None):
+        self.layers = parse_param(param_path)
+        load_weights(self.layers, bin_path)
+        for layer in self.layers:
+            if layer.kind not in ("Input", "Split", "Convolution", "PReLU", "PixelShuffle", "Interp", "BinaryOp"):
+                raise ValueError(f"Unsupported ncnn layer type {layer.kind} in {param_path}")
+        # Blobs that can be dropped once a layer has consumed them
+        self._release = []
+        for index, layer in enumerate(self.layers):
+            later = {name for other in self.layers[index + 1:] for name in other.inputs}
+            self._release.append({name for name in layer.inputs if name not in later})
+        self.tile = tile
+        self.tile_pad = tile_pad
+        self.batch = batch
+        # A CpuPool worker gets its share of the cores through ENHANCE_CPU_THREADS
+        self.threads = threads or int(os.environ.get("ENHANCE_CPU_THREADS", "0")) or os.cpu_count() or 1
+        self.scale = self._measure_scale()
+
+    def _measure_scale(self):
+        probe = np.zeros((1, 4, 4, 3), np.float32)
+        return self.forward(probe).shape[1] / 4
+
+    def forward(self, x):
+        """Run the network on an NHWC float32 batch in [0, 1] RGB."""
+        blobs = {self.layers[0].outputs[0]: x}
+        for layer, release in zip(self.layers[1:], self._release[1:]):
+            args = [blobs.pop(name) if name in release else blobs[name] for name in layer.inputs]
+            if layer.kind == "Split":
+                for name in layer.outputs:
+                    blobs[name] = args[0]
+                continue
+            if layer.kind == "Convolution":
+                result = _convolution(layer, args[0])
+            elif layer.kind == "PReLU":
+                result = _prelu(layer, args[0])
+            elif layer.kind == "PixelShuffle":
+                result = _pixel_shuffle(layer, args[0])
+            elif layer.kind == "Interp":
+                result = _interp(layer, args[0])
+            else:
+                result = _binary_op(layer, *args)
+            blobs[layer.outputs[0]] = result
+        return blobs[self.layers[-1].outputs[0]]
+
+    def process(self, image, progress=None):
+        """Upscale an HxWx3 uint8 RGB image, returning the uint8 result."""
+        h, w = image.shape[:2]
+        tile, pad = self.tile, self.tile_pad
+        rows, cols = -(-h // tile), -(-w // tile)
+        scale = self.scale
+
+        # Edge-pad so every tile (with its context border) has the same shape
+        src = np.pad(image.astype(np.float32) / 255.0,
+                     ((pad, rows * tile - h + pad), (pad, cols * tile - w + pad), (0, 0)), mode="edge")
+        out = np.empty((int(round(rows * tile * scale)), int(round(cols * tile * scale)), 3), np.uint8)
+
+        coords = [(r, c) for r in range(rows) for c in range(cols)]
+        batches = [coords[i:i + self.batch] for i in range(0, len(coords), self.batch)]
+        crop = int(round(pad * scale))
+        size = int(round(tile * scale))
+        done = [0]
+        lock = threading.Lock()
+
+        def run(batch):
+            x = np.stack([src[r * tile:r * tile + tile + 2 * pad, c * tile:c * tile + tile + 2 * pad]
+                          for r, c in batch])
+            y = self.forward(x)
+            y = np.clip(y[:, crop:crop + size, crop:crop + size] * 255.0 + 0.5, 0, 255).astype(np.uint8)
+            for (r, c), t in zip(batch, y):
+                out[r * size:(r + 1) * size, c * size:(c + 1) * size] = t
+            if progress:
+                with lock:
+                    done[0] += len(batch)
+                    progress(done[0], len(coords))
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            list(pool.map(run, batches))
+
+        return out[:int(round(h * scale)), :int(round(w * scale))]
+
+
+def model_paths(scale, models_dir=MODELS_DIR):
+    base = os.path.join(models_dir, f"realesr-animevideov3-x{scale}")
+    return base + ".param", base + ".bin"
+
+
+def load_model(scale, models_dir=MODELS_DIR, **options):
+    """Load (and cache per process) the bundled model for the given scale."""
+    key = (scale, os.path.abspath(models_dir), tuple(sorted(options.items())))
+    with _model_lock:
+        if key not in _model_cache:
+            param_path, bin_path = model_paths(scale, models_dir)
+            if not os.path.exists(param_path) or not os.path.exists(bin_path):
+                raise FileNotFoundError(f"No bundled model for {scale}x in {models_dir}")
+            _model_cache[key] = CpuEngine(param_path, bin_path, **options)
+        return _model_cache[key]
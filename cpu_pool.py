@@ -0,0 +1,227 @@
+"""Process pool for the CPU fallback (NumPy engine, then bicubic).
+
+Without the Real-ESRGAN binary every image goes through NumPy or OpenCV on
+the CPU, and one image at a time leaves most cores idle. A CpuPool spreads
+images over worker processes. Each worker is told how many threads it may
+use, so BLAS, OpenCV and the CPU engine's tile threads together never ask
+for more threads than there are cores: workers * threads <= cores. Set this
+before those libraries load, which is why workers are spawned rather than
+forked.
+
+Workers take file paths and decode, upscale and encode on their own, so no
+pixels cross process boundaries. The encoder options go with each task. Images that are already in memory (video
+frames) go through shared memory: the parent copies each frame into a
+SharedMemory block and allocates the output block, and the worker reads and
+writes them in place. Nothing is pickled but names and shapes.
+
+Stopping is per call. Each map/upscale call has a one-byte shared flag that
+the workers poll, so cancelling one job leaves the others' images running.
+"""
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS",
+               "VECLIB_MAXIMUM_THREADS", "ENHANCE_CPU_THREADS")
+# app settings that the command line may change after import; spawned workers only see the env defaults
+ENCODE_OPTIONS = ("JPEG_QUALITY", "WEBP_QUALITY", "PNG_LEVEL", "TARGET_KB")
+
+
+def plan(workers=None, cores=None):
+    """(workers, threads per worker) that fill the cores without oversubscribing them.
+
+    An explicit worker count is kept even above the core count; each worker
+    then runs single-threaded.
+    """
+    cores = cores or os.cpu_count() or 1
+    workers = max(1, workers or cores)
+    return workers, max(1, cores // workers)
+
+
+def _init(threads):
+    # Ctrl+C reaches the whole process group; the parent stops the workers through the flag
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Before NumPy / OpenCV are imported in this process
+    for var in THREAD_VARS:
+        os.environ[var] = str(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+    import app
+    app.PROGRESS_ENABLED = False
+    # The parent reports progress; the per-image prints would interleave
+    sys.stdout = open(os.devnull, "w")
+
+
+class _StopWatch:
+    """Mirror a call's shared stop flag into app.stop_requested while a task runs."""
+
+    def __init__(self, flag_name):
+        self.flag = shared_memory.SharedMemory(flag_name)
+        self.done = threading.Event()
+
+    def __enter__(self):
+        import app
+        app.stop_requested = bool(self.flag.buf[0])
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+        return self
+
+    def _poll(self):
+        import app
+        while not self.done.wait(0.2):
+            if self.flag.buf[0]:
+                app.stop_requested = True
+
+    def __exit__(self, *exc):
+        import app
+        self.done.set()
+        self.thread.join()
+        app.stop_requested = False
+        self.flag.close()
+        return False
+
+
+def _enhance_file(flag_name, input_path, output_path, scale, memory_budget, options):
+    import app
+    for name, value in options.items():
+        setattr(app, name, value)
+    with _StopWatch(flag_name):
+        start = time.perf_counter()
+        for backend, enhance in (("cpu", app.enhance_with_cpu_engine), ("opencv", app.enhance_with_opencv)):
+            if app.is_stopped():
+                return None, 0.0
+            if enhance(input_path, output_path, scale, memory_budget):
+                return backend, time.perf_counter() - start
+        return None, time.perf_counter() - start
+
+
+def _engine(scale, models_dir):
+    try:
+        import cpu_engine
+        return cpu_engine.load_model(scale, models_dir)
+    except (ImportError, OSError, ValueError):
+        return None
+
+
+def _upscale_shared(flag_name, in_name, shape, out_name, scale, models_dir, backend):
+    import numpy as np
+    with _StopWatch(flag_name):
+        src = shared_memory.SharedMemory(in_name)
+        dst = shared_memory.SharedMemory(out_name)
+        try:
+            frame = np.ndarray(shape, np.uint8, buffer=src.buf)
+            out = np.ndarray((shape[0] * scale, shape[1] * scale, shape[2]), np.uint8, buffer=dst.buf)
+            engine = _engine(scale, models_dir) if backend == "cpu" else None
+            if engine is not None:
+                out[...] = engine.process(frame[:, :, ::-1])[:, :, ::-1]
+                return "cpu"
+            import cv2
+            cv2.resize(frame, (shape[1] * scale, shape[0] * scale), dst=out, interpolation=cv2.INTER_CUBIC)
+            return "opencv"
+        finally:
+            # The views must go before the blocks can be closed
+            del frame, out
+            src.close()
+            dst.close()
+
+
+class _Flag:
+    def __init__(self):
+        self.shm = shared_memory.SharedMemory(create=True, size=1)
+        self.shm.buf[0] = 0
+
+    def set(self):
+        self.shm.buf[0] = 1
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class CpuPool:
+    def __init__(self, workers=None, memory_budget=None):
+        self.workers, self.threads = plan(workers)
+        # Each worker gets its share of the working-set limit
+        self.memory_budget = memory_budget // self.workers if memory_budget else None
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init, initargs=(self.threads,))
+
+    def enhance_files(self, jobs, scale, should_stop=None):
+        """Upscale (input, output) jobs; yields (job, backend or None, seconds) as each finishes."""
+        import app
+        flag = _Flag()
+        options = {name: getattr(app, name) for name in ENCODE_OPTIONS}
+        futures = {self._pool.submit(_enhance_file, flag.shm.name, input_path, output_path, scale,
+                                     self.memory_budget, options): (input_path, output_path)
+                   for input_path, output_path in jobs}
+        try:
+            for future in self._wait(futures, flag, should_stop):
+                try:
+                    backend, seconds = future.result()
+                except Exception:
+                    backend, seconds = None, 0.0
+                yield futures[future], backend, seconds
+        finally:
+            for future in futures:
+                future.cancel()
+            flag.set()
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()
+            flag.close()
+
+    def upscale_frames(self, frames, scale, models_dir=None, backend="cpu", should_stop=None):
+        """Upscale in-memory BGR uint8 frames through shared memory; returns (frames, backend) or None if stopped."""
+        import numpy as np
+        flag = _Flag()
+        blocks = []
+        futures = {}
+        try:
+            for index, frame in enumerate(frames):
+                frame = np.ascontiguousarray(frame)
+                src = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+                dst = shared_memory.SharedMemory(create=True, size=frame.nbytes * scale * scale)
+                blocks += [src, dst]
+                np.ndarray(frame.shape, np.uint8, buffer=src.buf)[...] = frame
+                future = self._pool.submit(_upscale_shared, flag.shm.name, src.name, frame.shape, dst.name, scale,
+                                           models_dir, backend)
+                futures[future] = (index, dst, frame.shape)
+            results = [None] * len(frames)
+            used = set()
+            for future in self._wait(futures, flag, should_stop):
+                index, dst, shape = futures[future]
+                used.add(future.result())
+                results[index] = np.ndarray((shape[0] * scale, shape[1] * scale, shape[2]), np.uint8,
+                                            buffer=dst.buf).copy()
+            if any(result is None for result in results):
+                return None
+            return results, "cpu" if used == {"cpu"} else "opencv"
+        finally:
+            flag.set()
+            for future in futures:
+                future.cancel()
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()
+            for block in blocks:
+                block.close()
+                block.unlink()
+            flag.close()
+
+    def _wait(self, futures, flag, should_stop):
+        """Yield futures as they finish; once should_stop() is true, raise the flag and stop."""
+        pending = set(futures)
+        while pending:
+            if should_stop and should_stop():
+                flag.set()
+                return
+            finished, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            yield from finished
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
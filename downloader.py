@@ -0,0 +1,254 @@
+"""Resumable, parallel, checksum-verified downloads.
+
+Large files are fetched with several HTTP range requests at once into a
+preallocated .part file. Per-segment progress is kept in a .part.json sidecar
+so an interrupted download resumes where it stopped. Sources can be remapped
+to a local mirror directory, a file:// URL or another HTTP base URL for
+air-gapped nodes. A SHA-256 is checked before the file is moved into place.
+"""
+import json
+import os
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import toolchain
+
+CHUNK_SIZE = 1024 * 1024
+MIN_SEGMENT = 4 * 1024 * 1024
+STATE_EVERY = 8 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+class Stopped(DownloadError):
+    pass
+
+
+def mirror_url(url, mirror=None):
+    """Map url onto a mirror: a directory, a file:// URL or an http(s) base URL."""
+    mirror = mirror or os.environ.get("REALESRGAN_MIRROR")
+    if not mirror:
+        return url
+    name = os.path.basename(urllib.parse.urlparse(url).path)
+    if "://" in mirror:
+        return mirror.rstrip("/") + "/" + name
+    return urllib.parse.urljoin("file:", urllib.request.pathname2url(os.path.abspath(os.path.join(mirror, name))))
+
+
+def _local_path(url):
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme == "file":
+        return urllib.request.url2pathname(parsed.path)
+    if parsed.scheme == "":
+        return url
+    return None
+
+
+def fetch_checksum(url, timeout=30):
+    """Read a '<sha256>  <name>' sidecar published next to url, if there is one."""
+    local = _local_path(url + ".sha256")
+    try:
+        if local is not None:
+            with open(local) as f:
+                text = f.read()
+        else:
+            with urllib.request.urlopen(url + ".sha256", timeout=timeout) as response:
+                text = response.read(4096).decode("ascii", "replace")
+    except (OSError, urllib.error.URLError):
+        return None
+    token = text.split()[0] if text.split() else ""
+    return token.lower() if len(token) == 64 else None
+
+
+def _probe(url, timeout):
+    request = urllib.request.Request(url, headers={"Range": "bytes=0-0"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        if response.status == 206:
+            content_range = response.headers.get("Content-Range", "")
+            total = content_range.rsplit("/", 1)[-1]
+            return (int(total) if total.isdigit() else None), True
+        length = response.headers.get("Content-Length")
+        return (int(length) if length and length.strip().isdigit() else None), False
+
+
+def _plan_segments(size, connections):
+    count = max(1, min(connections, size // MIN_SEGMENT))
+    step = -(-size // count)
+    return [[start, min(start + step, size), 0] for start in range(0, size, step)]
+
+
+class _State:
+    def __init__(self, path, url, size, segments):
+        self.path = path
+        self.url = url
+        self.size = size
+        self.segments = segments
+        self.lock = threading.Lock()
+        self.unsaved = 0
+
+    @classmethod
+    def load(cls, path, url, size):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("url") != url or data.get("size") != size:
+            return None
+        return cls(path, url, size, data["segments"])
+
+    def add(self, index, n):
+        with self.lock:
+            self.segments[index][2] += n
+            self.unsaved += n
+            if self.unsaved >= STATE_EVERY:
+                self._save()
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        with open(self.path, "w") as f:
+            json.dump({"url": self.url, "size": self.size, "segments": self.segments}, f)
+        self.unsaved = 0
+
+    def done(self):
+        return sum(segment[2] for segment in self.segments)
+
+
+def _copy_local(path, part, progress, should_stop):
+    total = os.path.getsize(path)
+    done = 0
+    with open(path, "rb") as src, open(part, "wb") as dst:
+        while True:
+            if should_stop and should_stop():
+                raise Stopped("Download stopped")
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            dst.write(chunk)
+            done += len(chunk)
+            if progress:
+                progress(done, total)
+
+
+def _stream(url, part, offset, size, progress, should_stop, timeout):
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as response:
+        if offset and response.status != 206:
+            offset = 0
+        if size is None:
+            length = response.headers.get("Content-Length")
+            size = int(length) + offset if length and length.strip().isdigit() else None
+        done = offset
+        with open(part, "r+b" if offset else "wb") as f:
+            f.seek(offset)
+            while True:
+                if should_stop and should_stop():
+                    raise Stopped("Download stopped")
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                done += len(chunk)
+                if progress:
+                    progress(done, size)
+    if size is not None and done != size:
+        raise DownloadError(f"Connection closed after {done} of {size} bytes")
+
+
+def _segment_worker(url, part, state, index, errors, progress, should_stop, timeout):
+    start, end, written = state.segments[index]
+    if start + written >= end:
+        return
+    try:
+        request = urllib.request.Request(url, headers={"Range": f"bytes={start + written}-{end - 1}"})
+        # Unbuffered, so bytes counted in the state file are really on disk
+        with urllib.request.urlopen(request, timeout=timeout) as response, open(part, "r+b", buffering=0) as f:
+            if response.status != 206:
+                raise DownloadError("Server ignored the range request")
+            f.seek(start + written)
+            while start + written < end:
+                if errors or (should_stop and should_stop()):
+                    return
+                chunk = response.read(min(CHUNK_SIZE, end - start - written))
+                if not chunk:
+                    raise DownloadError(f"Segment {index} closed early")
+                view = memoryview(chunk)
+                while view:
+                    view = view[f.write(view):]
+                written += len(chunk)
+                state.add(index, len(chunk))
+                if progress:
+                    progress(state.done(), state.size)
+    except Exception as e:
+        errors.append(e)
+
+
+def _parallel(url, part, size, connections, progress, should_stop, timeout):
+    state_path = part + ".json"
+    state = _State.load(state_path, url, size) if os.path.exists(part) else None
+    if state is None:
+        state = _State(state_path, url, size, _plan_segments(size, connections))
+        with open(part, "wb") as f:
+            f.truncate(size)
+        state.save()
+
+    errors = []
+    threads = [threading.Thread(target=_segment_worker,
+                                args=(url, part, state, i, errors, progress, should_stop, timeout), daemon=True)
+               for i in range(len(state.segments))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    state.save()
+
+    if errors:
+        raise errors[0]
+    if should_stop and should_stop():
+        raise Stopped("Download stopped")
+    if state.done() != size:
+        raise DownloadError(f"Downloaded {state.done()} of {size} bytes")
+    os.remove(state_path)
+
+
+def download(url, dest, sha256=None, connections=4, mirror=None, progress=None, should_stop=None, timeout=30):
+    """Download url to dest, resuming a previous partial download if possible.
+
+    sha256 defaults to a '.sha256' sidecar next to the source when one is
+    published. progress(done, total) is called as bytes arrive (total may be
+    None). Raises Stopped if should_stop() turns true; the partial file is kept
+    for the next attempt. Raises DownloadError on checksum mismatch.
+    """
+    source = mirror_url(url, mirror)
+    part = dest + ".part"
+    expected = (sha256 or fetch_checksum(source, timeout) or "").lower() or None
+
+    local = _local_path(source)
+    if local is not None:
+        _copy_local(local, part, progress, should_stop)
+    else:
+        size, ranges = _probe(source, timeout)
+        if size and ranges and connections > 1 and size >= 2 * MIN_SEGMENT:
+            _parallel(source, part, size, connections, progress, should_stop, timeout)
+        else:
+            offset = os.path.getsize(part) if ranges and os.path.exists(part) else 0
+            if size is not None and offset > size:
+                offset = 0
+            if size is None or offset < size:
+                _stream(source, part, offset, size, progress, should_stop, timeout)
+
+    if expected:
+        actual = toolchain.file_sha256(part, CHUNK_SIZE)
+        if actual != expected:
+            os.remove(part)
+            raise DownloadError(f"SHA-256 mismatch for {os.path.basename(dest)}: expected {expected}, got {actual}")
+    os.replace(part, dest)
+    return dest
+
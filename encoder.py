@@ -0,0 +1,170 @@
+"""Output encoding on its own thread pool, with per-format options and a file-size target.
+
+An upscaled image used to be encoded by the thread that produced it, so the
+next image's inference waited for the previous image's PNG compression or
+JPEG encode. An Encoder takes the decoded result in memory (or the path of a
+file to re-encode, such as the binary's PNG) and encodes it on worker
+threads. OpenCV releases the GIL while it encodes, so encodes run alongside
+inference. At most max_pending images wait in the queue, and submit() blocks
+beyond that: each one holds a full upscaled frame.
+
+Settings cover JPEG and WebP quality (WebP above 100 is lossless), the PNG
+zlib level, and an optional size target. With a target, JPEG and WebP
+quality is bisected down to MIN_QUALITY for the largest encode that fits.
+PNG, which is lossless, is then written at the highest compression level.
+Outputs are written to a ".tmp-" file and renamed into place, and each
+encode returns an Encoded record with the dimensions and size, so callers
+can report on the file without opening it again.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_QUALITY = 40
+
+Encoded = namedtuple("Encoded", "path width height bytes quality seconds")
+
+
+class EncodeError(Exception):
+    pass
+
+
+class Settings:
+    def __init__(self, jpeg_quality=95, webp_quality=95, png_level=None, target_bytes=None):
+        self.jpeg_quality = jpeg_quality
+        self.webp_quality = webp_quality
+        # None keeps OpenCV's default level
+        self.png_level = png_level
+        self.target_bytes = target_bytes or None
+
+    def quality(self, ext):
+        """The starting quality for a lossy format, or None."""
+        if ext in (".jpg", ".jpeg"):
+            return self.jpeg_quality
+        if ext == ".webp" and self.webp_quality <= 100:
+            return self.webp_quality
+        return None
+
+    def params(self, ext, quality=None):
+        import cv2
+        if ext in (".jpg", ".jpeg"):
+            return [cv2.IMWRITE_JPEG_QUALITY, quality or self.jpeg_quality]
+        if ext == ".webp":
+            return [cv2.IMWRITE_WEBP_QUALITY, quality or self.webp_quality]
+        if ext == ".png":
+            level = self.png_zlib_level()
+            return [] if level is None else [cv2.IMWRITE_PNG_COMPRESSION, level]
+        return []
+
+    def png_zlib_level(self):
+        # PNG is lossless, so a size target can only be approached by compressing harder
+        return 9 if self.target_bytes else self.png_level
+
+    def is_default(self, ext):
+        """True if these settings write ext the way an encoder with no options would."""
+        default = Settings()
+        if self.target_bytes or self.quality(ext) != default.quality(ext):
+            return False
+        return ext != ".png" or self.png_level is None
+
+    def describe(self, ext):
+        """A short name for the options that change how ext is written; empty for the defaults."""
+        if self.is_default(ext):
+            return ""
+        quality = self.quality(ext)
+        parts = [f"q{quality}" if quality is not None else "lossless" if ext == ".webp" else None,
+                 f"z{self.png_zlib_level()}" if ext == ".png" and self.png_zlib_level() is not None else None,
+                 f"max{self.target_bytes}" if self.target_bytes else None]
+        return "-".join(part for part in parts if part)
+
+
+def _imencode(cv2, image, ext, params):
+    ok, data = cv2.imencode(ext, image, params)
+    if not ok:
+        raise EncodeError(f"Could not encode {ext} image")
+    return data
+
+
+def _to_target(cv2, image, ext, settings):
+    """(encoded bytes, quality used) within settings.target_bytes if the format allows."""
+    quality = settings.quality(ext)
+    data = _imencode(cv2, image, ext, settings.params(ext))
+    target = settings.target_bytes
+    if not target or len(data) <= target or quality is None:
+        return data, quality
+    # The largest quality that fits; the smallest encode if none does
+    best, low, high = None, MIN_QUALITY, quality - 1
+    while low <= high:
+        mid = (low + high) // 2
+        attempt = _imencode(cv2, image, ext, settings.params(ext, mid))
+        if len(attempt) <= target:
+            best, low = (attempt, mid), mid + 1
+        else:
+            high = mid - 1
+    return best or (_imencode(cv2, image, ext, settings.params(ext, MIN_QUALITY)), MIN_QUALITY)
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def encode(image, path, settings=None):
+    """Encode a BGR(A) array, or re-encode the file at image (then deleted), to path; returns Encoded."""
+    import cv2
+    settings = settings or Settings()
+    start = time.perf_counter()
+    source = None
+    if isinstance(image, str):
+        source, image = image, cv2.imread(image, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise EncodeError(f"Could not read {source}")
+    ext = os.path.splitext(path)[1].lower()
+    data, quality = _to_target(cv2, image, ext, settings)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _write_atomic(path, data)
+    if source:
+        os.remove(source)
+    return Encoded(path, image.shape[1], image.shape[0], len(data), quality, time.perf_counter() - start)
+
+
+class Encoder:
+    def __init__(self, workers=2, settings=None, max_pending=None):
+        self.settings = settings or Settings()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="encode")
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * workers)
+
+    def submit(self, image, path, settings=None, span=None):
+        """Queue an encode; returns a Future of Encoded. Blocks while max_pending encodes are waiting.
+
+        span, if given, makes a metrics.span-like context manager that is
+        entered around the encode on the worker thread.
+        """
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self._run, image, path, settings or self.settings, span)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, image, path, settings, span):
+        if span is None:
+            return encode(image, path, settings)
+        with span() as s:
+            result = encode(image, path, settings)
+            s.set(ok=True, out_bytes=result.bytes)
+            return result
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,36 @@
+"""Thread-safe hand-off of GUI updates from worker threads to the Tk main loop.
+
+Tk widgets may only be touched from the thread that runs mainloop(). Worker
+threads post() events instead, and the GUI drains the queue on a root.after()
+timer. An event of a coalesced kind (status text, progress, the preview being
+shown) replaces the same kind's event that is still waiting, so a burst of
+updates costs one redraw per tick. Other events are delivered in order.
+"""
+import threading
+
+
+class EventQueue:
+    def __init__(self, coalesce=("status", "progress", "preview")):
+        self.coalesce = set(coalesce)
+        self._lock = threading.Lock()
+        self._events = []
+        # Index in _events of the waiting event of each coalesced kind
+        self._latest = {}
+
+    def post(self, kind, data=None):
+        """Queue an event; safe to call from any thread."""
+        with self._lock:
+            if kind in self.coalesce:
+                index = self._latest.get(kind)
+                if index is not None:
+                    # Dropped rather than replaced in place, so the update keeps its order
+                    self._events[index] = None
+                self._latest[kind] = len(self._events)
+            self._events.append((kind, data))
+
+    def drain(self):
+        """The waiting (kind, data) events, oldest first."""
+        with self._lock:
+            events, self._events = self._events, []
+            self._latest.clear()
+        return [event for event in events if event is not None]
@@ -0,0 +1,133 @@
+"""Append-only job journal for resumable folder runs.
+
+Each line records one state change for one input (running / done / failed)
+together with the input's size and mtime. Replaying the file gives the latest
+state per input, so a restarted run can skip finished work, retry failures a
+bounded number of times (counted afresh once the input changes) and remove
+outputs left half-written by a crash. Shards sharing an output folder keep
+separate journals, so one shard's recovery never touches another's outputs.
+"""
+import json
+import os
+
+JOURNAL_NAME = ".enhance_journal.jsonl"
+FSYNC_EVERY = 100
+
+
+def journal_name(shard=None):
+    """The journal file name; each shard of a run sharing an output folder gets its own."""
+    if shard is None:
+        return JOURNAL_NAME
+    index, count = shard
+    return f".enhance_journal.{index}-of-{count}.jsonl"
+
+
+class Journal:
+    def __init__(self, path, max_retries=3):
+        self.path = path
+        self.max_retries = max_retries
+        self.entries = {}
+        self._lines = 0
+        self._unsynced = 0
+        self._load()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A crash can leave a torn last line; ignore it
+                        continue
+                    name = record.pop("name")
+                    self.entries.setdefault(name, {}).update(record)
+                    self._lines += 1
+        except FileNotFoundError:
+            pass
+        if self._lines > 2 * len(self.entries) + 1000:
+            self._compact()
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for name, entry in self.entries.items():
+                f.write(json.dumps(dict(entry, name=name)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._lines = len(self.entries)
+
+    def record(self, name, state, **fields):
+        entry = self.entries.setdefault(name, {})
+        entry.update(fields, state=state)
+        self.file.write(json.dumps(dict(fields, name=name, state=state)) + "\n")
+        self.file.flush()
+        self._lines += 1
+        self._unsynced += 1
+        if self._unsynced >= FSYNC_EVERY:
+            self.sync()
+
+    def start(self, name, input_path, output_path, scale):
+        st = os.stat(input_path)
+        fields = {"size": st.st_size, "mtime": st.st_mtime_ns, "scale": scale, "output": output_path}
+        entry = self.entries.get(name, {})
+        # A changed input gets a fresh set of retries
+        if entry.get("attempts") and (entry.get("size"), entry.get("mtime")) != (st.st_size, st.st_mtime_ns):
+            fields["attempts"] = 0
+        self.record(name, "running", **fields)
+
+    def finish(self, name, ok, **fields):
+        if ok:
+            self.record(name, "done", **fields)
+        else:
+            attempts = self.entries.get(name, {}).get("attempts", 0) + 1
+            self.record(name, "failed", attempts=attempts, **fields)
+
+    def is_done(self, name, input_path, output_path, scale):
+        entry = self.entries.get(name)
+        if not entry or entry.get("state") != "done" or entry.get("scale") != scale:
+            return False
+        try:
+            st = os.stat(input_path)
+        except OSError:
+            return False
+        return (entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime_ns
+                and os.path.exists(entry.get("output", output_path)))
+
+    def exhausted(self, name, input_path):
+        """True if name failed max_retries times and input_path has not changed since."""
+        entry = self.entries.get(name, {})
+        if entry.get("state") != "failed" or entry.get("attempts", 0) < self.max_retries:
+            return False
+        try:
+            st = os.stat(input_path)
+        except OSError:
+            return True
+        return entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime_ns
+
+    def outputs(self):
+        """Every output path this journal has recorded."""
+        return {entry["output"] for entry in self.entries.values() if entry.get("output")}
+
+    def recover(self):
+        """Remove outputs of items that were still running when the last run ended."""
+        removed = 0
+        for name, entry in self.entries.items():
+            if entry.get("state") != "running":
+                continue
+            output = entry.get("output")
+            if output and os.path.exists(output):
+                os.remove(output)
+                removed += 1
+        return removed
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        self.sync()
+        self.file.close()
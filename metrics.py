@@ -0,0 +1,260 @@
+"""Per-stage timing spans, JSON-lines traces and Prometheus metrics.
+
+Instrumentation is off by default. span() then returns a shared no-op
+object, so each instrumented stage costs one call and a flag check. It is
+switched on in any of these ways:
+- ENHANCE_TRACE=trace.jsonl and/or ENHANCE_METRICS_FILE=enhance.prom
+- enable() / disable() at runtime
+- SIGUSR1, where install_signal_toggle() was called (cli.py, server.py)
+
+Each finished span is written as one JSON line with its stage, image,
+duration, backend, ok flag and any byte / pixel counts, and is added to
+per-stage totals. prometheus_text() renders the totals in the Prometheus
+text format. The textfile, for node_exporter's textfile collector, is
+rewritten atomically every few seconds and on flush().
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+TEXTFILE_INTERVAL = 5.0
+
+_lock = threading.Lock()
+_local = threading.local()
+_enabled = False
+_trace = None
+_trace_path = None
+_textfile = None
+_last_textfile = 0.0
+_stats = {}
+
+
+class _NoopSpan:
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+    def add_file(self, prefix, path):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+def image_pixels(path):
+    """Width * height from the image header, or None."""
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            return img.width * img.height
+    except Exception:
+        return None
+
+
+class Span:
+    enabled = True
+
+    def __init__(self, stage, fields):
+        self.stage = stage
+        self.fields = fields
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        ok = self.fields.pop("ok", True) and exc_type is None
+        if exc is not None:
+            self.fields["error"] = str(exc)[:200]
+        _record(self.stage, self.wall, seconds, ok, self.fields)
+        return False
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def add_file(self, prefix, path):
+        """Record <prefix>_bytes and <prefix>_pixels for an image file."""
+        try:
+            self.fields[f"{prefix}_bytes"] = os.path.getsize(path)
+        except OSError:
+            return
+        pixels = image_pixels(path)
+        if pixels is not None:
+            self.fields[f"{prefix}_pixels"] = pixels
+
+
+def span(stage, **fields):
+    """Time the enclosed block as one stage; returns a no-op when disabled."""
+    if not _enabled:
+        return NOOP
+    image = getattr(_local, "image", None)
+    if image is not None:
+        fields.setdefault("image", image)
+    return Span(stage, fields)
+
+
+class _ImageScope:
+    def __init__(self, path):
+        self.image = os.path.basename(path) if path else None
+
+    def __enter__(self):
+        self.outer = getattr(_local, "image", None)
+        _local.image = self.image
+        return self
+
+    def __exit__(self, *exc):
+        _local.image = self.outer
+        return False
+
+
+def image(path):
+    """Attribute the spans recorded on this thread to one input image."""
+    return _ImageScope(path)
+
+
+def _record(stage, wall, seconds, ok, fields):
+    key = (stage, fields.get("backend") or "")
+    with _lock:
+        if not _enabled:
+            return
+        stat = _stats.get(key)
+        if stat is None:
+            stat = _stats[key] = {"count": 0, "seconds": 0.0, "errors": 0, "bytes": 0, "pixels": 0,
+                                  "buckets": [0] * len(BUCKETS)}
+        stat["count"] += 1
+        stat["seconds"] += seconds
+        stat["errors"] += not ok
+        stat["bytes"] += fields.get("in_bytes", 0) or 0
+        stat["pixels"] += fields.get("in_pixels", 0) or 0
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                stat["buckets"][i] += 1
+
+        if _trace is not None:
+            record = dict(fields, stage=stage, ts=round(wall, 6), ms=round(seconds * 1000, 3), ok=ok,
+                          thread=threading.current_thread().name)
+            _trace.write(json.dumps(record, default=str) + "\n")
+        if _textfile and time.monotonic() - _last_textfile >= TEXTFILE_INTERVAL:
+            _write_textfile()
+
+
+def _labels(stage, backend):
+    return f'stage="{stage}",backend="{backend}"'
+
+
+def prometheus_text():
+    with _lock:
+        return _render()
+
+
+def _render():
+    lines = [
+        "# HELP enhance_profiling_enabled Whether stage instrumentation is on.",
+        "# TYPE enhance_profiling_enabled gauge",
+        f"enhance_profiling_enabled {int(_enabled)}",
+        "# HELP enhance_stage_seconds Time spent per pipeline stage.",
+        "# TYPE enhance_stage_seconds histogram",
+    ]
+    for (stage, backend), stat in sorted(_stats.items()):
+        labels = _labels(stage, backend)
+        for bound, count in zip(BUCKETS, stat["buckets"]):
+            lines.append(f'enhance_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'enhance_stage_seconds_bucket{{{labels},le="+Inf"}} {stat["count"]}')
+        lines.append(f"enhance_stage_seconds_sum{{{labels}}} {stat['seconds']:.6f}")
+        lines.append(f"enhance_stage_seconds_count{{{labels}}} {stat['count']}")
+    for name, field, help_text in (("errors", "errors", "Stage runs that failed."),
+                                   ("input_bytes", "bytes", "Input bytes handled per stage."),
+                                   ("input_pixels", "pixels", "Input pixels handled per stage.")):
+        lines.append(f"# HELP enhance_stage_{name}_total {help_text}")
+        lines.append(f"# TYPE enhance_stage_{name}_total counter")
+        for (stage, backend), stat in sorted(_stats.items()):
+            lines.append(f"enhance_stage_{name}_total{{{_labels(stage, backend)}}} {stat[field]}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_textfile():
+    global _last_textfile
+    _last_textfile = time.monotonic()
+    tmp = f"{_textfile}.tmp-{os.getpid()}"
+    try:
+        with open(tmp, "w") as f:
+            f.write(_render())
+        os.replace(tmp, _textfile)
+    except OSError:
+        pass
+
+
+def enable(trace_path=None, textfile=None):
+    """Start recording spans; trace_path gets JSON lines, textfile Prometheus text."""
+    global _enabled, _trace, _trace_path, _textfile
+    with _lock:
+        if trace_path and (trace_path != _trace_path or _trace is None):
+            if _trace is not None:
+                _trace.close()
+            _trace = open(trace_path, "a", encoding="utf-8", buffering=1)
+            _trace_path = trace_path
+        _textfile = textfile or _textfile
+        _enabled = True
+
+
+def disable():
+    global _enabled, _trace
+    with _lock:
+        if _textfile:
+            _write_textfile()
+        _enabled = False
+        if _trace is not None:
+            _trace.close()
+        # _trace_path is kept so that toggle() resumes the same trace
+        _trace = None
+
+
+def is_enabled():
+    return _enabled
+
+
+def toggle():
+    if _enabled:
+        disable()
+    else:
+        enable(_trace_path or os.environ.get("ENHANCE_TRACE"), os.environ.get("ENHANCE_METRICS_FILE"))
+    return _enabled
+
+
+def flush():
+    with _lock:
+        if _trace is not None:
+            _trace.flush()
+        if _textfile:
+            _write_textfile()
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def install_signal_toggle():
+    """Toggle instrumentation on SIGUSR1 (where the platform has it)."""
+    import signal
+    if hasattr(signal, "SIGUSR1"):
+        # The handler may interrupt a thread holding _lock, so toggle elsewhere
+        signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(target=toggle).start())
+
+
+atexit.register(flush)
+
+if os.environ.get("ENHANCE_TRACE") or os.environ.get("ENHANCE_METRICS_FILE"):
+    enable(os.environ.get("ENHANCE_TRACE"), os.environ.get("ENHANCE_METRICS_FILE"))
@@ -0,0 +1,164 @@
+"""Pre-flight checks of a folder run's inputs before any process is spawned.
+
+A corrupt file costs a Real-ESRGAN run that fails, then a CPU fallback that
+fails too. A byte-identical copy of another input costs a full upscale that
+produces the same output again. Preflight.check() catches both on a thread
+pool, before the batch is dispatched:
+
+- inspect() reads only what identifies a file: the header that PIL parses
+  for the format and dimensions, plus the last KB of a PNG (which must hold
+  its IEND chunk) and the RIFF size of a WebP. Files that are empty,
+  unidentifiable, zero-sized or cut short are rejected. Truncated JPEGs are
+  not: decoders still produce an image from them.
+- Duplicates are found without hashing every file. Only files that share
+  their size and extension with another input of the run are hashed, and
+  equal digests make the later file a duplicate of the first. Earlier
+  batches count too, so copies that land in different batches are caught.
+  One path per distinct digest is kept, and the least recently seen sizes
+  are forgotten beyond MAX_PATHS, so memory stays bounded however large the
+  tree is.
+
+The caller runs the originals and links their outputs for the duplicates.
+"""
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+WORKERS = 8
+TAIL_BYTES = 1024
+# Paths remembered across batches for duplicate detection, as many as files in a scanner window
+MAX_PATHS = 100000
+
+Info = namedtuple("Info", "path size width height format error")
+
+
+def _png_complete(path, size):
+    with open(path, "rb") as f:
+        f.seek(max(0, size - TAIL_BYTES))
+        return b"IEND" in f.read()
+
+
+def _webp_complete(path, size):
+    with open(path, "rb") as f:
+        header = f.read(12)
+    # RIFF <size of everything after these 8 bytes> WEBP
+    return len(header) == 12 and struct.unpack("<I", header[4:8])[0] + 8 <= size
+
+
+def inspect(path):
+    """Info for path from its header; error is None if the file looks decodable."""
+    from PIL import Image
+    try:
+        size = os.path.getsize(path)
+    except OSError as e:
+        return Info(path, None, None, None, None, f"cannot stat: {e}")
+    if size == 0:
+        return Info(path, 0, None, None, None, "empty file")
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            fmt = img.format
+    except Image.DecompressionBombError:
+        # Too big for PIL's default limit, not broken: the tiled paths handle it
+        return Info(path, size, None, None, None, None)
+    except (OSError, SyntaxError, ValueError) as e:
+        return Info(path, size, None, None, None, f"not a readable image ({e})")
+    error = None
+    try:
+        if not width or not height:
+            error = "image has no pixels"
+        elif fmt == "PNG" and not _png_complete(path, size):
+            error = "truncated PNG (no IEND chunk)"
+        elif fmt == "WEBP" and not _webp_complete(path, size):
+            error = "truncated WebP"
+    except OSError as e:
+        error = f"cannot read: {e}"
+    return Info(path, size, width, height, fmt, error)
+
+
+def _digest(path):
+    import toolchain
+    try:
+        return toolchain.file_sha256(path)
+    except OSError:
+        return None
+
+
+class Preflight:
+    """Validate and deduplicate the inputs of one folder run, batch by batch."""
+
+    def __init__(self, workers=WORKERS, max_paths=MAX_PATHS):
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="preflight")
+        self._lock = threading.Lock()
+        self.max_paths = max_paths
+        self._paths = 0
+        # (size, extension) -> {digest: first input with it}, least recently seen first.
+        # A group's only input so far is kept unhashed under None.
+        self._groups = OrderedDict()
+        self.stats = {"checked": 0, "rejected": 0, "duplicates": 0, "duplicate_pixels": 0, "hashed": 0,
+                      "seconds": 0.0}
+
+    def check(self, paths):
+        """({path: Info}, {duplicate path: original path}) for a batch of input paths."""
+        start = time.perf_counter()
+        infos = dict(zip(paths, self._pool.map(inspect, paths)))
+        groups = {}
+        for path in paths:
+            info = infos[path]
+            if info.error is None:
+                groups.setdefault((info.size, os.path.splitext(path)[1].lower()), []).append(path)
+
+        with self._lock:
+            # Only files that share a size and extension can be identical
+            candidates = []
+            for key, members in groups.items():
+                known = self._groups.get(key, {})
+                if len(members) + len(known) > 1:
+                    candidates += members + ([known[None]] if None in known else [])
+            digests = dict(zip(candidates, self._pool.map(_digest, candidates)))
+
+            duplicates = {}
+            for key, members in groups.items():
+                known = self._groups.pop(key, {})
+                self._paths -= len(known)
+                if None in known:
+                    original = known.pop(None)
+                    if digests.get(original) is not None:
+                        known[digests[original]] = original
+                for path in members:
+                    if path not in digests:
+                        known[None] = path
+                        continue
+                    digest = digests[path]
+                    if digest is None:
+                        continue
+                    if digest in known:
+                        duplicates[path] = known[digest]
+                    else:
+                        known[digest] = path
+                self._groups[key] = known
+                self._paths += len(known)
+            # Same-size copies are usually close together in a scan, so old groups are let go
+            while self._paths > self.max_paths and len(self._groups) > 1:
+                self._paths -= len(self._groups.popitem(last=False)[1])
+
+            self.stats["checked"] += len(paths)
+            self.stats["rejected"] += sum(1 for info in infos.values() if info.error)
+            self.stats["duplicates"] += len(duplicates)
+            self.stats["duplicate_pixels"] += sum((infos[path].width or 0) * (infos[path].height or 0)
+                                                  for path in duplicates)
+            self.stats["hashed"] += len(candidates)
+            self.stats["seconds"] += time.perf_counter() - start
+        return infos, duplicates
+
+    def summary(self):
+        s = self.stats
+        return (f"Pre-flight: {s['checked']} files checked in {s['seconds']:.1f}s ({s['hashed']} hashed); "
+                f"{s['rejected']} rejected, {s['duplicates']} duplicates "
+                f"({s['duplicate_pixels'] / 1e6:.1f} MP) linked instead of upscaled")
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,77 @@
+"""Before/after thumbnails for the GUI, decoded at reduced resolution and kept in an LRU cache.
+
+A 4x output can be tens of megapixels, and decoding it in full only to show a
+few hundred pixels would stall the preview panel. thumbnail() asks PIL for a
+draft first: JPEGs are then decoded at 1/2 to 1/8 scale by the decoder
+itself. Other formats are reduced in integer steps before the final resample.
+PreviewCache keeps recent thumbnails within a byte budget, keyed by path,
+modification time and size, so moving back and forth through a long result
+list decodes each file once.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+SIZE = (256, 256)
+
+
+def thumbnail(path, size=SIZE):
+    """An RGB PIL image of path that fits in size, or None if it cannot be read."""
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            img.draft("RGB", size)
+            img.thumbnail(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+            return img.convert("RGB")
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+class PreviewCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, size=SIZE):
+        self.max_bytes = max_bytes
+        self.size = size
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _key(self, path):
+        try:
+            return os.path.abspath(path), os.stat(path).st_mtime_ns, self.size
+        except OSError:
+            return None
+
+    def peek(self, path):
+        """The cached thumbnail of path, or None without decoding anything."""
+        key = self._key(path)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+            return image
+
+    def get(self, path):
+        """The thumbnail of path, decoded on a miss; None if the file cannot be read."""
+        image = self.peek(path)
+        if image is not None:
+            with self._lock:
+                self.hits += 1
+            return image
+        key = self._key(path)
+        image = thumbnail(path, self.size) if key else None
+        with self._lock:
+            self.misses += 1
+            if image is None or key in self._entries:
+                return image
+            self._entries[key] = image
+            self.used += _nbytes(image)
+            while self.used > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self.used -= _nbytes(old)
+        return image
+
+
+def _nbytes(image):
+    return image.width * image.height * len(image.getbands())
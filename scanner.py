@@ -0,0 +1,138 @@
+"""Streaming recursive scan of an input tree and size-aware ordering of its files.
+
+scan() walks the tree with os.scandir one directory at a time and yields
+matching files as it goes, so a tree with millions of files is never listed
+in full. Each directory is read in name order and the walk is depth first,
+so every run (and every host) sees the files in the same order. Files are
+matched by relative path against include / exclude globs, where "*" also
+matches "/" and a pattern without "/" is matched against the file name.
+Excluded directories are not entered. Dot files and dot directories are
+skipped.
+
+shard() keeps the files of one of `count` partitions, chosen by a hash of the
+relative path. The partition depends only on the path, so separate processes
+or hosts can split a tree without talking to each other. schedule() reorders
+the stream by size, largest first by default: big images started last are
+what stretch the end of a run. To keep memory bounded it sorts one window of
+entries at a time.
+"""
+import fnmatch
+import hashlib
+import os
+from collections import namedtuple
+
+ORDERS = ("largest", "smallest", "scan")
+WINDOW = 100000
+
+Entry = namedtuple("Entry", "rel path size")
+
+
+class ScanError(Exception):
+    pass
+
+
+def _matches(rel, patterns):
+    name = rel.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(rel, p) or ("/" not in p and fnmatch.fnmatch(name, p)) for p in patterns)
+
+
+def scan(root, extensions, include=(), exclude=(), recursive=True, skip=(), on_error=None):
+    """Yield an Entry (relative path with "/", full path, size) for every matching file.
+
+    extensions filters by lower-case suffix; include, if given, must match as
+    well. skip lists directories that are never entered, such as an output
+    folder inside the input tree. on_error(path, exc) is called for
+    directories that cannot be read; they are skipped.
+    """
+    if not os.path.isdir(root):
+        raise ScanError(f"Not a folder: {root}")
+    skip = {os.path.normcase(os.path.realpath(path)) for path in skip}
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir) if rel_dir else root) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            if on_error:
+                on_error(os.path.join(root, rel_dir), e)
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not _matches(rel, exclude) and \
+                            os.path.normcase(os.path.realpath(entry.path)) not in skip:
+                        subdirs.append(rel)
+                    continue
+                if os.path.splitext(entry.name)[1].lower() not in extensions or not entry.is_file():
+                    continue
+                if (include and not _matches(rel, include)) or _matches(rel, exclude):
+                    continue
+                size = entry.stat().st_size
+            except OSError:
+                continue
+            yield Entry(rel, entry.path, size)
+        # Reversed so the stack pops subdirectories in name order
+        stack.extend(reversed(subdirs))
+
+
+def parse_shard(spec):
+    """"INDEX/COUNT" (0-based) -> (index, count)."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must look like INDEX/COUNT, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"shard index must be in 0..{count - 1}, got {spec!r}")
+    return index, count
+
+
+def shard_of(rel, count):
+    # Not a CRC: CRC32 is linear, so names that differ in one character (0.png, 1.png, ...)
+    # share their low bits and land in the same shard whenever count is a power of two
+    digest = hashlib.blake2b(rel.encode("utf-8", "surrogateescape"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def shard(entries, index, count):
+    """Keep the entries that fall into partition `index` of `count`."""
+    for entry in entries:
+        if count == 1 or shard_of(entry.rel, count) == index:
+            yield entry
+
+
+def schedule(entries, order="largest", window=WINDOW):
+    """Reorder entries by size ("largest" / "smallest" first) one window at a time, or keep "scan" order."""
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of {', '.join(ORDERS)}")
+    if order == "scan":
+        yield from entries
+        return
+    buffered = []
+    for entry in entries:
+        buffered.append(entry)
+        if len(buffered) >= window:
+            yield from _sorted(buffered, order)
+            buffered = []
+    yield from _sorted(buffered, order)
+
+
+def _sorted(entries, order):
+    # Ties keep scan order, so the schedule is as deterministic as the scan
+    return sorted(entries, key=lambda entry: entry.size, reverse=order == "largest")
+
+
+def batches(entries, size):
+    """Group an iterable into lists of up to size items."""
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
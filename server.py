@@ -0,0 +1,405 @@
+"""Local HTTP/JSON job server around process_file and enhance_folder.
+
+    python server.py --port 8765 --workers 2
+
+    POST   /jobs              {"input": path, "output": path, "scale": 4, "priority": "normal"}
+    GET    /jobs              every job the server still remembers
+    GET    /jobs/<id>         one job
+    GET    /jobs/<id>/events  the job as JSON lines, one per change, until it ends
+    DELETE /jobs/<id>         cancel a queued or running job
+    GET    /health            worker and queue counts
+    GET    /metrics           per-stage timings in Prometheus text format
+    POST   /profiling         {"enabled": true, "trace": path} switches instrumentation
+
+A job whose input is a folder runs like Batch Mode. Otherwise it is a single
+image. Jobs wait in a priority queue (high, normal, low; FIFO within a class)
+and a fixed number of worker threads run them. Each job has its own
+supervisor.CancelToken, which holds its cancellation flag and child process,
+so cancelling one job leaves the others running. Paths are resolved on the
+server, so the server binds to localhost unless told otherwise. If --token
+(or ENHANCE_SERVER_TOKEN) is set, requests must send it as a Bearer token.
+
+A folder job without an output gets output/<job id>. Jobs whose outputs are
+the same path, or one inside the other, never run at the same time: a later
+one waits in the queue until the earlier one ends.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+import supervisor
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+FINISHED = ("done", "failed", "cancelled")
+KEEP_FINISHED = 1000
+
+
+class Job:
+    def __init__(self, kind, input_path, output_path, scale, priority, notify):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.input = input_path
+        self.output = output_path
+        self.scale = scale
+        self.priority = priority
+        self.state = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.progress = {"desc": None, "n": 0, "total": None}
+        self.version = 0
+        self._notify = notify
+        self.token = supervisor.CancelToken(self._on_progress)
+
+    def _on_progress(self, desc, n, total):
+        self.progress = {"desc": desc, "n": round(n, 3), "total": total}
+        self._notify(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id, "kind": self.kind, "input": self.input, "output": self.output, "scale": self.scale,
+            "priority": self.priority, "state": self.state, "progress": self.progress, "result": self.result,
+            "error": self.error, "created": self.created, "started": self.started, "finished": self.finished,
+        }
+
+
+class Scheduler:
+    """Priority queue of jobs drained by a pool of worker threads."""
+
+    def __init__(self, workers=2, keep_finished=KEEP_FINISHED):
+        self.keep_finished = keep_finished
+        self.jobs = OrderedDict()
+        self.cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._closing = False
+        self._workers = [threading.Thread(target=self._work, name=f"enhance-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def _changed(self, job):
+        with self.cond:
+            job.version += 1
+            self.cond.notify_all()
+
+    def submit(self, input_path, output_path=None, scale=4, priority="normal"):
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+        if scale not in (2, 3, 4):
+            raise ValueError("scale must be 2, 3 or 4")
+        if not os.path.exists(input_path):
+            raise ValueError(f"input does not exist: {input_path}")
+        kind = "folder" if os.path.isdir(input_path) else "image"
+        job = Job(kind, input_path, output_path, scale, priority, self._changed)
+        if output_path is None:
+            # A folder job owns its output folder and journal, so each gets its own
+            job.output = os.path.join("output", job.id) if kind == "folder" else \
+                os.path.join("output", f"enhanced_{os.path.basename(input_path)}")
+        with self.cond:
+            if self._closing:
+                raise RuntimeError("server is shutting down")
+            self.jobs[job.id] = job
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), job.id))
+            self.cond.notify_all()
+        return job
+
+    def get(self, job_id):
+        with self.cond:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.state in FINISHED:
+                return job
+            if job.state == "queued":
+                # Left in the heap; workers skip jobs that are no longer queued
+                job.state = "cancelled"
+                job.finished = time.time()
+                job.version += 1
+                self.cond.notify_all()
+                return job
+        job.token.cancel()
+        return job
+
+    def wait_for_change(self, job, version, timeout=None):
+        with self.cond:
+            self.cond.wait_for(lambda: job.version != version or self._closing, timeout)
+            return job.version
+
+    def stats(self):
+        with self.cond:
+            states = {}
+            for job in self.jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            return {"workers": len(self._workers), "jobs": states}
+
+    def _output_busy(self, job):
+        """True if a running job writes to job's output, or job writes inside a running job's."""
+        path = os.path.realpath(job.output)
+        for other in self.jobs.values():
+            if other.state != "running":
+                continue
+            running = os.path.realpath(other.output)
+            # A folder run removes stale outputs and rewrites its journal, so nesting conflicts too
+            if path == running or path.startswith(running + os.sep) or running.startswith(path + os.sep):
+                return True
+        return False
+
+    def _next(self):
+        with self.cond:
+            while True:
+                # Jobs whose output is in use wait for it, ahead of the rest of their class
+                held = []
+                job = None
+                while self._heap:
+                    entry = heapq.heappop(self._heap)
+                    candidate = self.jobs.get(entry[2])
+                    if candidate is None or candidate.state != "queued":
+                        continue
+                    if self._output_busy(candidate):
+                        held.append(entry)
+                        continue
+                    job = candidate
+                    break
+                for entry in held:
+                    heapq.heappush(self._heap, entry)
+                if job is not None:
+                    job.state = "running"
+                    job.started = time.time()
+                    job.version += 1
+                    self.cond.notify_all()
+                    return job
+                if self._closing:
+                    return None
+                self.cond.wait()
+
+    def _work(self):
+        import app
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            state, result, error = "failed", None, None
+            try:
+                with app.job_context(job.token):
+                    if job.kind == "folder":
+                        results = app.enhance_folder(job.input, job.output, job.scale)
+                        result = _summarize(results)
+                        ok = not result.get("failed") and not result.get("exhausted")
+                    else:
+                        result = app.process_file(job.input, job.output, job.scale)
+                        ok = result["status"] in ("done", "cached")
+                state = "cancelled" if job.token.cancelled else "done" if ok else "failed"
+            except Exception as e:
+                logging.error(f"Job {job.id} failed: {e}")
+                error = str(e)
+            with self.cond:
+                job.state, job.result, job.error = state, result, error
+                job.finished = time.time()
+                job.version += 1
+                self._prune()
+                self.cond.notify_all()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+
+    def close(self):
+        with self.cond:
+            self._closing = True
+            running = [job for job in self.jobs.values() if job.state in ("queued", "running")]
+            self.cond.notify_all()
+        for job in running:
+            self.cancel(job.id)
+        for worker in self._workers:
+            worker.join()
+
+
+def _summarize(results):
+    counts = {}
+    failed = []
+    for result in results.values():
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        if result["status"] in ("failed", "exhausted"):
+            failed.append(result["input"])
+    return dict(counts, failed_inputs=failed)
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "RealESRGAN-JobServer/1.0"
+
+    @property
+    def scheduler(self):
+        return self.server.scheduler
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        token = self.server.auth_token
+        if token and self.headers.get("Authorization") != f"Bearer {token}":
+            self._send(401, {"error": "missing or wrong bearer token"})
+            return False
+        return True
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _route(self):
+        parts = [part for part in self.path.split("?", 1)[0].split("/") if part]
+        job = self.scheduler.get(parts[1]) if len(parts) >= 2 and parts[0] == "jobs" else None
+        return parts, job
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        parts, job = self._route()
+        if parts == ["health"]:
+            self._send(200, self.scheduler.stats())
+        elif parts == ["metrics"]:
+            data = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif parts == ["jobs"]:
+            with self.scheduler.cond:
+                jobs = [job.to_dict() for job in self.scheduler.jobs.values()]
+            self._send(200, {"jobs": jobs})
+        elif job is not None and len(parts) == 2:
+            self._send(200, job.to_dict())
+        elif job is not None and parts[2:] == ["events"]:
+            self._stream(job)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _stream(self, job):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        version = None
+        try:
+            while True:
+                with self.scheduler.cond:
+                    current = job.version
+                    body = job.to_dict()
+                if current != version:
+                    self.wfile.write(json.dumps(body).encode() + b"\n")
+                    self.wfile.flush()
+                    version = current
+                if body["state"] in FINISHED or self.server.closing:
+                    return
+                self.scheduler.wait_for_change(job, version, timeout=15)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        parts, job = self._route()
+        if parts == ["profiling"]:
+            try:
+                request = self._read_json()
+                if request.get("enabled", True):
+                    metrics.enable(request.get("trace"), request.get("textfile"))
+                else:
+                    metrics.disable()
+            except (ValueError, OSError) as e:
+                self._send(400, {"error": str(e)})
+            else:
+                self._send(200, {"enabled": metrics.is_enabled()})
+        elif parts == ["jobs"]:
+            try:
+                request = self._read_json()
+                job = self.scheduler.submit(request["input"], request.get("output"),
+                                            int(request.get("scale", 4)), request.get("priority", "normal"))
+            except KeyError:
+                self._send(400, {"error": "input is required"})
+            except (ValueError, TypeError, RuntimeError) as e:
+                self._send(400, {"error": str(e)})
+            else:
+                self._send(202, job.to_dict())
+        elif job is not None and parts[2:] == ["cancel"]:
+            self._send(200, self.scheduler.cancel(job.id).to_dict())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        parts, job = self._route()
+        if job is not None and len(parts) == 2:
+            self._send(200, self.scheduler.cancel(job.id).to_dict())
+        else:
+            self._send(404, {"error": "not found"})
+
+
+def make_server(host="127.0.0.1", port=8765, workers=2, auth_token=None):
+    """Create the HTTP server and its scheduler; call serve_forever() to run it."""
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    httpd.scheduler = Scheduler(workers)
+    httpd.auth_token = auth_token
+    httpd.closing = False
+    return httpd
+
+
+def shutdown(httpd):
+    httpd.closing = True
+    httpd.scheduler.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="server.py", description="Local Real-ESRGAN job server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="jobs run at the same time (default: 2)")
+    parser.add_argument("--token", default=os.environ.get("ENHANCE_SERVER_TOKEN"),
+                        help="require this bearer token on every request")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    metrics.install_signal_toggle()
+    httpd = make_server(args.host, args.port, args.workers, args.token)
+    print(f"Job server listening on http://{args.host}:{httpd.server_address[1]} with {args.workers} workers")
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+    except KeyboardInterrupt:
+        print("Shutting down, cancelling running jobs...")
+    finally:
+        shutdown(httpd)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,190 @@
+"""Local staging of inputs and outputs that live on network mounts.
+
+Reading an input from NFS/SMB and writing its output back are pure latency
+from the GPU's point of view. A Staging area moves both off the critical
+path. prefetch() copies the next jobs' inputs into a local folder (tmpfs
+where there is one) on a few threads while the current batch is processing.
+commit() writes a finished output back on writer threads. Each copy goes to
+a ".tmp-" file next to the destination and is renamed into place, so a
+reader never sees a partial output.
+
+The staging folder has a byte budget. Prefetching never waits for space: an
+input that does not fit is simply read from its original path, so a batch
+larger than the budget cannot deadlock. Write-back does wait for space,
+since the writer threads always drain it.
+"""
+import itertools
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs", "lustre",
+                       "fuse.sshfs", "fuse.rclone", "fuse.s3fs", "davfs"}
+
+
+def _mounts():
+    mounts = []
+    try:
+        with open("/proc/self/mounts") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3:
+                    # Spaces in mount points are octal escaped
+                    mounts.append((parts[1].replace("\\040", " "), parts[2]))
+    except OSError:
+        pass
+    return mounts
+
+
+def is_remote(path):
+    """True if path is on a network filesystem (best effort; False when unsure)."""
+    path = os.path.realpath(path)
+    if sys.platform == "win32":
+        if path.startswith("\\\\"):
+            return True
+        import ctypes
+        drive = os.path.splitdrive(path)[0] + "\\"
+        # DRIVE_REMOTE
+        return ctypes.windll.kernel32.GetDriveTypeW(drive) == 4
+    best, fstype = "", None
+    for mount_point, kind in _mounts():
+        if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) >= len(best):
+            best, fstype = mount_point, kind
+    return fstype in NETWORK_FILESYSTEMS
+
+
+def default_root():
+    """tmpfs when the platform has one, else the temp folder."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def _copy_atomic(src, dst):
+    tmp = f"{dst}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        shutil.copyfile(src, tmp)
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class StagedJob:
+    def __init__(self, input_path, output_path, local_dir):
+        self.input = input_path
+        self.output = output_path
+        self.local_dir = local_dir
+        self.local_input = input_path
+        self.local_output = os.path.join(local_dir, os.path.basename(output_path))
+        self.reserved = 0
+
+
+class Staging:
+    """Prefetch inputs into, and write outputs back from, a local folder with a byte budget."""
+
+    def __init__(self, budget, root=None, fetchers=4, writers=2):
+        self.budget = budget
+        self.dir = tempfile.mkdtemp(prefix="enhance-stage-", dir=root or default_root())
+        self.used = 0
+        self.errors = []
+        self._cond = threading.Condition()
+        self._ids = itertools.count()
+        self._fetch = ThreadPoolExecutor(fetchers, thread_name_prefix="stage-fetch")
+        self._write = ThreadPoolExecutor(writers, thread_name_prefix="stage-write")
+        self._pending = []
+
+    def _reserve(self, size, wait):
+        with self._cond:
+            if wait:
+                # A lone item larger than the budget still goes through
+                self._cond.wait_for(lambda: self.used == 0 or self.used + size <= self.budget)
+            elif self.used + size > self.budget:
+                return False
+            self.used += size
+            return True
+
+    def _free(self, size):
+        with self._cond:
+            self.used -= size
+            self._cond.notify_all()
+
+    def prefetch(self, jobs):
+        """Start copying the inputs of (input, output) jobs; returns futures of StagedJob."""
+        futures = []
+        for input_path, output_path in jobs:
+            local_dir = os.path.join(self.dir, f"{next(self._ids):08d}")
+            os.makedirs(local_dir)
+            futures.append(self._fetch.submit(self._fetch_one, StagedJob(input_path, output_path, local_dir)))
+        return futures
+
+    def _fetch_one(self, job):
+        try:
+            size = os.path.getsize(job.input)
+            if not self._reserve(size, wait=False):
+                return job
+            job.reserved = size
+            local = os.path.join(job.local_dir, os.path.basename(job.input))
+            shutil.copy2(job.input, local)
+            job.local_input = local
+        except OSError as e:
+            # Read it from the original path instead
+            logging.error(f"Could not stage {job.input}: {e}")
+        return job
+
+    def release(self, job):
+        """Drop the local copy of a job's input once it has been processed."""
+        if job.local_input != job.input:
+            try:
+                os.remove(job.local_input)
+            except OSError:
+                pass
+            job.local_input = job.input
+        self._free(job.reserved)
+        job.reserved = 0
+
+    def commit(self, local_path, final_path):
+        """Write local_path back to final_path in the background, then delete it."""
+        size = os.path.getsize(local_path)
+        self._reserve(size, wait=True)
+        with self._cond:
+            self._pending = [f for f in self._pending if not f.done()]
+            self._pending.append(self._write.submit(self._commit_one, local_path, final_path, size))
+
+    def _commit_one(self, local_path, final_path, size):
+        try:
+            os.makedirs(os.path.dirname(final_path) or ".", exist_ok=True)
+            _copy_atomic(local_path, final_path)
+        except OSError as e:
+            logging.error(f"Could not write back {final_path}: {e}")
+            with self._cond:
+                self.errors.append((final_path, e))
+        finally:
+            try:
+                os.remove(local_path)
+                os.rmdir(os.path.dirname(local_path))
+            except OSError:
+                pass
+            self._free(size)
+
+    def drain(self):
+        """Wait for every pending write-back; returns and clears the (path, error) failures."""
+        with self._cond:
+            pending = list(self._pending)
+        for future in pending:
+            future.result()
+        with self._cond:
+            errors, self.errors = self.errors, []
+        return errors
+
+    def close(self):
+        self._fetch.shutdown(wait=True, cancel_futures=True)
+        self.drain()
+        self._write.shutdown(wait=True)
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -0,0 +1,188 @@
+"""Supervise realesrgan-ncnn-vulkan child processes.
+
+Reader threads drain stdout and stderr concurrently, so a child that writes a
+lot to either stream can never block on a full pipe. Lines are scanned for the
+"NN.NN%" progress ncnn prints per tile, and progress / exit events are passed
+to a callback. Only a bounded tail of each stream is kept. Processes can be
+given an overall and an idle timeout. Running several jobs at once is left to
+server.py, whose jobs each hold a CancelToken for their own child.
+"""
+import collections
+import re
+import subprocess
+import threading
+import time
+
+PROGRESS_RE = re.compile(rb"(\d{1,3}(?:\.\d+)?)%")
+READ_SIZE = 64 * 1024
+
+
+class ProcessResult:
+    def __init__(self, returncode, stdout, stderr, elapsed, timed_out=False, cancelled=False):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+
+class CancelToken:
+    """Cancellation flag, running child process and progress sink of one job."""
+
+    def __init__(self, on_progress=None):
+        self.on_progress = on_progress
+        self.process = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+        process = self.process
+        if process is not None:
+            process.cancel()
+
+
+class JobProgress:
+    """Stands in for a tqdm bar and forwards updates to on_progress(desc, n, total)."""
+
+    def __init__(self, on_progress, total=None, desc=None):
+        self.on_progress = on_progress
+        self.total = total
+        self.desc = desc
+        self.n = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, n=1):
+        self.n += n
+        self.refresh()
+
+    def refresh(self):
+        self.on_progress(self.desc, self.n, self.total)
+
+
+class SupervisedProcess:
+    def __init__(self, cmd, job_id=None, on_event=None, timeout=None, idle_timeout=None, tail_bytes=64 * 1024):
+        self.cmd = cmd
+        self.job_id = job_id
+        self.on_event = on_event
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.tail_bytes = tail_bytes
+        self.process = None
+        self.percent = 0.0
+        self.completed_passes = 0
+        self.last_output = None
+        self.started = None
+        self._tails = {}
+        self._readers = []
+        self._cancelled = False
+
+    def _emit(self, kind, **fields):
+        if self.on_event:
+            self.on_event(dict(fields, job=self.job_id, type=kind))
+
+    def start(self):
+        self.started = self.last_output = time.monotonic()
+        self.process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        for name, stream in (("stdout", self.process.stdout), ("stderr", self.process.stderr)):
+            self._tails[name] = collections.deque()
+            reader = threading.Thread(target=self._read, args=(name, stream), daemon=True)
+            reader.start()
+            self._readers.append(reader)
+        self._emit("start", pid=self.process.pid)
+        return self.process
+
+    def _read(self, name, stream):
+        tail = self._tails[name]
+        size = 0
+        pending = b""
+        while True:
+            chunk = stream.read1(READ_SIZE)
+            if not chunk:
+                break
+            self.last_output = time.monotonic()
+            tail.append(chunk)
+            size += len(chunk)
+            while size - len(tail[0]) >= self.tail_bytes:
+                size -= len(tail.popleft())
+
+            # ncnn separates progress updates with \n, some builds with \r
+            lines = re.split(rb"[\r\n]", pending + chunk)
+            pending = lines.pop()[-1024:]
+            for line in lines:
+                self._parse(line)
+        self._parse(pending)
+        stream.close()
+
+    def _parse(self, line):
+        matches = PROGRESS_RE.findall(line)
+        if not matches:
+            return
+        percent = min(float(matches[-1]), 100.0)
+        # In directory mode the percentage restarts for every image
+        if percent < self.percent:
+            self.completed_passes += 1
+        self.percent = percent
+        self._emit("progress", percent=percent, passes=self.completed_passes)
+
+    def output(self, name):
+        return b"".join(self._tails.get(name, ())).decode("utf-8", "replace")
+
+    def cancel(self):
+        self._cancelled = True
+        self.terminate()
+
+    def terminate(self, grace=5.0):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(grace)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def poll(self):
+        """Check timeouts; returns a ProcessResult once the process has ended."""
+        if self.process.poll() is None:
+            now = time.monotonic()
+            if (self.timeout and now - self.started > self.timeout) or \
+                    (self.idle_timeout and now - self.last_output > self.idle_timeout):
+                self.terminate()
+                return self._finish(timed_out=True)
+            return None
+        return self._finish()
+
+    def _finish(self, timed_out=False):
+        for reader in self._readers:
+            reader.join()
+        result = ProcessResult(self.process.returncode, self.output("stdout"), self.output("stderr"),
+                               time.monotonic() - self.started, timed_out, self._cancelled)
+        self._emit("exit", returncode=result.returncode, timed_out=timed_out, cancelled=self._cancelled,
+                   elapsed=result.elapsed)
+        return result
+
+    def wait(self, should_stop=None, interval=0.1):
+        if self.process is None:
+            self.start()
+        while True:
+            if should_stop and should_stop():
+                self.cancel()
+            result = self.poll()
+            if result is not None:
+                return result
+            time.sleep(interval)
+
@@ -0,0 +1,129 @@
+"""downloader.py against a local http.server, with and without range support."""
+import hashlib
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import downloader  # noqa: E402
+
+PAYLOAD = os.urandom(64 * 1024)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        if self.path.endswith(".sha256"):
+            self.send_error(404)
+            return
+        requested = self.headers.get("Range")
+        if requested and server.ranges:
+            start, end = requested[len("bytes="):].split("-")
+            start, end = int(start), int(end) if end else len(PAYLOAD) - 1
+            body = PAYLOAD[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        else:
+            body = PAYLOAD
+            self.send_response(200)
+        if server.content_length:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        with server.lock:
+            server.requests.append(requested)
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The size probe hangs up once it has the headers
+            return
+        with server.lock:
+            server.sent += len(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # Small segments and reads, so a 64 KB file takes the parallel path and reports progress often
+    monkeypatch.setattr(downloader, "MIN_SEGMENT", 4096)
+    monkeypatch.setattr(downloader, "CHUNK_SIZE", 1024)
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.ranges, httpd.content_length = True, True
+    httpd.requests, httpd.sent, httpd.lock = [], 0, threading.Lock()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/release.zip"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_parallel_download(tmp_path, server):
+    dest = str(tmp_path / "release.zip")
+    downloader.download(server.url, dest, hashlib.sha256(PAYLOAD).hexdigest(), connections=4)
+
+    assert _read(dest) == PAYLOAD
+    segments = [r for r in server.requests if r not in (None, "bytes=0-0")]
+    assert len(segments) == 4
+    assert not os.path.exists(dest + ".part") and not os.path.exists(dest + ".part.json")
+
+
+def test_interrupted_parallel_download_resumes(tmp_path, server):
+    dest = str(tmp_path / "release.zip")
+    stop = threading.Event()
+
+    def progress(done, total):
+        if done >= total // 2:
+            stop.set()
+
+    with pytest.raises(downloader.Stopped):
+        downloader.download(server.url, dest, connections=4, progress=progress, should_stop=stop.is_set)
+    assert os.path.exists(dest + ".part") and os.path.exists(dest + ".part.json")
+
+    server.sent = 0
+    downloader.download(server.url, dest, hashlib.sha256(PAYLOAD).hexdigest(), connections=4)
+    assert _read(dest) == PAYLOAD
+    # Only what the first attempt had not written is fetched again
+    assert server.sent < len(PAYLOAD)
+
+
+def test_server_without_range_support(tmp_path, server):
+    server.ranges = False
+    dest = str(tmp_path / "release.zip")
+    # A leftover partial file cannot be resumed without ranges and must not corrupt the result
+    with open(dest + ".part", "wb") as f:
+        f.write(b"stale bytes")
+    downloader.download(server.url, dest, hashlib.sha256(PAYLOAD).hexdigest(), connections=4)
+
+    assert _read(dest) == PAYLOAD
+    assert all(r in (None, "bytes=0-0") for r in server.requests)
+
+
+def test_missing_content_length(tmp_path, server):
+    server.ranges, server.content_length = False, False
+    dest = str(tmp_path / "release.zip")
+    totals = []
+    downloader.download(server.url, dest, progress=lambda done, total: totals.append(total))
+
+    assert _read(dest) == PAYLOAD
+    assert totals and set(totals) == {None}
+
+
+def test_checksum_mismatch(tmp_path, server):
+    dest = str(tmp_path / "release.zip")
+    with pytest.raises(downloader.DownloadError, match="SHA-256 mismatch"):
+        downloader.download(server.url, dest, "0" * 64, connections=4)
+
+    assert not os.path.exists(dest)
+    assert not os.path.exists(dest + ".part")
@@ -0,0 +1,59 @@
+"""Resuming folder runs through the journal, run through cli.py with the stand-in binary."""
+import json
+import os
+import subprocess
+import sys
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE = os.path.join(ROOT, "benchmarks", "fake_realesrgan_ncnn_vulkan.py")
+
+
+def _run(cwd, *args):
+    env = dict(os.environ, REALESRGAN_EXE=FAKE, FAKE_REALESRGAN_STARTUP="0", ENHANCE_CACHE_DIR=str(cwd / "cache"),
+               ENHANCE_CPU_WORKERS="1")
+    proc = subprocess.run([sys.executable, os.path.join(ROOT, "cli.py"), *args, "-s", "2", "-q"], cwd=cwd, env=env,
+                          capture_output=True, text=True, timeout=120)
+    return json.loads(proc.stdout.splitlines()[-1])["summary"]
+
+
+def test_cache_hits_are_skipped_on_the_next_run(tmp_path):
+    (tmp_path / "in").mkdir()
+    for i in range(3):
+        Image.new("RGB", (12, 10), (i * 60, 20, 20)).save(tmp_path / "in" / f"{i}.png")
+
+    assert _run(tmp_path, "in", "-o", "out1") == {"done": 3}
+    # A new output folder is served from the warm cache...
+    assert _run(tmp_path, "in", "-o", "out2") == {"cached": 3}
+    # ...and its journal then knows the files are done
+    assert _run(tmp_path, "in", "-o", "out2") == {"skipped": 3}
+
+
+def test_shards_sharing_an_output_folder_keep_separate_journals(tmp_path):
+    (tmp_path / "in").mkdir()
+    for name in ("cat", "dog", "a", "bird", "x1", "tree", "sun", "moon"):
+        Image.new("RGB", (12, 10), (len(name) * 40, 20, 20)).save(tmp_path / "in" / f"{name}.png")
+
+    first = _run(tmp_path, "in", "-o", "out", "--shard", "0/2")
+    second = _run(tmp_path, "in", "-o", "out", "--shard", "1/2")
+    assert sum(first.values()) + sum(second.values()) == 8
+    out = tmp_path / "out"
+    assert (out / ".enhance_journal.0-of-2.jsonl").exists() and (out / ".enhance_journal.1-of-2.jsonl").exists()
+
+    # A temporary file of the other shard's output, as if that shard were writing it right now
+    other = json.loads((out / ".enhance_journal.1-of-2.jsonl").read_text().splitlines()[0])["output"]
+    in_flight = tmp_path / f"{other}.tmp-1-2"
+    in_flight.write_bytes(b"partial")
+    assert _run(tmp_path, "in", "-o", "out", "--shard", "0/2") == {"skipped": sum(first.values())}
+    assert in_flight.exists()
+
+
+def test_upper_case_extension_keeps_its_name_with_and_without_the_cache(tmp_path):
+    (tmp_path / "in").mkdir()
+    Image.new("RGB", (12, 10), (200, 20, 20)).save(tmp_path / "in" / "P.PNG")
+
+    assert _run(tmp_path, "in", "-o", "out1") == {"done": 1}
+    assert _run(tmp_path, "in", "-o", "out2") == {"cached": 1}
+    for out in ("out1", "out2"):
+        assert [name for name in os.listdir(tmp_path / out) if not name.startswith(".")] == ["enhanced_P.PNG"]
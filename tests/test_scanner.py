@@ -0,0 +1,27 @@
+"""scanner.py sharding."""
+import collections
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scanner  # noqa: E402
+
+
+def test_names_differing_in_one_character_spread_over_every_shard():
+    for count in (2, 4):
+        assert {scanner.shard_of(f"{i}.png", count) for i in range(10)} == set(range(count))
+
+
+def test_sequentially_named_files_spread_evenly():
+    for count in (2, 3, 4, 8):
+        sizes = collections.Counter(scanner.shard_of(f"frames/{i:05d}.png", count) for i in range(4000))
+        assert sorted(sizes) == list(range(count))
+        assert min(sizes.values()) > 4000 / count * 0.8
+
+
+def test_shards_partition_the_entries():
+    entries = [scanner.Entry(f"{i}.png", f"/in/{i}.png", i) for i in range(100)]
+    parts = [list(scanner.shard(entries, index, 3)) for index in range(3)]
+    assert sorted(entry.rel for part in parts for entry in part) == sorted(entry.rel for entry in entries)
@@ -0,0 +1,123 @@
+"""supervisor.py against the stand-in binary in benchmarks/."""
+import os
+import sys
+import time
+
+import pytest
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import supervisor  # noqa: E402
+
+FAKE = os.path.join(ROOT, "benchmarks", "fake_realesrgan_ncnn_vulkan.py")
+
+
+@pytest.fixture
+def fake_env(monkeypatch):
+    monkeypatch.setenv("FAKE_REALESRGAN_STARTUP", "0")
+    monkeypatch.setenv("FAKE_REALESRGAN_PER_IMAGE", "0")
+    monkeypatch.delenv("FAKE_REALESRGAN_STDERR_BYTES", raising=False)
+    return monkeypatch
+
+
+def _image(path, color=(10, 120, 200)):
+    Image.new("RGB", (16, 12), color).save(path)
+    return str(path)
+
+
+def _command(input_path, output_path):
+    return [sys.executable, FAKE, "-i", str(input_path), "-o", str(output_path), "-s", "2", "-f", "png"]
+
+
+def test_chatty_stderr_does_not_block(tmp_path, fake_env):
+    # Far more than a pipe buffer holds: without the reader threads the child would stall
+    fake_env.setenv("FAKE_REALESRGAN_STDERR_BYTES", str(4 * 1024 * 1024))
+    output = tmp_path / "out.png"
+    proc = supervisor.SupervisedProcess(_command(_image(tmp_path / "in.png"), output), timeout=60,
+                                        tail_bytes=8 * 1024)
+    result = proc.wait()
+
+    assert result.ok, result.stderr
+    assert not result.timed_out
+    with Image.open(output) as img:
+        assert img.size == (32, 24)
+    # Only a bounded tail is kept, ending with the final progress line
+    assert len(result.stderr) <= 8 * 1024 + supervisor.READ_SIZE
+    assert result.stderr.rstrip().endswith("100.00%")
+
+
+def test_timeout_kills_the_process(tmp_path, fake_env):
+    fake_env.setenv("FAKE_REALESRGAN_STARTUP", "30")
+    events = []
+    proc = supervisor.SupervisedProcess(_command(_image(tmp_path / "in.png"), tmp_path / "out.png"),
+                                        on_event=events.append, timeout=0.5)
+    result = proc.wait(interval=0.05)
+
+    assert result.timed_out and not result.ok
+    assert result.elapsed < 10
+    assert proc.process.poll() is not None
+    assert events[-1]["type"] == "exit" and events[-1]["timed_out"]
+
+
+def test_idle_timeout_kills_a_silent_process(tmp_path, fake_env):
+    fake_env.setenv("FAKE_REALESRGAN_STARTUP", "30")
+    proc = supervisor.SupervisedProcess(_command(_image(tmp_path / "in.png"), tmp_path / "out.png"),
+                                        idle_timeout=0.5)
+    result = proc.wait(interval=0.05)
+
+    assert result.timed_out
+    assert result.elapsed < 10
+
+
+def test_progress_restarts_count_as_passes(tmp_path, fake_env):
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    for i in range(3):
+        _image(inputs / f"{i}.png", (i * 50, 0, 0))
+    events = []
+    proc = supervisor.SupervisedProcess(_command(inputs, tmp_path / "out"), job_id="batch",
+                                        on_event=events.append, timeout=60)
+    result = proc.wait()
+
+    assert result.ok
+    progress = [event for event in events if event["type"] == "progress"]
+    assert [event["percent"] for event in progress] == [0.0, 25.0, 50.0, 75.0, 100.0] * 3
+    assert all(event["job"] == "batch" for event in events)
+    # Each image after the first starts again from 0%
+    assert proc.completed_passes == 2
+    assert sorted(os.listdir(tmp_path / "out")) == ["0.png", "1.png", "2.png"]
+
+
+def test_progress_separated_by_carriage_returns():
+    events = []
+    code = "import sys; sys.stderr.write('12.50%\\r37.50%\\r 62.5%'); sys.stderr.flush()"
+    proc = supervisor.SupervisedProcess([sys.executable, "-c", code], on_event=events.append, timeout=60)
+    assert proc.wait().ok
+    assert [event["percent"] for event in events if event["type"] == "progress"] == [12.5, 37.5, 62.5]
+
+
+def test_should_stop_cancels_the_process(tmp_path, fake_env):
+    fake_env.setenv("FAKE_REALESRGAN_STARTUP", "30")
+    proc = supervisor.SupervisedProcess(_command(_image(tmp_path / "in.png"), tmp_path / "out.png"))
+    deadline = time.monotonic() + 0.3
+    result = proc.wait(should_stop=lambda: time.monotonic() > deadline, interval=0.05)
+
+    assert result.cancelled and not result.ok
+    assert not result.timed_out
+    assert result.elapsed < 10
+
+
+def test_cancel_token_terminates_its_process(tmp_path, fake_env):
+    fake_env.setenv("FAKE_REALESRGAN_STARTUP", "30")
+    token = supervisor.CancelToken()
+    token.process = supervisor.SupervisedProcess(_command(_image(tmp_path / "in.png"), tmp_path / "out.png"))
+    token.process.start()
+    token.cancel()
+    result = token.process.wait(interval=0.05)
+
+    assert token.cancelled
+    assert result.cancelled
+    assert result.elapsed < 10
+
@@ -0,0 +1,62 @@
+"""tiling.py: blending, the memory-mapped source and the memory plan."""
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tiling  # noqa: E402
+
+
+def _nearest(tile):
+    return tile.repeat(2, axis=0).repeat(2, axis=1)
+
+
+def _pattern(width, height):
+    rng = np.random.default_rng(7)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def test_plan_fits_a_wide_image_in_the_default_budget():
+    tile = tiling.plan_tile(20000, 15000, 4, 1024 * 1024 * 1024)
+    assert tile >= tiling.MIN_TILE
+
+
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_tiles_blend_back_into_the_upright_image(tmp_path, orientation):
+    source = tmp_path / "in.png"
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    Image.fromarray(_pattern(53, 37)).save(source, exif=exif)
+    with Image.open(source) as img:
+        upright = np.asarray(ImageOps.exif_transpose(img).convert("RGB"))
+
+    image = tiling.MappedSource(str(source))
+    try:
+        assert image.shape == upright.shape
+        h, w = image.shape[:2]
+        writer = tiling.open_writer(str(tmp_path / "out.png"), w * 2, h * 2)
+        assert tiling.upscale_tiled(image, 2, _nearest, writer, tile=16, overlap=4)
+    finally:
+        image.close()
+
+    with Image.open(tmp_path / "out.png") as out:
+        # Overlapping tiles of the same pixels must blend back to exactly those pixels
+        assert np.array_equal(np.asarray(out), _nearest(upright))
+
+
+@pytest.mark.parametrize("mode", ["L", "P", "RGBA"])
+def test_other_modes_are_read_as_rgb(tmp_path, mode):
+    source = tmp_path / "in.png"
+    Image.fromarray(_pattern(20, 12)).convert(mode).save(source)
+    image = tiling.MappedSource(str(source))
+    try:
+        with Image.open(source) as img:
+            expected = np.asarray(img.convert("RGB"))
+        assert np.array_equal(image[2:9, 3:17], expected[2:9, 3:17])
+    finally:
+        image.close()
@@ -0,0 +1,31 @@
+"""video.py writing every container cli.py routes to it."""
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+import video  # noqa: E402
+
+
+@pytest.mark.parametrize("ext", app.VIDEO_EXTENSIONS)
+def test_every_video_extension_can_be_written(tmp_path, ext):
+    source = str(tmp_path / "frames")
+    os.makedirs(source)
+    for i in range(4):
+        cv2.imwrite(os.path.join(source, f"{i:03d}.png"), np.full((24, 32, 3), i * 60, np.uint8))
+    output = str(tmp_path / f"out{ext}")
+
+    stats = video.upscale_video(source, output, lambda frames: [cv2.resize(f, (64, 48)) for f in frames],
+                                threshold=-1)
+
+    assert stats["frames"] == 4
+    capture = cv2.VideoCapture(output)
+    ok, frame = capture.read()
+    capture.release()
+    assert ok and frame.shape[:2] == (48, 64)
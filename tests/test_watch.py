@@ -0,0 +1,51 @@
+"""watch.py under a burst of files larger than the debouncer's pending limit."""
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import watch  # noqa: E402
+
+
+def _drain(watcher, expected, timeout=15):
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while len(seen) < expected and time.monotonic() < deadline:
+        seen.update(watcher.take(64, timeout=0.1))
+    return seen
+
+
+@pytest.mark.parametrize("poll", [True, False])
+def test_burst_beyond_max_pending_is_fully_queued(tmp_path, poll):
+    if not poll and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux only")
+    watcher = watch.FolderWatch(str(tmp_path), {".png"}, settle=0.1, queue_size=8, max_pending=10, poll=poll,
+                                interval=0.05).start()
+    try:
+        names = {f"{i:03d}.png" for i in range(30)}
+        for name in names:
+            (tmp_path / name).write_bytes(b"x" * 10)
+        assert _drain(watcher, len(names)) == names
+    finally:
+        watcher.stop()
+
+
+@pytest.mark.parametrize("poll", [True, False])
+def test_replaced_file_is_queued_again(tmp_path, poll):
+    if not poll and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux only")
+    watcher = watch.FolderWatch(str(tmp_path), {".png"}, settle=0.1, poll=poll, interval=0.05).start()
+    try:
+        path = tmp_path / "a.png"
+        path.write_bytes(b"first")
+        assert _drain(watcher, 1) == {"a.png"}
+        # Replaced the way most tools save: a new file renamed over the old one
+        (tmp_path / ".a.tmp").write_bytes(b"second version")
+        os.replace(tmp_path / ".a.tmp", path)
+        assert _drain(watcher, 1) == {"a.png"}
+    finally:
+        watcher.stop()
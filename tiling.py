@@ -0,0 +1,393 @@
+"""Tiled upscaling with a bounded working set.
+
+Tiles overlap and are feather-blended, finished output rows are streamed
+straight to the encoder, so only a band of output rows is ever held in memory,
+in 16-bit fixed point. The source is decoded into a memory-mapped temporary
+file and read a band of rows at a time. PNG output is encoded row by row. Other formats are assembled in a temporary
+file and encoded from a memory map: JPEG a block of rows at a time, the rest
+in one piece if that fits in the memory budget.
+"""
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 1024
+MIN_TILE = 32
+# Finished rows are normalised and handed to the writer this many at a time
+ROW_CHUNK = 16
+# A contiguous BGR copy plus the encoder's own picture and output
+FULL_ENCODE_BYTES_PER_PIXEL = 8
+# Fractional bits of the uint16 band: 255 << 8 still leaves room for rounding
+FIXED_BITS = 8
+# EXIF orientation -> the transpose that shows the image upright, as OpenCV's imread applies it
+ORIENTATION = {2: "FLIP_LEFT_RIGHT", 3: "ROTATE_180", 4: "FLIP_TOP_BOTTOM", 5: "TRANSPOSE",
+               6: "ROTATE_270", 7: "TRANSVERSE", 8: "ROTATE_90"}
+
+
+class PngStreamWriter:
+    """Write an 8-bit RGB PNG one block of rows at a time."""
+
+    def __init__(self, path, width, height, level=6):
+        self.file = open(path, "wb")
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(level)
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        """rows: (n, width, 3) uint8 RGB."""
+        n = rows.shape[0]
+        # Every scanline is prefixed with filter type 0 (none)
+        framed = np.empty((n, self.width * 3 + 1), np.uint8)
+        framed[:, 0] = 0
+        framed[:, 1:] = rows.reshape(n, -1)
+        data = self.compressor.compress(framed.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows_written += n
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.file.name)
+
+    def close(self):
+        if self.rows_written != self.height:
+            self.file.close()
+            raise ValueError(f"PNG expected {self.height} rows, got {self.rows_written}")
+        self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+        self.file.close()
+
+
+class MemmapWriter:
+    """Collect rows in a temporary file, then encode them from a memory map.
+
+    Rows are stored as RGBX so that PIL can wrap the map without copying it,
+    and JPEG is encoded from there a block of rows at a time. Other formats
+    need the whole image in memory (OpenCV's encoders take one array, and
+    libwebp one picture), so they are refused when that would not fit in
+    memory_budget.
+    """
+
+    def __init__(self, path, width, height, settings=None, memory_budget=None):
+        import encoder
+        self.path = path
+        self.width = width
+        self.height = height
+        self.settings = settings or encoder.Settings()
+        self.ext = os.path.splitext(path)[1].lower()
+        if (self.ext not in (".jpg", ".jpeg") and memory_budget is not None
+                and width * height * FULL_ENCODE_BYTES_PER_PIXEL > memory_budget):
+            raise MemoryError(f"A {width}x{height} {self.ext} output cannot be encoded within "
+                              f"{memory_budget / 2 ** 20:.0f} MB; write PNG or JPEG instead")
+        self.file = tempfile.NamedTemporaryFile(suffix=".rgbx", delete=False)
+        self.rows_written = 0
+
+    def write_rows(self, rows):
+        """rows: (n, width, 3) uint8 RGB."""
+        rgbx = np.empty((rows.shape[0], self.width, 4), np.uint8)
+        rgbx[:, :, :3] = rows
+        rgbx[:, :, 3] = 255
+        self.file.write(rgbx.data)
+        self.rows_written += rows.shape[0]
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.file.name)
+
+    def close(self):
+        import mmap
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"{self.path} expected {self.height} rows, got {self.rows_written}")
+            self.file.flush()
+            with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if self.ext in (".jpg", ".jpeg"):
+                    self._save_jpeg(mapped)
+                else:
+                    import encoder
+                    rows = np.frombuffer(mapped, np.uint8).reshape(self.height, self.width, 4)
+                    encoder.encode(rows[:, :, 2::-1], self.path, self.settings)
+                    del rows
+        finally:
+            self.file.close()
+            os.remove(self.file.name)
+
+    def _save_jpeg(self, mapped):
+        from PIL import Image
+        import encoder
+        image = Image.frombuffer("RGBX", (self.width, self.height), mapped, "raw", "RGBX", 0, 1)
+        tmp, trial = f"{self.path}.tmp-{os.getpid()}", f"{self.path}.trial-{os.getpid()}"
+
+        def save(quality, dest):
+            image.save(dest, "JPEG", quality=quality)
+            return os.path.getsize(dest)
+
+        try:
+            quality = self.settings.quality(self.ext)
+            target = self.settings.target_bytes
+            if save(quality, tmp) > (target or float("inf")):
+                # Same search as encoder._to_target, over files instead of buffers
+                fits, low, high = False, encoder.MIN_QUALITY, quality - 1
+                while low <= high:
+                    mid = (low + high) // 2
+                    if save(mid, trial) <= target:
+                        os.replace(trial, tmp)
+                        fits, low = True, mid + 1
+                    else:
+                        high = mid - 1
+                if not fits:
+                    save(encoder.MIN_QUALITY, tmp)
+            os.replace(tmp, self.path)
+        finally:
+            image.close()
+            for leftover in (tmp, trial):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+
+class MappedSource:
+    """A decoded image held in a memory-mapped temporary file.
+
+    PIL decodes straight into the map, so the pixels live in the page cache
+    rather than in the process, and only the rows of the tiles being read are
+    brought in. Indexing with [rows, columns] returns an upright RGB uint8
+    array, like slicing the array OpenCV would have decoded.
+    """
+
+    def __init__(self, path):
+        import mmap
+        from PIL import Image
+        self.image = Image.open(path)
+        try:
+            width, height = self.image.size
+            mode = self.image.mode
+            # The row stride Image.core.map_buffer assumes for this mode
+            stride = width if mode in ("L", "P") else 2 * width if mode.startswith("I;16") else 4 * width
+            self.file = tempfile.TemporaryFile(suffix=".pixels")
+            self.file.truncate(stride * height)
+            self.map = mmap.mmap(self.file.fileno(), stride * height)
+            # load() keeps a core image of the right mode and size instead of allocating one
+            self.image.im = Image.core.map_buffer(self.map, (width, height), "raw", 0, (mode, 0, 1))
+            self.image.load()
+        except Exception:
+            self.close()
+            raise
+        self.transpose = ORIENTATION.get(self.image.getexif().get(0x0112))
+        if self.transpose in ("TRANSPOSE", "ROTATE_270", "TRANSVERSE", "ROTATE_90"):
+            width, height = height, width
+        self.shape = (height, width, 3)
+
+    def _source_box(self, x0, y0, x1, y1):
+        # The box of the stored image that the upright box (x0, y0, x1, y1) comes from
+        w, h = self.image.size
+        return {
+            None: (x0, y0, x1, y1),
+            "FLIP_LEFT_RIGHT": (w - x1, y0, w - x0, y1),
+            "ROTATE_180": (w - x1, h - y1, w - x0, h - y0),
+            "FLIP_TOP_BOTTOM": (x0, h - y1, x1, h - y0),
+            "TRANSPOSE": (y0, x0, y1, x1),
+            "ROTATE_270": (y0, h - x1, y1, h - x0),
+            "TRANSVERSE": (w - y1, h - x1, w - y0, h - x0),
+            "ROTATE_90": (w - y1, x0, w - y0, x1),
+        }[self.transpose]
+
+    def __getitem__(self, key):
+        from PIL import Image
+        rows, cols = key
+        y0, y1, _ = rows.indices(self.shape[0])
+        x0, x1, _ = cols.indices(self.shape[1])
+        region = self.image.crop(self._source_box(x0, y0, x1, y1))
+        if self.transpose:
+            region = region.transpose(getattr(Image.Transpose, self.transpose))
+        if region.mode.startswith("I"):
+            # 16-bit samples scaled to 8 bits, as OpenCV reads them
+            grey = (np.asarray(region).astype(np.uint32) >> 8).astype(np.uint8)
+            return np.repeat(grey[:, :, None], 3, axis=2)
+        return np.asarray(region.convert("RGB"))
+
+    def close(self):
+        # The core image holds a view of the map, which cannot be closed while it is exported
+        self.image.close()
+        self.image.im = None
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+        if getattr(self, "file", None) is not None:
+            self.file.close()
+
+
+def open_writer(path, width, height, jpeg_quality=95, settings=None, memory_budget=None):
+    """A row writer for path; settings (encoder.Settings) overrides the PNG level and JPEG quality."""
+    if path.lower().endswith(".png"):
+        level = settings.png_zlib_level() if settings is not None else None
+        return PngStreamWriter(path, width, height, 6 if level is None else level)
+    if settings is None:
+        import encoder
+        settings = encoder.Settings(jpeg_quality)
+    return MemmapWriter(path, width, height, settings, memory_budget)
+
+
+def _ramp(length, start_overlap, end_overlap):
+    weights = np.ones(length, np.float32)
+    if start_overlap:
+        weights[:start_overlap] = (np.arange(start_overlap, dtype=np.float32) + 0.5) / start_overlap
+    if end_overlap:
+        weights[length - end_overlap:] = (np.arange(end_overlap, 0, -1, dtype=np.float32) - 0.5) / end_overlap
+    return weights
+
+
+def _positions(size, tile, overlap):
+    if size <= tile:
+        return [0]
+    step = tile - overlap
+    positions = list(range(0, size - tile, step))
+    positions.append(size - tile)
+    return positions
+
+
+def _overlaps(positions, i, tile, scale):
+    # Output pixels shared with the previous and the next tile along one axis
+    start = 0 if i == 0 else (positions[i - 1] + tile - positions[i]) * scale
+    end = 0 if i + 1 == len(positions) else (positions[i] + tile - positions[i + 1]) * scale
+    return start, end
+
+
+def _feathers(positions, tile, scale):
+    """Each tile's ramp along one axis, divided by the sum of all ramps over its pixels.
+
+    Tiles form a grid, so a pixel's total weight is the product of the two
+    axes' sums, and the products of these ramps add up to exactly one.
+    """
+    size = (positions[-1] + tile) * scale
+    ramps = [_ramp(tile * scale, *_overlaps(positions, i, tile, scale)) for i in range(len(positions))]
+    total = np.zeros(size, np.float32)
+    for position, ramp in zip(positions, ramps):
+        total[position * scale:(position + tile) * scale] += ramp
+    return [ramp / total[position * scale:(position + tile) * scale] for position, ramp in zip(positions, ramps)]
+
+
+def plan_tile(width, height, scale, memory_budget=DEFAULT_MEMORY_BUDGET, overlap=8, work_factor=4):
+    """Pick the largest square tile whose working set fits in the budget.
+
+    The budget covers the source rows being read, the blended band of output
+    rows (uint16 RGB), the per-tile upscale buffers, the blending scratch of
+    one tile and the rows being rounded and written. The decoded source itself
+    is memory-mapped and not counted.
+    """
+    out_width = width * scale
+    # uint8 rows, plus the copies the writers make of them
+    rows = ROW_CHUNK * out_width * (3 + 4 + 2 * (3 + 1))
+    # The feathering ramps of every column and row
+    feathers = (out_width + height * scale) * 4 * 2
+    available = memory_budget - rows - feathers
+    tile = max(width, height)
+    while tile >= max(MIN_TILE, 2 * overlap + 1):
+        band = tile * scale * out_width * 6
+        source = tile * width * 4
+        pixels = (tile * scale) ** 2
+        work = pixels * 3 * 4 * work_factor
+        # The uint8 result, its weights, their float32 product and its uint16 copy
+        blend = pixels * (3 + 4 + 12 + 6)
+        if band + source + work + blend <= available:
+            return tile
+        tile = int(tile * 0.8)
+    raise MemoryError(f"A {width}x{height} image at {scale}x does not fit in "
+                      f"{memory_budget / 2 ** 20:.0f} MB")
+
+
+def upscale_tiled(image, scale, upscale_fn, writer, tile, overlap=8, progress=None):
+    """Upscale an HxWx3 uint8 image tile by tile, streaming rows to writer.
+
+    image is an array or a MappedSource. upscale_fn maps an (h, w, 3) uint8 tile to an (h*scale, w*scale, 3) result.
+    If progress returns False the output is discarded and False is returned.
+    """
+    h, w = image.shape[:2]
+    out_w = w * scale
+    tile_h, tile_w = min(tile, h), min(tile, w)
+    overlap = min(overlap, tile_h // 2, tile_w // 2)
+    ys = _positions(h, tile_h, overlap)
+    xs = _positions(w, tile_w, overlap)
+    total = len(ys) * len(xs)
+
+    band_rows = tile_h * scale
+    # Weighted sums in fixed point; the feathers add up to one, so no weight plane is needed
+    acc = np.zeros((band_rows, out_w, 3), np.uint16)
+    feathers_y = _feathers(ys, tile_h, scale)
+    feathers_x = [feather * (1 << FIXED_BITS) for feather in _feathers(xs, tile_w, scale)]
+    out_rows = np.empty((ROW_CHUNK, out_w, 3), np.uint8)
+    band_top = 0  # output row held in acc[0]
+    done = 0
+
+    for yi, y in enumerate(ys):
+        next_y = ys[yi + 1] if yi + 1 < len(ys) else None
+        wy = feathers_y[yi][:, None]
+
+        offset = y * scale - band_top
+        for xi, x in enumerate(xs):
+            wt = (wy * feathers_x[xi][None, :])[:, :, None]
+
+            result = upscale_fn(np.ascontiguousarray(image[y:y + tile_h, x:x + tile_w]))
+            cols = slice(x * scale, (x + tile_w) * scale)
+            weighted = np.multiply(result, wt, dtype=np.float32)
+            np.add(weighted, 0.5, out=weighted)
+            acc[offset:offset + band_rows, cols] += weighted.astype(np.uint16)
+            done += 1
+            if progress and progress(done, total) is False:
+                writer.abort()
+                return False
+
+        # Rows above the next band's first row will not receive more tiles
+        finished = (next_y * scale if next_y is not None else h * scale) - band_top
+        # Rounded in place, a chunk at a time: these rows are overwritten below anyway
+        for start in range(0, finished, ROW_CHUNK):
+            rows = acc[start:min(start + ROW_CHUNK, finished)]
+            np.add(rows, 1 << (FIXED_BITS - 1), out=rows)
+            np.right_shift(rows, FIXED_BITS, out=rows)
+            out = out_rows[:rows.shape[0]]
+            np.copyto(out, rows, casting="unsafe")
+            writer.write_rows(out)
+
+        keep = band_rows - finished if next_y is not None else 0
+        # Moved up in steps of finished rows: overlapping slices would be copied through a temporary
+        for start in range(0, keep, finished):
+            end = min(start + finished, keep)
+            acc[start:end] = acc[finished + start:finished + end]
+        acc[keep:] = 0
+        band_top += finished
+    writer.close()
+    return True
+
+
+def upscale_file_tiled(input_path, output_path, scale, upscale_fn,
+                       memory_budget=DEFAULT_MEMORY_BUDGET, overlap=8, progress=None, settings=None):
+    """Decode input_path and write its tiled upscale to output_path.
+
+    upscale_fn works on RGB tiles. Returns False if progress cancelled the run.
+    """
+    try:
+        image = MappedSource(input_path)
+    except (OSError, SyntaxError, ValueError) as e:
+        raise IOError(f"Could not read {input_path}: {e}")
+    try:
+        h, w = image.shape[:2]
+        tile = plan_tile(w, h, scale, memory_budget, overlap)
+        writer = open_writer(output_path, w * scale, h * scale, settings=settings, memory_budget=memory_budget)
+        return upscale_tiled(image, scale, upscale_fn, writer, tile, overlap, progress)
+    finally:
+        image.close()
+
+
+def needs_tiling(width, height, scale, memory_budget=DEFAULT_MEMORY_BUDGET):
+    # Source + resized result + encoder copy, as the one-shot path allocates them
+    return width * height * 3 * (1 + 2 * scale * scale) > memory_budget
@@ -0,0 +1,216 @@
+"""Registry of the Real-ESRGAN binary and models for this host.
+
+The install directory is resolved once per process. The result (binary path,
+model files, checksums and release version) is kept in a small manifest inside
+the install directory, so later processes skip the directory walk and hashing
+until the install directory actually changes.
+"""
+import hashlib
+import json
+import os
+import platform
+import stat
+import threading
+
+RELEASE = "v0.2.5.0"
+BUILD = "20220424"
+RELEASE_URL = "https://github.com/xinntao/Real-ESRGAN/releases/download/{release}/realesrgan-ncnn-vulkan-{build}-{asset}.zip"
+# Release asset and the SHA-256 of its zip, copied from the release page when
+# RELEASE or BUILD changes. A release zip without a pinned (or REALESRGAN_SHA256)
+# checksum is never installed: the downloader then has nothing to verify it against.
+PLATFORM_ASSETS = {
+    "Windows": ("windows", None),
+    "Linux": ("ubuntu", None),
+    "Darwin": ("macos", None),
+}
+MANIFEST_NAME = ".toolchain.json"
+MANIFEST_VERSION = 1
+
+_registry = {}
+_lock = threading.Lock()
+
+
+def platform_asset(system=None):
+    asset = PLATFORM_ASSETS.get(system or platform.system())
+    return asset[0] if asset else None
+
+
+def release_sha256(system=None):
+    """The pinned SHA-256 of this platform's release zip, or None."""
+    asset = PLATFORM_ASSETS.get(system or platform.system())
+    return asset[1] if asset else None
+
+
+def release_url(system=None):
+    asset = platform_asset(system)
+    if asset is None:
+        return None
+    return RELEASE_URL.format(release=RELEASE, build=BUILD, asset=asset)
+
+
+def exe_name(system=None):
+    if (system or platform.system()) == "Windows":
+        return "realesrgan-ncnn-vulkan.exe"
+    return "realesrgan-ncnn-vulkan"
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(install_dir):
+    """Cheap change detector: name, size and mtime of the top two directory levels.
+
+    Dotfiles are skipped: the manifest and the tuning profile live here too.
+    """
+    parts = []
+    for entry in os.scandir(install_dir):
+        if entry.name.startswith("."):
+            continue
+        st = entry.stat()
+        parts.append(f"{entry.name}:{st.st_size}:{st.st_mtime_ns}")
+        if entry.is_dir():
+            for child in os.scandir(entry.path):
+                st = child.stat()
+                parts.append(f"{entry.name}/{child.name}:{st.st_size}:{st.st_mtime_ns}")
+    return hashlib.sha256("|".join(sorted(parts)).encode()).hexdigest()
+
+
+class Toolchain:
+    def __init__(self, install_dir, exe, models_dir, models, version, system, checksums=None):
+        self.install_dir = install_dir
+        self.exe = exe
+        self.models_dir = models_dir
+        self.models = models
+        self.version = version
+        self.platform = system
+        self.checksums = checksums or {}
+
+    def verify(self):
+        """Re-hash every recorded file; returns the relative paths that changed."""
+        changed = []
+        for rel, digest in self.checksums.items():
+            path = os.path.join(self.install_dir, rel)
+            if not os.path.exists(path) or file_sha256(path) != digest:
+                changed.append(rel)
+        return changed
+
+    def to_manifest(self, fp):
+        rel = lambda path: os.path.relpath(path, self.install_dir) if path else None  # noqa: E731
+        return {
+            "manifest": MANIFEST_VERSION,
+            "fingerprint": fp,
+            "platform": self.platform,
+            "version": self.version,
+            "exe": rel(self.exe),
+            "models_dir": rel(self.models_dir),
+            "models": self.models,
+            "checksums": self.checksums,
+        }
+
+    @classmethod
+    def from_manifest(cls, install_dir, manifest):
+        path = lambda rel: os.path.join(install_dir, rel) if rel else None  # noqa: E731
+        return cls(install_dir, path(manifest["exe"]), path(manifest["models_dir"]), manifest["models"],
+                   manifest["version"], manifest["platform"], manifest["checksums"])
+
+
+def _scan(install_dir, system, version):
+    exe = None
+    models_dir = None
+    models = {}
+    checksums = {}
+    wanted = exe_name(system)
+    for root, dirs, files in os.walk(install_dir):
+        for file in files:
+            path = os.path.join(root, file)
+            if file == wanted and exe is None:
+                exe = path
+            elif file.endswith(".param") and os.path.exists(path[:-len(".param")] + ".bin"):
+                models_dir = models_dir or root
+                models[file[:-len(".param")]] = os.path.relpath(root, install_dir)
+            else:
+                continue
+            checksums[os.path.relpath(path, install_dir)] = file_sha256(path)
+            if file.endswith(".param"):
+                bin_path = path[:-len(".param")] + ".bin"
+                checksums[os.path.relpath(bin_path, install_dir)] = file_sha256(bin_path)
+
+    if exe and system != "Windows":
+        # zipfile does not keep the executable bit
+        mode = os.stat(exe).st_mode
+        if not mode & stat.S_IXUSR:
+            os.chmod(exe, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return Toolchain(install_dir, exe, models_dir, models, version, system, checksums)
+
+
+def _read_manifest(install_dir):
+    try:
+        with open(os.path.join(install_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        return manifest if manifest.get("manifest") == MANIFEST_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(install_dir, toolchain, fp):
+    path = os.path.join(install_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(toolchain.to_manifest(fp), f, indent=2)
+    os.replace(tmp, path)
+
+
+def resolve(install_dir="realesrgan", system=None):
+    """Return the Toolchain for install_dir, or None if the directory does not exist.
+
+    toolchain.exe is None when no binary for this platform is installed. The
+    result is cached for the life of the process; see invalidate().
+    """
+    system = system or platform.system()
+    install_dir = os.path.abspath(install_dir)
+
+    with _lock:
+        cached = _registry.get((install_dir, system))
+        if cached:
+            return cached
+        if not os.path.isdir(install_dir):
+            return None
+
+        fp = fingerprint(install_dir)
+        manifest = _read_manifest(install_dir)
+        if manifest and manifest.get("fingerprint") == fp and manifest.get("platform") == system:
+            toolchain = Toolchain.from_manifest(install_dir, manifest)
+        else:
+            version = manifest.get("version") if manifest else None
+            toolchain = _scan(install_dir, system, version or "unknown")
+            try:
+                _write_manifest(install_dir, toolchain, fingerprint(install_dir))
+            except OSError:
+                pass
+        _registry[(install_dir, system)] = toolchain
+        return toolchain
+
+
+def invalidate(install_dir=None):
+    with _lock:
+        if install_dir is None:
+            _registry.clear()
+            return
+        install_dir = os.path.abspath(install_dir)
+        for key in [key for key in _registry if key[0] == install_dir]:
+            del _registry[key]
+
+
+def record_install(install_dir, version=f"{RELEASE}-{BUILD}"):
+    """Note which release was extracted into install_dir and drop cached state."""
+    invalidate(install_dir)
+    manifest = _read_manifest(install_dir) or {"manifest": MANIFEST_VERSION}
+    manifest.update(version=version, fingerprint=None, platform=None)
+    path = os.path.join(install_dir, MANIFEST_NAME)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
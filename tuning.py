@@ -0,0 +1,171 @@
+"""Per-machine tuning of the Real-ESRGAN tile size and load:proc:save threads.
+
+realesrgan-ncnn-vulkan's best -t (tile size) and -j (threads for loading,
+processing and saving) depend on the GPU, its driver and the image size, so
+they are measured rather than guessed. tune() runs the binary in directory
+mode over a few seeded synthetic images per size class. It first tries each
+tile size with the default threads, then each thread split with the best
+tile size. A candidate replaces the current best only if it is clearly
+faster, so noise does not move the profile away from the binary's defaults.
+Failed runs (e.g. a tile too large for the GPU's memory) are skipped.
+
+The winners are kept in a JSON profile next to the toolchain manifest, keyed
+by host, binary, GPU and scale, and lookup() returns them for later runs.
+"""
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+
+PROFILE_VERSION = 1
+# (name, largest pixel count); the last class takes everything bigger
+SIZE_CLASSES = (("small", 512 * 512), ("medium", 1280 * 1024), ("large", 2560 * 1600), ("huge", None))
+SAMPLE_SIZES = {"small": (384, 384), "medium": (1024, 768), "large": (1920, 1080), "huge": (3840, 2160)}
+# The binary's defaults come first: tile 0 lets ncnn pick from the GPU's memory
+TILES = (0, 512, 256, 128, 64)
+THREADS = ("1:2:2", "1:1:1", "2:2:2", "2:4:2", "4:4:4")
+MIN_GAIN = 0.03
+
+_lock = threading.Lock()
+_profiles = {}
+
+
+class TuningError(Exception):
+    pass
+
+
+def size_class(width, height):
+    pixels = width * height
+    for name, limit in SIZE_CLASSES:
+        if limit is None or pixels <= limit:
+            return name
+
+
+def profile_key(exe_path, gpu, scale, model):
+    """Profiles are only valid for the host, binary, GPU and model they were measured on."""
+    st = os.stat(exe_path)
+    return f"{platform.node()}|{os.path.abspath(exe_path)}:{st.st_size}:{st.st_mtime_ns}|gpu={gpu or 'auto'}|" \
+           f"{model}-x{scale}"
+
+
+def load(path):
+    """The profile file's contents, re-read only when the file changes."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    with _lock:
+        cached = _profiles.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        profiles = data.get("profiles", {}) if data.get("version") == PROFILE_VERSION else {}
+        _profiles[path] = (mtime, profiles)
+        return profiles
+
+
+def lookup(path, key, width, height):
+    """{"tile": ..., "threads": ...} tuned for an image of this size, or {}."""
+    entry = load(path).get(key, {}).get(size_class(width, height))
+    if not entry:
+        return {}
+    return {"tile": entry["tile"], "threads": entry["threads"]}
+
+
+def save(path, key, classes):
+    """Merge the tuned classes for key into the profile file."""
+    profiles = dict(load(path))
+    profiles[key] = dict(profiles.get(key, {}), **classes)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump({"version": PROFILE_VERSION, "profiles": profiles}, f, indent=2)
+    os.replace(tmp, path)
+    with _lock:
+        _profiles.pop(path, None)
+
+
+def _make_samples(folder, width, height, count, seed=0):
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder)
+    for i in range(count):
+        # Blurred noise, like benchmarks/suite.py: upscales like a photo, not a flat fill
+        img = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (7, 7), 0)
+        cv2.imwrite(os.path.join(folder, f"{i:04d}.png"), img)
+
+
+def _measure(command, input_dir, output_dir, options, timeout):
+    """Seconds for one directory-mode run with these options, or None if it failed."""
+    cmd = command(input_dir, output_dir, options)
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    seconds = time.perf_counter() - start
+    expected = len(os.listdir(input_dir))
+    if proc.returncode != 0 or len(os.listdir(output_dir)) != expected:
+        return None
+    return seconds
+
+
+def tune(command, classes=None, images=3, repeats=2, tiles=TILES, threads=THREADS, timeout=600, should_stop=None,
+         log=print):
+    """Find the fastest tile size and thread split for each size class.
+
+    command(input_dir, output_dir, options) returns the argv for one run of
+    the binary, where options is {"tile": ..., "threads": ...}. Returns
+    {class: {"tile", "threads", "ms_per_image", "tuned"}} for the classes
+    that could be measured. Each candidate is timed `repeats` times and
+    its fastest run counts.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="realesrgan-tune-") as tmp:
+        for name in classes or [name for name, _ in SIZE_CLASSES]:
+            width, height = SAMPLE_SIZES[name]
+            input_dir = os.path.join(tmp, name)
+            _make_samples(input_dir, width, height, images)
+            runs = [0]
+
+            def measure(options):
+                if should_stop and should_stop():
+                    raise TuningError("Tuning stopped")
+                seconds = None
+                for _ in range(repeats):
+                    runs[0] += 1
+                    output_dir = os.path.join(tmp, f"{name}-out-{runs[0]}")
+                    os.makedirs(output_dir)
+                    sample = _measure(command, input_dir, output_dir, options, timeout)
+                    if sample is None:
+                        seconds = None
+                        break
+                    seconds = sample if seconds is None else min(seconds, sample)
+                shown = f"{seconds / images * 1000:.0f} ms/image" if seconds is not None else "failed"
+                log(f"  {name} {width}x{height}  -t {options['tile']:<4} -j {options['threads']:<6} {shown}")
+                return seconds
+
+            best, best_seconds = None, None
+            for candidate in [{"tile": tile, "threads": threads[0]} for tile in tiles]:
+                seconds = measure(candidate)
+                if seconds is not None and (best_seconds is None or seconds < best_seconds * (1 - MIN_GAIN)):
+                    best, best_seconds = candidate, seconds
+            if best is None:
+                log(f"  {name}: every run failed, keeping the binary's defaults")
+                continue
+            for split in threads[1:]:
+                candidate = dict(best, threads=split)
+                seconds = measure(candidate)
+                if seconds is not None and seconds < best_seconds * (1 - MIN_GAIN):
+                    best, best_seconds = candidate, seconds
+            results[name] = dict(best, ms_per_image=round(best_seconds / images * 1000, 1),
+                                 tuned=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    return results
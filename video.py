@@ -0,0 +1,285 @@
+"""Streaming upscaler for videos and frame sequences.
+
+Three threads are joined by bounded queues, so decoding, inference and
+encoding overlap while memory stays at a few chunks of frames:
+
+    decode -> [frames] -> infer (chunks) -> [upscaled] -> encode
+
+The decoder computes a block-mean signature for every frame: a grayscale
+thumbnail where each cell is the average of a block of pixels. A frame whose
+cells all lie within `threshold` grey levels of the last inferred frame is a
+duplicate. It is not sent for inference; the previous upscaled frame is
+written again. Comparing against the last inferred frame, not the previous
+frame, stops slow pans from drifting through a run of "duplicates". Using
+the largest cell difference rather than the mean keeps small motions such as
+lip flaps from being averaged away.
+
+Input is a video file (anything cv2.VideoCapture reads) or a folder of
+frames. An output path with an extension is written as a video file. If
+ffmpeg is on PATH, the source audio is copied into it. An output path without
+an extension becomes a folder of PNG frames.
+"""
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import cv2
+import numpy as np
+
+FRAME_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+# WebM only holds VP8/VP9; OpenCV cannot write GIF at all, so app.VIDEO_EXTENSIONS leaves it out
+FOURCC = {".avi": "MJPG", ".mkv": "mp4v", ".mov": "mp4v", ".m4v": "mp4v", ".webm": "VP80"}
+SIGNATURE_WIDTH = 64
+_DONE = object()
+
+
+class VideoError(Exception):
+    pass
+
+
+class Stopped(VideoError):
+    pass
+
+
+def signature(frame):
+    """Block means of the frame in grayscale, SIGNATURE_WIDTH cells wide."""
+    height, width = frame.shape[:2]
+    cells_x = min(SIGNATURE_WIDTH, width)
+    cells_y = max(1, round(height * cells_x / width))
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, (cells_x, cells_y), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def is_duplicate(sig, key_sig, threshold):
+    if key_sig is None or sig.shape != key_sig.shape:
+        return False
+    return int(np.abs(sig - key_sig).max()) <= threshold
+
+
+class _FrameSource:
+    def __init__(self, path):
+        self.path = path
+        self.capture = None
+        self.names = None
+        if os.path.isdir(path):
+            self.names = sorted(name for name in os.listdir(path) if name.lower().endswith(FRAME_EXTENSIONS))
+            if not self.names:
+                raise VideoError(f"No frames found in {path}")
+            self.fps = None
+            self.count = len(self.names)
+        else:
+            self.capture = cv2.VideoCapture(path)
+            if not self.capture.isOpened():
+                raise VideoError(f"Could not open video {path}")
+            self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 25.0
+            self.count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+
+    def __iter__(self):
+        if self.names is not None:
+            for name in self.names:
+                frame = cv2.imread(os.path.join(self.path, name), cv2.IMREAD_COLOR)
+                if frame is None:
+                    raise VideoError(f"Could not read frame {name}")
+                yield name, frame
+            return
+        index = 0
+        while True:
+            ok, frame = self.capture.read()
+            if not ok:
+                break
+            yield f"{index:08d}.png", frame
+            index += 1
+
+    def close(self):
+        if self.capture is not None:
+            self.capture.release()
+
+
+class _FrameSink:
+    def __init__(self, path, fps):
+        self.path = path
+        self.fps = fps
+        self.writer = None
+        self.video_path = None
+        self.as_frames = not os.path.splitext(path)[1]
+        if self.as_frames:
+            os.makedirs(path, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def write(self, name, frame):
+        if self.as_frames:
+            if not cv2.imwrite(os.path.join(self.path, os.path.splitext(name)[0] + ".png"), frame):
+                raise VideoError(f"Could not write frame {name}")
+            return
+        if self.writer is None:
+            root, ext = os.path.splitext(self.path)
+            self.video_path = f"{root}.video-only{ext}"
+            fourcc = cv2.VideoWriter_fourcc(*FOURCC.get(ext.lower(), "mp4v"))
+            self.writer = cv2.VideoWriter(self.video_path, fourcc, self.fps or 25.0,
+                                          (frame.shape[1], frame.shape[0]))
+            if not self.writer.isOpened():
+                raise VideoError(f"Could not open a video writer for {self.path}")
+        self.writer.write(frame)
+
+    def close(self, source_path, keep):
+        if self.writer is None:
+            return
+        self.writer.release()
+        if not keep:
+            os.remove(self.video_path)
+        elif not (os.path.isfile(source_path) and _mux_audio(self.video_path, source_path, self.path)):
+            os.replace(self.video_path, self.path)
+
+
+def _mux_audio(video_path, source_path, output_path):
+    """Copy the source's audio next to the new video stream; False if not possible."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return False
+    cmd = [ffmpeg, "-y", "-loglevel", "error", "-i", video_path, "-i", source_path,
+           "-map", "0:v:0", "-map", "1:a?", "-c", "copy", "-shortest", output_path]
+    if subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode != 0:
+        return False
+    os.remove(video_path)
+    return True
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.2)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.2)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def upscale_video(input_path, output_path, upscale_frames, chunk=16, threshold=2, should_stop=None,
+                  progress=None):
+    """Upscale a video file or frame folder into output_path.
+
+    upscale_frames(frames) takes a list of BGR uint8 arrays and returns the
+    upscaled list. threshold is the largest grey-level change per signature
+    cell that still counts as a duplicate (a negative value disables
+    skipping). progress(done, total) is called as frames are written. Returns
+    a dict of frame counts and timings. Raises Stopped if should_stop() turns
+    true.
+    """
+    source = _FrameSource(input_path)
+    sink = _FrameSink(output_path, source.fps)
+    stop = threading.Event()
+    decoded = queue.Queue(maxsize=2 * chunk)
+    upscaled = queue.Queue(maxsize=2 * chunk)
+    errors = []
+    stats = {"frames": 0, "inferred": 0, "duplicates": 0, "decode_seconds": 0.0, "infer_seconds": 0.0,
+             "encode_seconds": 0.0}
+
+    def decode():
+        try:
+            key_sig = None
+            start = time.perf_counter()
+            for name, frame in source:
+                sig = signature(frame) if threshold >= 0 else None
+                if threshold >= 0 and is_duplicate(sig, key_sig, threshold):
+                    item = (name, None)
+                else:
+                    key_sig = sig
+                    item = (name, frame)
+                stats["decode_seconds"] += time.perf_counter() - start
+                if not _put(decoded, item, stop):
+                    return
+                start = time.perf_counter()
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(decoded, _DONE, stop)
+
+    def infer():
+        last = None
+        try:
+            done = False
+            while not done:
+                # Fill a whole chunk of frames to infer; duplicates ride along for free
+                batch = []
+                unique = 0
+                while unique < chunk:
+                    item = _get(decoded, stop)
+                    if item is _DONE:
+                        done = True
+                        break
+                    batch.append(item)
+                    unique += item[1] is not None
+                if should_stop and should_stop():
+                    raise Stopped("Video upscaling stopped")
+                frames = [frame for _, frame in batch if frame is not None]
+                if frames:
+                    start = time.perf_counter()
+                    results = upscale_frames(frames)
+                    stats["infer_seconds"] += time.perf_counter() - start
+                    stats["inferred"] += len(frames)
+                    # A stop during inference may leave the chunk unfinished
+                    if should_stop and should_stop():
+                        raise Stopped("Video upscaling stopped")
+                    results = iter(results)
+                for name, frame in batch:
+                    if frame is not None:
+                        last = next(results)
+                    else:
+                        stats["duplicates"] += 1
+                    if last is None:
+                        raise VideoError("First frame has no reference")
+                    if not _put(upscaled, (name, last), stop):
+                        return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(upscaled, _DONE, stop)
+
+    threads = [threading.Thread(target=decode, name="video-decode", daemon=True),
+               threading.Thread(target=infer, name="video-infer", daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    # Encoding runs on the calling thread
+    ok = False
+    try:
+        while True:
+            item = _get(upscaled, stop)
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            sink.write(*item)
+            stats["encode_seconds"] += time.perf_counter() - start
+            stats["frames"] += 1
+            if progress:
+                progress(stats["frames"], source.count)
+        ok = not errors
+    except Exception as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        source.close()
+        sink.close(input_path, ok)
+
+    if errors:
+        raise errors[0]
+    for key in ("decode_seconds", "infer_seconds", "encode_seconds"):
+        stats[key] = round(stats[key], 3)
+    return stats
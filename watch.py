@@ -0,0 +1,304 @@
+"""Watch an input folder and hand over files once they are completely written.
+
+A watcher reports names that appeared or changed. On Linux it uses inotify
+through ctypes; elsewhere, or with poll=True (network shares, where inotify
+does not see writes made by other hosts), it polls with os.scandir, but only
+rescans when the directory's mtime changes plus a periodic full scan.
+Reported names are debounced: a file becomes ready once its size and mtime
+have not changed for `settle` seconds. Ready names go into a bounded queue.
+When the consumer falls behind, the watcher thread blocks on that queue, and
+anything missed in the meantime (including an inotify queue overflow) is
+picked up by a rescan. Memory therefore stays bounded by the queue, the
+pending limit and one signature per file in the folder.
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+    IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class WatchError(Exception):
+    pass
+
+
+def signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def scan(folder, extensions):
+    """{name: (size, mtime_ns)} for every matching regular file in folder."""
+    found = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            try:
+                if entry.is_file():
+                    st = entry.stat()
+                    found[entry.name] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+    return found
+
+
+class PollingWatcher:
+    backend = "polling"
+
+    def __init__(self, folder, extensions, interval=1.0, full_scan_every=30.0):
+        self.folder = folder
+        self.extensions = extensions
+        self.interval = interval
+        self.full_scan_every = full_scan_every
+        self.known = {}
+        self.dir_mtime = None
+        self.last_full = 0.0
+
+    def events(self, timeout):
+        """Block up to timeout; returns (changed names, removed names)."""
+        time.sleep(min(timeout, self.interval))
+        now = time.monotonic()
+        try:
+            dir_mtime = os.stat(self.folder).st_mtime_ns
+        except OSError as e:
+            raise WatchError(f"Input folder is gone: {e}")
+        # Creates, renames and deletes change the directory mtime; in-place
+        # rewrites of an existing name only show up in the periodic full scan
+        if dir_mtime == self.dir_mtime and now - self.last_full < self.full_scan_every:
+            return [], []
+        self.dir_mtime = dir_mtime
+        self.last_full = now
+        return self.rescan()
+
+    def rescan(self):
+        current = scan(self.folder, self.extensions)
+        changed = [name for name, sig in current.items() if self.known.get(name) != sig]
+        removed = [name for name in self.known if name not in current]
+        self.known = current
+        return changed, removed
+
+    def forget(self, name):
+        """Report name again on the next scan (it was dropped before it could be tracked)."""
+        self.known.pop(name, None)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    backend = "inotify"
+
+    def __init__(self, folder, extensions):
+        self.folder = folder
+        self.extensions = extensions
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {folder}")
+        self.pending_rescan = True
+
+    def events(self, timeout):
+        if self.pending_rescan:
+            self.pending_rescan = False
+            return self.rescan()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return [], []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return [], []
+
+        changed, removed = [], []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # The kernel dropped events while we were not reading
+                return self.rescan()
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                raise WatchError(f"Input folder {self.folder} was removed or moved")
+            if not name or name.startswith(".") or os.path.splitext(name)[1].lower() not in self.extensions:
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                removed.append(name)
+            else:
+                changed.append(name)
+        return changed, removed
+
+    def rescan(self):
+        return list(scan(self.folder, self.extensions)), []
+
+    def forget(self, name):
+        # Every rescan reports every name
+        pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_watcher(folder, extensions, poll=False, interval=1.0):
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder, extensions)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folder, extensions, interval)
+
+
+class Debouncer:
+    """Track names until their size and mtime stop changing."""
+
+    def __init__(self, folder, settle=2.0, max_pending=10000):
+        self.folder = folder
+        self.settle = settle
+        self.max_pending = max_pending
+        self.pending = {}
+        self.overflowed = False
+
+    def touch(self, name, now):
+        """Start or restart name's settle timer; False if it was dropped because pending is full."""
+        if name in self.pending:
+            self.pending[name][1] = now
+        elif len(self.pending) < self.max_pending:
+            self.pending[name] = [None, now]
+        else:
+            self.overflowed = True
+            return False
+        return True
+
+    def forget(self, name):
+        self.pending.pop(name, None)
+
+    def ready(self, now):
+        """Re-stat pending names; returns [(name, signature)] that have settled."""
+        settled = []
+        for name, state in list(self.pending.items()):
+            sig = signature(os.path.join(self.folder, name))
+            if sig is None:
+                del self.pending[name]
+            elif sig != state[0]:
+                state[0], state[1] = sig, now
+            elif now - state[1] >= self.settle and sig[0] > 0:
+                del self.pending[name]
+                settled.append((name, sig))
+        return settled
+
+
+class FolderWatch:
+    """Watch folder in a background thread and queue names of finished files.
+
+    Consumers call take(); each name is queued once per (size, mtime), so a
+    file that is replaced later is queued again.
+    """
+
+    def __init__(self, folder, extensions, settle=2.0, queue_size=256, max_pending=10000, poll=False,
+                 interval=1.0):
+        self.folder = folder
+        self.watcher = open_watcher(folder, extensions, poll, interval)
+        self.debouncer = Debouncer(folder, settle, max_pending)
+        self.queue = queue.Queue(queue_size)
+        self.queued = {}
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="folder-watch", daemon=True)
+
+    @property
+    def backend(self):
+        return self.watcher.backend
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        tick = min(0.5, max(self.debouncer.settle / 4, 0.05))
+        try:
+            while not self._stop.is_set():
+                if self.debouncer.overflowed and len(self.debouncer.pending) < self.debouncer.max_pending // 2:
+                    self.debouncer.overflowed = False
+                    changed, removed = self.watcher.rescan()
+                else:
+                    changed, removed = self.watcher.events(tick)
+                now = time.monotonic()
+                for name in removed:
+                    self.debouncer.forget(name)
+                    self.queued.pop(name, None)
+                for name in changed:
+                    # A rescan reports files that were already queued; they must not crowd out the rest
+                    if name not in self.debouncer.pending and name in self.queued and \
+                            signature(os.path.join(self.folder, name)) == self.queued[name]:
+                        continue
+                    if not self.debouncer.touch(name, now):
+                        self.watcher.forget(name)
+                for name, sig in self.debouncer.ready(now):
+                    if self.queued.get(name) == sig:
+                        continue
+                    if not self._put(name):
+                        return
+                    self.queued[name] = sig
+        except Exception as e:
+            self.error = e
+        finally:
+            self.watcher.close()
+
+    def _put(self, name):
+        # Backpressure: wait for the consumer instead of buffering without bound
+        while not self._stop.is_set():
+            try:
+                self.queue.put(name, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def take(self, max_items, timeout=0.5):
+        """Wait up to timeout for one name, then return it with up to max_items - 1 more."""
+        if self.error is not None:
+            raise WatchError(str(self.error))
+        try:
+            names = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(names) < max_items:
+            try:
+                names.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return names
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()